@@ -0,0 +1,261 @@
+""" Entanglement entropies for many spectra at once.
+
+The functions `calculate_entropy` and `calculate_renyi` in the
+`dmrg101.core.entropies` module take the eigenvalues of a single reduced
+density matrix. When you need the entropies for many wavefunctions, or for
+all the bonds of a chain and several Renyi indexes, calling them in a
+Python loop is slow. The functions here take a stack of spectra, i.e. a
+2-D array with one spectrum per row padded with zeros, and a list of Renyi
+indexes, and calculate all the entropies in one go with NumPy.
+
+The entropies are defined with the natural logarithm:
+
+.. math::
+    S_{n}=\frac{1}{1-n}\log\sum_{i}\lambda_{i}^{n}
+
+where the Renyi index :math:`n=1` is the von Neumann entropy,
+:math:`S_{1}=-\sum_{i}\lambda_{i}\log\lambda_{i}`, and :math:`n=\infty` is
+:math:`S_{\infty}=-\log\max_{i}\lambda_{i}`.
+
+For a single spectrum, called at each DMRG step, `calculate_entropy` and
+`calculate_truncation_error` are drop-in replacements for the ones in
+dmrg101 that stay accurate when the eigenvalues are tiny, or slightly
+negative after the diagonalization. The truncation error is summed from
+the discarded eigenvalues, with compensated summation, instead of
+subtracting the kept ones from one, which loses all the digits when the
+truncation error is below the rounding error of one, about 1e-16.
+"""
+from scipy.special import xlogy
+import numpy as np
+
+def pad_spectra(spectra):
+    """Stacks spectra of different lengths into a 2-D array.
+
+    Parameters
+    ----------
+    spectra : a list of lists (or 1-D arrays) of doubles.
+        The eigenvalues of the reduced density matrices.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 2.
+        An array with one spectrum per row, padded with zeros.
+
+    Examples
+    --------
+    >>> from batch_entropies import pad_spectra
+    >>> pad_spectra([[1.], [.5, .5]])
+    array([[1. , 0. ],
+           [0.5, 0.5]])
+    """
+    number_of_columns = max([len(spectrum) for spectrum in spectra])
+    result = np.zeros((len(spectra), number_of_columns))
+    for row, spectrum in enumerate(spectra):
+	result[row, :len(spectrum)] = spectrum
+    return result
+
+def calculate_entropies(spectra, renyi_indexes=(1,)):
+    """Calculates the Renyi entropies for a stack of spectra.
+
+    Eigenvalues that are zero, or negative due to rounding errors in the
+    diagonalization, do not contribute to the entropies.
+
+    Parameters
+    ----------
+    spectra : a numpy array of ndim = 2 (or 1).
+        The eigenvalues of the reduced density matrices, one spectrum per
+	row, padded with zeros.
+    renyi_indexes : a list of doubles.
+        The Renyi indexes, use 1 for the von Neumann entropy and
+	`np.inf` for the min-entropy.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 2.
+        The entropies, with one row per spectrum and one column per Renyi
+	index.
+
+    Examples
+    --------
+    >>> from batch_entropies import calculate_entropies
+    >>> result = calculate_entropies([[.5, .5], [1., 0.]], [1, 2])
+    >>> np.allclose(result, [[np.log(2), np.log(2)], [0., 0.]])
+    True
+    """
+    spectra = np.atleast_2d(np.asarray(spectra, dtype=np.float64))
+    renyi_indexes = np.atleast_1d(np.asarray(renyi_indexes, dtype=np.float64))
+    positive = spectra > 0.
+    evals = np.where(positive, spectra, 1.)
+    log_evals = np.log(evals)
+    von_neumann = -np.sum(xlogy(np.where(positive, spectra, 0.), evals),
+	                  axis=1)
+    min_entropy = -np.log(np.max(np.where(positive, evals, 0.), axis=1))
+    is_special = (renyi_indexes == 1.) | np.isinf(renyi_indexes)
+    finite_indexes = np.where(is_special, 2., renyi_indexes)
+    powers = np.exp(log_evals[:, :, np.newaxis] * finite_indexes)
+    sums = np.sum(np.where(positive[:, :, np.newaxis], powers, 0.), axis=1)
+    result = np.log(sums) / (1. - finite_indexes)
+    result = np.where(renyi_indexes == 1., von_neumann[:, np.newaxis], result)
+    result = np.where(np.isinf(renyi_indexes), min_entropy[:, np.newaxis],
+		      result)
+    return result
+
+def compensated_sum(values):
+    """Sums an array keeping the rounding errors.
+
+    The values are summed in pairs, and the rounding error of each sum is
+    kept exactly (with the TwoSum algorithm) and added at the end. The
+    result is as accurate as summing in twice the precision, and all the
+    operations are on whole arrays.
+
+    Parameters
+    ----------
+    values : a numpy array.
+        The values to sum.
+
+    Returns
+    -------
+    result : a double.
+        The sum.
+
+    Examples
+    --------
+    >>> from batch_entropies import compensated_sum
+    >>> compensated_sum([1e16, 1., -1e16])
+    1.0
+    """
+    values = np.asarray(values, dtype=np.float64).ravel()
+    if not len(values):
+	return 0.
+    error = 0.
+    while len(values) > 1:
+	if len(values) % 2:
+	    values = np.append(values, 0.)
+	first = values[0::2]
+	second = values[1::2]
+	values = first + second
+	second_part = values - first
+	error += np.sum((first - (values - second_part)) +
+		        (second - second_part))
+    return values[0] + error
+
+def calculate_entropy(evals, threshold=0.):
+    """Calculates the von Neumann entropy of a single spectrum.
+
+    Parameters
+    ----------
+    evals : a numpy array of ndim = 1.
+        The eigenvalues of the reduced density matrix.
+    threshold : a double, optional.
+        Eigenvalues below or equal to this do not contribute, so zero and
+	negative eigenvalues from rounding errors are left out.
+
+    Returns
+    -------
+    result : a double.
+        The entropy.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from batch_entropies import calculate_entropy
+    >>> evals = np.array([.5, .5, 0., -1e-17])
+    >>> print '%.6f' % calculate_entropy(evals)
+    0.693147
+
+    while the plain formula gives NaN as soon as an eigenvalue is zero or
+    negative:
+
+    >>> with np.errstate(divide='ignore', invalid='ignore'):
+    ...     plain = -np.sum(evals * np.log(evals))
+    >>> np.isnan(plain)
+    True
+
+    For a large spectrum the result agrees with a sum done in higher
+    precision:
+
+    >>> import math
+    >>> evals = np.random.RandomState(0).exponential(size=4000) ** 8
+    >>> evals /= evals.sum()
+    >>> reference = -math.fsum(x * math.log(x) for x in evals)
+    >>> abs(calculate_entropy(evals) - reference) < 1e-13 * reference
+    True
+    """
+    evals = np.asarray(evals, dtype=np.float64).ravel()
+    return -np.sum(xlogy(np.where(evals > threshold, evals, 0.), evals))
+
+def calculate_truncation_error(evals, number_of_states_kept):
+    """Calculates the truncation error from the whole spectrum.
+
+    The truncation error is the sum of the discarded eigenvalues, divided
+    by the sum of all of them, to correct for a density matrix whose trace
+    is not exactly one. Negative eigenvalues from rounding errors are taken
+    as zero. The discarded eigenvalues are summed with `compensated_sum`,
+    and there is no subtraction, so the result has full precision even
+    when it is much smaller than the rounding error of one.
+
+    Parameters
+    ----------
+    evals : a numpy array of ndim = 1.
+        All the eigenvalues of the reduced density matrix, in any order.
+    number_of_states_kept : an int.
+        How many of the largest eigenvalues are kept.
+
+    Returns
+    -------
+    result : a double.
+        The truncation error.
+
+    Examples
+    --------
+    Compare with the exact result using fractions:
+
+    >>> import numpy as np
+    >>> from fractions import Fraction
+    >>> from batch_entropies import calculate_truncation_error
+    >>> evals = np.array([0.6, 0.4 - 3e-17] + [3e-20] * 1000)
+    >>> exact = (sum(Fraction(x) for x in evals[2:]) /
+    ...          sum(Fraction(x) for x in evals))
+    >>> error = calculate_truncation_error(evals, 2)
+    >>> abs(Fraction(error) - exact) < 1e-15 * exact
+    True
+
+    while subtracting the kept eigenvalues from one is wrong:
+
+    >>> abs(Fraction(1 - evals[:2].sum()) - exact) < 0.1 * exact
+    False
+    """
+    evals = np.asarray(evals, dtype=np.float64).ravel()
+    evals = np.where(evals > 0., evals, 0.)
+    if number_of_states_kept >= len(evals):
+	return 0.
+    # only the discarded ones need to be sorted
+    discarded = np.partition(evals, len(evals) - number_of_states_kept)
+    discarded = discarded[:len(evals) - number_of_states_kept]
+    total = np.sum(evals)
+    if total == 0.:
+	return 0.
+    return compensated_sum(discarded) / total
+
+def calculate_spectra(wavefunctions):
+    """Calculates the spectra of the reduced DMs for a stack of wavefunctions.
+
+    The eigenvalues of the reduced density matrix are the squares of the
+    singular values of the wavefunction written as a matrix, and they are
+    the same whichever block you trace out. Using the singular values
+    avoids building the reduced density matrices, and it is more accurate
+    for the small eigenvalues.
+
+    Parameters
+    ----------
+    wavefunctions : a numpy array of ndim = 3.
+        The wavefunctions written as matrices, `wavefunctions[i]` is the
+	matrix of the i-th wavefunction, as in `Wavefunction.as_matrix`.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 2.
+        The eigenvalues, in decreasing order, one spectrum per row.
+    """
+    singular_values = np.linalg.svd(wavefunctions, compute_uv=False)
+    return singular_values * singular_values
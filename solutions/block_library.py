@@ -0,0 +1,281 @@
+""" A library of blocks from the infinite DMRG algorithm.
+
+In the infinite algorithm the left and right blocks are the same whatever
+the number of sites of the chain you want at the end: the algorithm just
+grows them until they are long enough. So when you do a finite-size
+scaling, e.g. for 32, 64, 128 and 256 sites, the infinite algorithm for
+each chain repeats the steps of the one for the previous chain. Here the
+system, with its blocks, is saved to a directory at the end of the
+infinite algorithm, and a calculation for a longer chain starts from the
+largest blocks saved instead of from a single site.
+
+The saved systems are kept apart by a key, made from everything that
+changes the blocks: the compiled terms of the model, the site, the number
+of states kept in the infinite algorithm, and anything else you pass.
+The results of the steps of the infinite algorithm are saved too, so the
+result files are the same as without the library.
+
+To use it, call `load_blocks`, which returns the largest system saved,
+the results of its steps, and a `SaveBlocks` hook to save the new blocks.
+Then pass the number of steps plus one as the `first_left_block_size` of
+`sweeps.run_sweeps`.
+
+Models whose terms depend on where the sites are in the lattice, e.g. the
+ladders in `lattices`, are not supported, as their blocks depend on the
+whole lattice.
+"""
+import cPickle
+import hashlib
+import os
+import tempfile
+
+def get_model_key(model):
+    """Returns what identifies a model for the library.
+
+    The key is made from the compiled terms of the model, i.e. the
+    operators, the distances between them and the couplings, so any two
+    models with the same key build the same blocks, whatever the
+    function that made them.
+
+    Parameters
+    ----------
+    model : a ModelFromSpec.
+        The model.
+
+    Returns
+    -------
+    result : a tuple.
+        The terms of the Hamiltonian, of the block Hamiltonian, and the
+	operators updated in the blocks, as compiled for the current
+	parameters of the model.
+
+    Raises
+    ------
+    ValueError
+        if the model has terms depending on where the sites are.
+
+    Examples
+    --------
+    Two models with the same parameters but different terms get different
+    keys:
+
+    >>> from block_library import get_model_key
+    >>> from model_specs import ModelFromSpec, bond
+    >>> ising = ModelFromSpec([bond('s_z', 's_z', 'J')], J=1.)
+    >>> xx = ModelFromSpec([bond('s_x', 's_x', 'J')], J=1.)
+    >>> get_model_key(ising) == get_model_key(xx)
+    False
+    >>> get_model_key(ising) == get_model_key(ModelFromSpec(
+    ...     [bond('s_z', 's_z', 1.)]))
+    True
+    """
+    if getattr(model, 'has_patterns', False):
+	raise ValueError('Models with terms depending on the position of '
+		         'the sites are not supported.')
+    plan = model.get_plan()
+    return (tuple(plan.hamiltonian_terms), tuple(plan.boundary_terms),
+	    tuple(plan.block_site_terms),
+	    tuple((side, tuple(plan.block_hamiltonian_terms[side])) for side
+		  in sorted(plan.block_hamiltonian_terms)),
+	    tuple(plan.operators_to_update))
+
+def get_site_key(site):
+    """Returns what identifies a site for the library.
+
+    Parameters
+    ----------
+    site : a Site.
+        The site of the system.
+
+    Returns
+    -------
+    result : a tuple.
+        The name of the class of the site, and the name, shape and type
+	of each of its operators.
+    """
+    return (site.__class__.__name__,
+	    tuple((name, operator.shape, operator.dtype.str) for name, operator
+		  in sorted(site.operators.items())))
+
+class BlockLibrary(object):
+    """Saves and loads systems from the infinite DMRG algorithm.
+
+    Parameters
+    ----------
+    directory : a string.
+        The directory for the library. It is created if needed.
+    """
+    def __init__(self, directory):
+        super(BlockLibrary, self).__init__()
+	self.directory = os.path.abspath(directory)
+	if not os.path.isdir(self.directory):
+	    os.makedirs(self.directory)
+
+    def get_key(self, *parts):
+        """Returns the key for a calculation.
+
+	Parameters
+	----------
+	parts : anything with a `repr`.
+	    Everything that changes the blocks, e.g. the result of
+	    `get_model_key`, and the number of states kept.
+
+	Returns
+	-------
+	result : a string.
+	    The key.
+	"""
+	return hashlib.sha1(repr(parts)).hexdigest()
+
+    def _get_filename(self, key, left_block_size):
+        """Returns the file for a system with a given key and size."""
+	return os.path.join(self.directory, '%s_%d.pickle' % (key,
+		                                               left_block_size))
+
+    def get_sizes(self, key):
+        """Returns the sizes of the left blocks saved for a key.
+
+	Parameters
+	----------
+	key : a string.
+	    The key, from `get_key`.
+
+	Returns
+	-------
+	result : a list of ints.
+	    The sizes, from the smallest.
+	"""
+	prefix = key + '_'
+	result = []
+	for filename in os.listdir(self.directory):
+	    if filename.startswith(prefix) and filename.endswith('.pickle'):
+		result.append(int(filename[len(prefix):-len('.pickle')]))
+	return sorted(result)
+
+    def save(self, key, system, steps):
+        """Saves a system after a step of the infinite algorithm.
+
+	The model is not saved, as the couplings can be functions, which
+	cannot be pickled. It must be set again after loading.
+
+	Parameters
+	----------
+	key : a string.
+	    The key, from `get_key`.
+	system : a System.
+	    The system.
+	steps : a list of sweeps.Step.
+	    The results of the steps of the infinite algorithm so far.
+	"""
+	left_block_size = steps[-1].left_block_size
+	model = system.model
+	system.model = None
+	try:
+	    # write to a temporary file first, so an interrupted save
+	    # doesn't leave a broken file in the library
+	    handle, temporary = tempfile.mkstemp(dir=self.directory)
+	    f = os.fdopen(handle, 'wb')
+	    cPickle.dump((system, list(steps)), f, cPickle.HIGHEST_PROTOCOL)
+	    f.close()
+	    os.rename(temporary, self._get_filename(key, left_block_size))
+	finally:
+	    system.model = model
+
+    def load(self, key, max_left_block_size):
+        """Loads the system with the largest blocks saved for a key.
+
+	Parameters
+	----------
+	key : a string.
+	    The key, from `get_key`.
+	max_left_block_size : an int.
+	    The largest size of the left block you can use, i.e. the one at
+	    the end of the infinite algorithm.
+
+	Returns
+	-------
+	system : a System, or None.
+	    The system, without its model, or None if nothing is saved.
+	steps : a list of sweeps.Step.
+	    The results of the steps of the infinite algorithm up to the
+	    system.
+	"""
+	sizes = [size for size in self.get_sizes(key) if
+		 size <= max_left_block_size]
+	if not sizes:
+	    return None, []
+	f = open(self._get_filename(key, sizes[-1]), 'rb')
+	system, steps = cPickle.load(f)
+	f.close()
+	return system, steps
+
+class SaveBlocks(object):
+    """Saves the system to a library at the end of the infinite algorithm.
+
+    A hook for `sweeps.run_sweeps`. Put it after any hook changing the
+    blocks.
+
+    Parameters
+    ----------
+    library : a BlockLibrary.
+        The library.
+    key : a string.
+        The key, from `BlockLibrary.get_key`.
+    steps : a list of sweeps.Step, optional.
+        The results of the steps loaded from the library.
+    save_every : an int, optional.
+        Save also the systems with left blocks of sizes multiple of this,
+	for shorter chains later. By default, only the last one.
+    """
+    def __init__(self, library, key, steps=(), save_every=None):
+        super(SaveBlocks, self).__init__()
+	self.library = library
+	self.key = key
+	self.steps = list(steps)
+	self.save_every = save_every
+
+    def __call__(self, system, step):
+	if step.half_sweep != -1:
+	    return False
+	self.steps.append(step)
+	if step.is_last or (self.save_every is not None and
+		            step.left_block_size % self.save_every == 0):
+	    self.library.save(self.key, system, self.steps)
+	return False
+
+def load_blocks(directory, system, site, number_of_states, *parts):
+    """Loads the largest saved system for a calculation, if any.
+
+    Parameters
+    ----------
+    directory : a string.
+        The directory of the library.
+    system : a System.
+        The system, with its model and number of sites set.
+    site : a Site.
+        The site of the system.
+    number_of_states : an int.
+        The number of states kept in the infinite algorithm.
+    parts : anything with a `repr`, optional.
+        Anything else that changes the blocks.
+
+    Returns
+    -------
+    system : a System.
+        The saved system, with the model and number of sites of `system`,
+	or `system` itself if nothing is saved.
+    steps : a list of sweeps.Step.
+        The results of the steps of the infinite algorithm up to the
+	returned system.
+    hook : a SaveBlocks.
+        The hook to save the new blocks.
+    """
+    library = BlockLibrary(directory)
+    key = library.get_key(get_model_key(system.model), get_site_key(site),
+	                  number_of_states, *parts)
+    saved_system, steps = library.load(key, system.number_of_sites - 3)
+    if saved_system is not None:
+	saved_system.model = system.model
+	saved_system.number_of_sites = system.number_of_sites
+	system = saved_system
+    return system, steps, SaveBlocks(library, key, steps)
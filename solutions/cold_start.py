@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+""" Measures the time the scripts take to start.
+
+Short jobs spend much of their time starting Python and importing
+modules. This measures, in a new interpreter each time, how long it takes
+to start Python, and to import each module, either the heavy libraries
+or the scripts, with everything they import. The fastest of a few
+repetitions is kept, as the first ones can be slower while the files are
+read from disk.
+
+With `--jobs`, it measures also the time to run a file of jobs (see
+`dmrg_worker`), first as a separate process for each job, and then in a
+single worker. The difference is what the worker saves. `make benchmark`
+runs it with the jobs in `cold_start_jobs.txt`, so compare the numbers it
+prints on your machine rather than figures measured elsewhere.
+
+Usage:
+  cold_start.py [--repeat=<n> --jobs=FILE] [<module>...]
+  cold_start.py -h | --help
+
+Options:
+  -h --help         Shows this screen.
+  --repeat=<n>      How many times to repeat each measurement [default: 5]
+  --jobs=FILE       File with jobs to run separately and with the worker.
+
+"""
+from docopt import docopt
+from dmrg_worker import parse_job
+import os
+import subprocess
+import sys
+import time
+
+default_modules = ('numpy', 'scipy.sparse', 'docopt', 'matplotlib.pyplot',
+		   'dmrg101.core.system', 'exact_diagonalization',
+		   'heisenberg', 'hubbard', 'tfim', 'time_evolution')
+
+solutions_directory = os.path.dirname(os.path.abspath(__file__))
+
+def time_command(command, repeat, stdin=None):
+    """Returns the shortest time to run a command.
+
+    Parameters
+    ----------
+    command : a list of strings.
+        The command and its arguments.
+    repeat : an int.
+        How many times to run it.
+    stdin : a string, optional.
+        A file passed as the standard input.
+
+    Returns
+    -------
+    result : a double, or None.
+        The time in seconds, or None if the command failed.
+    """
+    result = None
+    with open(os.devnull, 'w') as devnull:
+	for i in range(repeat):
+	    input_file = open(stdin) if stdin is not None else None
+	    start = time.time()
+	    status = subprocess.call(command, stdin=input_file,
+		                     stdout=devnull, stderr=devnull)
+	    elapsed = time.time() - start
+	    if input_file is not None:
+		input_file.close()
+	    if status:
+		return None
+	    result = elapsed if result is None else min(result, elapsed)
+    return result
+
+def time_import(module, repeat):
+    """Returns the shortest time to import a module in a new interpreter.
+
+    Parameters
+    ----------
+    module : a string.
+        The name of the module.
+    repeat : an int.
+        How many times to import it.
+
+    Returns
+    -------
+    result : a double, or None.
+        The time in seconds, not counting starting Python, or None if the
+	module cannot be imported.
+    """
+    # run from the directory of the scripts, so they can be imported
+    code = ('import time\nstart = time.time()\nimport %s\n'
+	    'print time.time() - start' % module)
+    result = None
+    for i in range(repeat):
+	process = subprocess.Popen([sys.executable, '-c', code],
+		                   stdout=subprocess.PIPE,
+				   stderr=subprocess.PIPE,
+				   cwd=solutions_directory)
+	output, errors = process.communicate()
+	if process.returncode:
+	    return None
+	elapsed = float(output.split()[-1])
+	result = elapsed if result is None else min(result, elapsed)
+    return result
+
+def time_jobs(jobs_file, repeat):
+    """Returns the time to run jobs separately and with the worker.
+
+    Parameters
+    ----------
+    jobs_file : a string.
+        The file with the jobs, as for `dmrg_worker`.
+    repeat : an int.
+        How many times to run them.
+
+    Returns
+    -------
+    number_of_jobs : an int.
+        The number of jobs.
+    separate : a double, or None.
+        The time in seconds with a process for each job, or None if some
+	job failed.
+    worker : a double, or None.
+        The time in seconds with a single worker, or None if it failed.
+    """
+    commands = []
+    with open(jobs_file) as f:
+	for line in f:
+	    name, argv = parse_job(line)
+	    if name is not None:
+		commands.append([sys.executable,
+		                 os.path.join(solutions_directory,
+				              name + '.py')] + argv)
+    separate = None
+    for i in range(repeat):
+	elapsed = 0.
+	for command in commands:
+	    job_time = time_command(command, 1)
+	    if job_time is None:
+		elapsed = None
+		break
+	    elapsed += job_time
+	if elapsed is None:
+	    separate = None
+	    break
+	separate = elapsed if separate is None else min(separate, elapsed)
+    worker = time_command([sys.executable,
+	                   os.path.join(solutions_directory, 'dmrg_worker.py')],
+			  repeat, stdin=os.path.abspath(jobs_file))
+    return len(commands), separate, worker
+
+def format_time(seconds):
+    """Returns a time in milliseconds, or 'failed' for None."""
+    if seconds is None:
+	return 'failed'
+    return '%.1f ms' % (1e3 * seconds)
+
+def main(args):
+    repeat = int(args['--repeat'])
+    modules = args['<module>'] or default_modules
+    print '%-24s %s' % ('python', format_time(time_command([sys.executable,
+	                                                     '-c', 'pass'],
+							    repeat)))
+    for module in modules:
+	print '%-24s %s' % (module, format_time(time_import(module, repeat)))
+    if args['--jobs'] is not None:
+	number_of_jobs, separate, worker = time_jobs(args['--jobs'], repeat)
+	print '%d jobs, separate processes: %s, worker: %s' % (
+	    number_of_jobs, format_time(separate), format_time(worker))
+
+if __name__ == '__main__':
+    args = docopt(__doc__, version = 0.1)
+    main(args)
@@ -0,0 +1,501 @@
+#!/usr/bin/env python
+""" Superblock Hamiltonian split among several processes.
+
+In the DMRG algorithm the Hamiltonian of the superblock is a sum of terms,
+each a product of an operator on the left and one on the right of the
+superblock,
+
+.. math::
+    H=\sum_{t}c_{t}A_{t}\otimes B_{t}
+
+and the wavefunction is a matrix :math:`\psi` with the states of the left
+as columns and those of the right as rows, so each term acts as
+:math:`B_{t}\psi A_{t}^{T}`. When many states are kept, the operators for
+all the terms do not fit in the memory of a single computer. Here the
+terms are split among several processes, each one keeping only the
+operators for its terms. To multiply the wavefunction by the Hamiltonian,
+it is sent to all the processes, each one applies its terms, and the
+results are summed up. Only the wavefunction and the sums travel between
+the processes.
+
+The processes talk through a communicator. `SerialCommunicator` keeps all
+the terms in the same process, and `MultiprocessingCommunicator` runs
+them in several processes in the same computer. A communicator for
+several computers, e.g. over MPI, needs the same three methods: `scatter`
+to give each process its terms, `sum_over_processes` to broadcast the
+wavefunction and reduce the results, and `close`.
+
+With `--shared` the operators are not sent to the processes, but written
+once to shared memory (see `shared_operators`), and each process maps
+the ones for its terms without copying them.
+
+With `--precision=single` the operators and the wavefunction are cast to
+float32 for the multiplication, which halves the memory of the
+operators, and makes the multiplication faster, while the Lanczos
+algorithm keeps its vectors in float64 (see `precision`). With
+`--compare` you can check how much this changes the energy.
+
+The DMRG scripts use it through `superblock.SuperblockSystem`, which
+passes the terms of the superblock at each step, i.e. the block and site
+operators of the `System`, and with `--processes` the terms are split
+among that many processes.
+
+This script builds the terms for a chain cut in the middle, with the
+operators of each half from `exact_diagonalization`, and calculates the
+ground state energy with the Lanczos algorithm using the distributed
+multiplication, so you can check it against the whole Hamiltonian and
+time it without the rest of the DMRG.
+
+Usage:
+  distributed_matvec.py (-n=<sites>) [--model=<model> -U=<U_over_t> --processes=<processes> --shared --precision=<policy> --compare]
+  distributed_matvec.py -h | --help
+
+Options:
+  -h --help         Shows this screen.
+  -n <sites>        Number of sites of the chain.
+  --model=<model>   Model: heisenberg or hubbard [default: heisenberg]
+  -U <U_over_t>     Electronic interaction in units of hopping [default: 0]
+  --processes=<processes>  Number of processes [default: 2]
+  --shared          Keep the operators in shared memory.
+  --precision=<policy>  Precision of the multiplication: double or single
+                        [default: double]
+  --compare         Compare with the Hamiltonian of the whole chain.
+
+"""
+from docopt import docopt
+from exact_diagonalization import ExactDiagonalization, get_placements
+from lazy_operators import Identity, KronOperator, apply_kron, get_dim
+from model_specs import make_heisenberg_model, make_hubbard_model
+from multiprocessing import Pipe, Process
+from precision import cast_superblock_terms, dtype_for_half_sweep
+from scipy.sparse.linalg import LinearOperator, eigsh
+from shared_operators import SharedOperatorStore, attach_operators
+import numpy as np
+import time
+
+def apply_superblock_terms(terms, psi):
+    """Applies a sum of terms to the wavefunction of a superblock.
+
+    The products by an `Identity` are skipped (see `lazy_operators`).
+
+    Parameters
+    ----------
+    terms : a list of tuples.
+        The terms, as (coupling, left_operator, right_operator).
+    psi : a numpy array of ndim = 2.
+        The wavefunction, with the states of the right as rows.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 2.
+        The sum of the terms applied to the wavefunction.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from distributed_matvec import apply_superblock_terms
+    >>> sigma_x = np.array([[0., 1.], [1., 0.]])
+    >>> psi = np.array([[1., 0.], [0., 0.]])
+    >>> apply_superblock_terms([(2., sigma_x, sigma_x)], psi)
+    array([[0., 0.],
+           [0., 2.]])
+    """
+    result = np.zeros_like(psi)
+    for coupling, left_operator, right_operator in terms:
+	# the rows of psi are the states of the right
+	result += apply_kron(psi, right_operator, left_operator, coupling)
+    return result
+
+def get_cost(term):
+    """Returns an estimate of the cost to apply a term."""
+    return sum(getattr(operator, 'nnz', np.size(operator)) for operator in
+	       term[1:])
+
+def partition_terms(terms, number_of_parts):
+    """Splits terms in parts with about the same cost.
+
+    Each term, from the most expensive, goes to the part with the lowest
+    cost so far.
+
+    Parameters
+    ----------
+    terms : a list of tuples.
+        The terms, as (coupling, left_operator, right_operator).
+    number_of_parts : an int.
+        The number of parts.
+
+    Returns
+    -------
+    result : a list of lists.
+        The terms in each part.
+    """
+    result = [[] for part in range(number_of_parts)]
+    costs = [0] * number_of_parts
+    for term in sorted(terms, key=get_cost, reverse=True):
+	cheapest = costs.index(min(costs))
+	result[cheapest].append(term)
+	costs[cheapest] += get_cost(term)
+    return result
+
+def share_terms(parts, store):
+    """Writes the operators of the terms to shared memory.
+
+    Each operator is written once, even if it is in several terms. For a
+    `KronOperator`, e.g. a block operator times a site operator in the
+    superblock, its factors are written, not the product.
+
+    Parameters
+    ----------
+    parts : a list of lists.
+        The terms in each part, as returned by `partition_terms`.
+    store : a SharedOperatorStore.
+        The store for the operators.
+
+    Returns
+    -------
+    result : a list of tuples.
+        For each part, the handle of the store and the terms, with the
+	names of the operators in the store instead of the operators, and
+	a tuple with the names of the factors for a `KronOperator`.
+    """
+    names = {}
+    def get_name(operator):
+	if isinstance(operator, Identity):
+	    # nothing to share, it is sent as is
+	    return operator
+	if isinstance(operator, KronOperator):
+	    return (get_name(operator.left_op), get_name(operator.right_op))
+	if id(operator) not in names:
+	    names[id(operator)] = str(len(names))
+	    store.put(names[id(operator)], operator)
+	return names[id(operator)]
+    named_parts = []
+    for part in parts:
+	named_parts.append([(coupling, get_name(left_operator),
+		             get_name(right_operator)) for
+			    coupling, left_operator, right_operator in part])
+    handle = store.get_handle()
+    return [(handle, named_part) for named_part in named_parts]
+
+def _get_names(name):
+    """Returns the names in the store for an operator from `share_terms`."""
+    if isinstance(name, tuple):
+	return _get_names(name[0]) + _get_names(name[1])
+    if isinstance(name, basestring):
+	return [name]
+    return []
+
+def attach_superblock_terms(shared_part):
+    """Returns the terms of a part, with the operators in shared memory.
+
+    Parameters
+    ----------
+    shared_part : a tuple.
+        The handle of the store and the terms, as returned by
+	`share_terms`.
+    """
+    handle, named_part = shared_part
+    names = set()
+    for coupling, left_name, right_name in named_part:
+	names.update(_get_names(left_name) + _get_names(right_name))
+    operators = attach_operators(dict((name, handle[name]) for name in
+		                      names))
+    def get_operator(name):
+	if isinstance(name, tuple):
+	    return KronOperator(get_operator(name[0]), get_operator(name[1]))
+	if isinstance(name, Identity):
+	    return name
+	return operators[name]
+    return [(coupling, get_operator(left_name), get_operator(right_name))
+	    for coupling, left_name, right_name in named_part]
+
+class SerialCommunicator(object):
+    """A communicator with a single process, the one calling it."""
+    def __init__(self):
+        super(SerialCommunicator, self).__init__()
+	self.size = 1
+	self.function = None
+	self.data = None
+
+    def scatter(self, parts, function, setup=None):
+        """Gives each process its part of the data.
+
+	Parameters
+	----------
+	parts : a list.
+	    The data for each process.
+	function : a function.
+	    What each process does with its data and the vectors it gets,
+	    as function(data, vector).
+	setup : a function, optional.
+	    What each process does with its part before getting vectors,
+	    as data = setup(part).
+	"""
+	part, = parts
+	if setup is not None:
+	    part = setup(part)
+	self.data = part
+	self.function = function
+
+    def sum_over_processes(self, vector):
+        """Sends a vector to all the processes and sums their results."""
+	return self.function(self.data, vector)
+
+    def close(self):
+        """Frees the data."""
+	self.data = None
+
+    def __enter__(self):
+	return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+	self.close()
+
+def _serve(connection, data, function, setup):
+    """Applies a function to the vectors sent by the main process."""
+    if setup is not None:
+	data = setup(data)
+    while True:
+	vector = connection.recv()
+	if vector is None:
+	    break
+	connection.send(function(data, vector))
+    connection.close()
+
+class MultiprocessingCommunicator(object):
+    """A communicator with several processes in the same computer.
+
+    Each process gets its data once, and then waits for vectors and sends
+    back its results.
+
+    Parameters
+    ----------
+    size : an int.
+        The number of processes.
+    """
+    def __init__(self, size):
+        super(MultiprocessingCommunicator, self).__init__()
+	self.size = size
+	self.connections = []
+	self.processes = []
+
+    def scatter(self, parts, function, setup=None):
+        """Starts the processes, giving each its part of the data.
+
+	Parameters
+	----------
+	parts : a list.
+	    The data for each process.
+	function : a function.
+	    What each process does with its data and the vectors it gets,
+	    as function(data, vector). It must be defined at the top level
+	    of a module.
+	setup : a function, optional.
+	    What each process does with its part before getting vectors,
+	    as data = setup(part). It must be defined at the top level of a
+	    module.
+	"""
+	if len(parts) != self.size:
+	    raise ValueError('There must be a part for each process.')
+	self.close()
+	for part in parts:
+	    connection, child_connection = Pipe()
+	    process = Process(target=_serve,
+		              args=(child_connection, part, function, setup))
+	    process.daemon = True
+	    process.start()
+	    child_connection.close()
+	    self.connections.append(connection)
+	    self.processes.append(process)
+
+    def sum_over_processes(self, vector):
+        """Sends a vector to all the processes and sums their results."""
+	for connection in self.connections:
+	    connection.send(vector)
+	result = self.connections[0].recv()
+	for connection in self.connections[1:]:
+	    result = result + connection.recv()
+	return result
+
+    def close(self):
+        """Stops the processes."""
+	for connection in self.connections:
+	    connection.send(None)
+	    connection.close()
+	for process in self.processes:
+	    process.join()
+	self.connections = []
+	self.processes = []
+
+    def __enter__(self):
+	return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+	self.close()
+
+def make_communicator(number_of_processes):
+    """Returns a communicator for a number of processes.
+
+    A `SerialCommunicator` for a single process, so the terms are applied
+    without sending anything, and a `MultiprocessingCommunicator`
+    otherwise.
+    """
+    if number_of_processes > 1:
+	return MultiprocessingCommunicator(number_of_processes)
+    return SerialCommunicator()
+
+class DistributedSuperblockHamiltonian(object):
+    """A superblock Hamiltonian with its terms split among processes.
+
+    Parameters
+    ----------
+    terms : a list of tuples.
+        The terms, as (coupling, left_operator, right_operator).
+    communicator : a SerialCommunicator or MultiprocessingCommunicator.
+        The communicator, which gets the terms of each process.
+    store : a SharedOperatorStore, optional.
+        Where to keep the operators, if you want them in shared memory.
+    dtype : a numpy dtype, optional.
+        The floating point type for the multiplication. The operators and
+	the wavefunction are cast to it, and the result is cast back to
+	the type of the vector.
+    """
+    def __init__(self, terms, communicator, store=None, dtype=np.float64):
+        super(DistributedSuperblockHamiltonian, self).__init__()
+	coupling, left_operator, right_operator = terms[0]
+	self.left_dim = get_dim(left_operator)
+	self.right_dim = get_dim(right_operator)
+	self.shape = (self.left_dim * self.right_dim,) * 2
+	self.communicator = communicator
+	self.dtype = dtype
+	terms = cast_superblock_terms(terms, dtype)
+	parts = partition_terms(terms, communicator.size)
+	if store is None:
+	    communicator.scatter(parts, apply_superblock_terms)
+	else:
+	    communicator.scatter(share_terms(parts, store),
+		                 apply_superblock_terms, attach_superblock_terms)
+
+    def matvec(self, vector):
+        """Multiplies a vector by the Hamiltonian.
+
+	The vector has the index of the left as the fastest one, i.e.
+	:math:`i=i_{left}+d_{left}i_{right}`.
+	"""
+	psi = np.reshape(vector, (self.right_dim, self.left_dim))
+	result = self.communicator.sum_over_processes(
+	    psi.astype(self.dtype, copy=False))
+	return result.astype(vector.dtype, copy=False).reshape(vector.shape)
+
+    def calculate_ground_state(self):
+        """Returns the lowest energy with the Lanczos algorithm."""
+	hamiltonian = LinearOperator(self.shape, matvec=self.matvec,
+		                     dtype=np.float64)
+	return eigsh(hamiltonian, 1, which='SA', return_eigenvectors=False)[0]
+
+def get_superblock_terms(model, site_operators, number_of_sites,
+	                 left_size):
+    """Returns the terms of a model on a chain cut in two.
+
+    The operators of each half act on all their states, i.e. there are no
+    conserved quantum numbers.
+
+    Parameters
+    ----------
+    model : a ModelFromSpec.
+        The model.
+    site_operators : a dict.
+        The operators of the site.
+    number_of_sites : an int.
+        The number of sites of the chain.
+    left_size : an int.
+        The number of sites in the left half.
+
+    Returns
+    -------
+    result : a list of tuples.
+        The terms, as (coupling, left_operator, right_operator), the first
+	two with the Hamiltonians of each half, and an `Identity` on the
+	other half.
+    """
+    left = ExactDiagonalization(model, site_operators, left_size)
+    right = ExactDiagonalization(model, site_operators,
+	                         number_of_sites - left_size)
+    left_placements = []
+    right_placements = []
+    crossing = []
+    for coupling, operators in get_placements(model, number_of_sites):
+	left_operators = [(site, name) for site, name in operators if
+		          site < left_size]
+	right_operators = [(site - left_size, name) for site, name in
+		           operators if site >= left_size]
+	if not right_operators:
+	    left_placements.append((coupling, left_operators))
+	elif not left_operators:
+	    right_placements.append((coupling, right_operators))
+	else:
+	    crossing.append((coupling,
+		             left.build_operator([(1., left_operators)]),
+			     right.build_operator([(1., right_operators)])))
+    left_identity = Identity(len(left.basis))
+    right_identity = Identity(len(right.basis))
+    return ([(1., left.build_operator(left_placements), right_identity),
+	     (1., left_identity, right.build_operator(right_placements))] +
+	    crossing)
+
+def main(args):
+    # the sites come from dmrg101, which you don't need to use the rest
+    from dmrg101.core.sites import ElectronicSite, SpinOneHalfSite
+    #
+    # read command-line arguments and build the terms
+    #
+    number_of_sites = int(args['-n'])
+    if args['--model'] == 'heisenberg':
+	site = SpinOneHalfSite()
+	model = make_heisenberg_model()
+    elif args['--model'] == 'hubbard':
+	site = ElectronicSite()
+	model = make_hubbard_model(float(args['-U']))
+    else:
+	raise ValueError('Model must be heisenberg or hubbard.')
+    terms = get_superblock_terms(model, site.operators, number_of_sites,
+	                         number_of_sites / 2)
+    number_of_processes = int(args['--processes'])
+    communicator = make_communicator(number_of_processes)
+    #
+    # calculate the ground state, with the terms split among the
+    # processes
+    #
+    dtype = dtype_for_half_sweep(args['--precision'], -1, 0)
+    store = None
+    if args['--shared']:
+	store = SharedOperatorStore()
+    # remove the shared files even if something goes wrong
+    try:
+	with communicator:
+	    hamiltonian = DistributedSuperblockHamiltonian(terms, communicator,
+							   store, dtype)
+	    start = time.time()
+	    energy = hamiltonian.calculate_ground_state()
+	    print ("The ground state energy is %8.6f (%d processes, %.2f s)." %
+		   (energy, number_of_processes, time.time() - start))
+	    if args['--compare']:
+		exact_diagonalization = ExactDiagonalization(
+		    model, site.operators, number_of_sites)
+		whole = exact_diagonalization.build_hamiltonian()
+		vector = np.random.rand(whole.shape[0])
+		difference = abs(whole.dot(vector) -
+			         hamiltonian.matvec(vector)).max()
+		print ("The largest difference with the whole Hamiltonian is "
+		       "%g." % difference)
+		exact_energy = eigsh(whole, 1, which='SA',
+			             return_eigenvectors=False)[0]
+		print ("The exact ground state energy is %8.6f, the error is "
+		       "%g." % (exact_energy, abs(energy - exact_energy)))
+    finally:
+	if store is not None:
+	    store.close()
+
+if __name__ == '__main__':
+    args = docopt(__doc__, version = 0.1)
+    main(args)
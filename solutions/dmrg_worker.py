@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+""" Runs many jobs of the DMRG scripts in a single process.
+
+Each script pays for starting Python and importing NumPy, SciPy and
+dmrg101 before doing anything, which for small chains can take longer
+than the calculation itself. When you run many short jobs, e.g. a scan
+of the field of the TFIM at small number of sites, you can pass them all
+to this worker instead, which imports each script once and calls its
+`main` for each job.
+
+The jobs are read from the standard input, or from a file, one per line,
+each as the command line of a script, e.g.::
+
+    tfim.py -m 20 -n 16 -s 2 -H 0.5 -o tfim_0.5.dat
+    tfim.py -m 20 -n 16 -s 2 -H 1.0 -o tfim_1.0.dat
+
+Empty lines and lines starting with '#' are skipped. The worker starts
+each job as soon as its line arrives, so you can keep it running and feed
+it jobs through a pipe. For each job, it writes a line to the standard
+output with 'ok', the time the job took, and the job, or 'error', the job,
+and what went wrong. A job that fails doesn't stop the worker. What the
+scripts print goes to the standard error, so it doesn't mix with these
+lines.
+
+Usage:
+  dmrg_worker.py [--jobs=FILE]
+  dmrg_worker.py -h | --help
+
+Options:
+  -h --help         Shows this screen.
+  --jobs=FILE       File with the jobs, instead of the standard input.
+
+"""
+from docopt import docopt
+import shlex
+import sys
+import time
+
+worker_scripts = ('exact_diagonalization', 'finite_temperature',
+		  'fit_central_charge', 'heisenberg', 'hubbard',
+		  'infinite_heisenberg', 'ladder', 'spectral_functions',
+		  'tfim', 'time_evolution', 'two_qbit_system')
+
+def parse_job(line):
+    """Returns the script and its arguments from the line of a job.
+
+    Parameters
+    ----------
+    line : a string.
+        The command line of the script.
+
+    Returns
+    -------
+    name : a string, or None.
+        The name of the script without extension, or None for empty lines
+	and comments.
+    argv : a list of strings.
+        The arguments of the script.
+
+    Raises
+    ------
+    ValueError
+        if the script cannot be run by the worker.
+
+    Examples
+    --------
+    >>> from dmrg_worker import parse_job
+    >>> parse_job("tfim.py -m 20 -n 16 -s 2 -H 0.5 --dir='my results'")
+    ('tfim', ['-m', '20', '-n', '16', '-s', '2', '-H', '0.5', '--dir=my results'])
+    >>> parse_job('# a comment')
+    (None, [])
+    """
+    words = shlex.split(line, comments=True)
+    if not words:
+	return None, []
+    name = words[0]
+    if name.endswith('.py'):
+	name = name[:-len('.py')]
+    if name not in worker_scripts:
+	raise ValueError('%s is not one of the scripts the worker can run: '
+			 '%s.' % (words[0], ', '.join(worker_scripts)))
+    return name, words[1:]
+
+class Worker(object):
+    """Runs jobs of the scripts, importing each script only once.
+
+    The scripts are imported when their first job arrives, so you only
+    pay for the modules you use.
+    """
+    def __init__(self):
+        super(Worker, self).__init__()
+	self.scripts = {}
+
+    def get_script(self, name):
+        """Returns the module of a script, importing it if needed."""
+	if name not in self.scripts:
+	    self.scripts[name] = __import__(name)
+	return self.scripts[name]
+
+    def run(self, name, argv):
+        """Runs a job.
+
+	Parameters
+	----------
+	name : a string.
+	    The name of the script, from `parse_job`.
+	argv : a list of strings.
+	    The arguments of the script.
+	"""
+	script = self.get_script(name)
+	saved_stdout = sys.stdout
+	sys.stdout = sys.stderr
+	try:
+	    args = docopt(script.__doc__, argv=argv, version=0.1)
+	    script.main(args)
+	finally:
+	    sys.stdout = saved_stdout
+
+def main(args):
+    if args['--jobs'] is not None:
+	jobs = open(args['--jobs'])
+    else:
+	jobs = sys.stdin
+    worker = Worker()
+    # readline instead of iterating, which reads ahead and would make
+    # the jobs piped one by one wait
+    for line in iter(jobs.readline, ''):
+	line = line.strip()
+	start = time.time()
+	try:
+	    name, argv = parse_job(line)
+	    if name is None:
+		continue
+	    worker.run(name, argv)
+	except (Exception, SystemExit) as error:
+	    # docopt exits on bad arguments, which shouldn't stop the worker
+	    message = str(error).replace('\n', ' ')
+	    print 'error %s: %s' % (line, message)
+	else:
+	    print 'ok %.3f %s' % (time.time() - start, line)
+	sys.stdout.flush()
+    if jobs is not sys.stdin:
+	jobs.close()
+
+if __name__ == '__main__':
+    args = docopt(__doc__, version = 0.1)
+    main(args)
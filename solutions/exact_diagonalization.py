@@ -0,0 +1,633 @@
+#!/usr/bin/env python
+""" Exact diagonalization for small systems.
+
+Calculates the ground state of a model on a chain by building the full
+Hamiltonian as a sparse matrix, for chains small enough (about 20 spins
+one-half, or 12 electronic sites) to keep a vector in memory. You can use
+it to check the results of the DMRG algorithm, as the models are the same
+you pass to the `System` (see `model_specs`), and the site operators are
+the ones in a dmrg101 `Site`.
+
+Each state of the basis is stored as an integer, whose digits in base
+`dim` (the dimension of the Hilbert space of a site) are the states of the
+sites, the first site being the least significant digit. For spins
+one-half these digits are bits. If the model conserves some quantum
+numbers, e.g. the total :math:`S^{z}` or the number of electrons, you can
+keep only the states with given values of these, which is much smaller
+than the whole Hilbert space. The basis is kept sorted, so finding the
+index of a state is a binary search, and each term of the Hamiltonian is
+applied to all the states of the basis at once.
+
+With `--compare` the energy per site is compared with the last one in a
+file written by one of the scripts implementing the DMRG algorithm, and
+the script exits with an error if they differ more than the tolerance.
+
+Usage:
+  exact_diagonalization.py (-n=<sites>) [--model=<model> --J2=<J2> -H=<field> -U=<U_over_t> --pbc --phi=<flux> --compare=FILE --tolerance=<tol>]
+  exact_diagonalization.py -h | --help
+
+Options:
+  -h --help           Shows this screen.
+  -n <sites>          Number of sites of the chain.
+  --model=<model>     Model: heisenberg, tfim or hubbard [default: heisenberg]
+  --J2=<J2>           Next-nearest neighbour coupling [default: 0]
+  -H <field>          Transverse field for the tfim [default: 0]
+  -U <U_over_t>       Electronic interaction in units of hopping [default: 0]
+  --pbc               Use periodic boundary conditions.
+  --phi=<flux>        Flux through the ring for the hubbard model, in units
+                      of pi, with --pbc [default: 0]
+  --compare=FILE      Compare with the results of the DMRG in this file.
+  --tolerance=<tol>   Relative error allowed in the comparison [default: 1e-6]
+
+"""
+from docopt import docopt
+from hubbard_with_flux import HubbardModelWithFlux
+from lattices import add_parity_operators
+from model_specs import make_j1_j2_heisenberg_model, make_tfim_model
+from result_files import get_column_index, load_table
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.linalg import eigsh
+import numpy as np
+import sys
+
+dense_limit = 400
+
+def get_charges(site_operators, conserved):
+    """Returns the quantum numbers of the states of a site.
+
+    Parameters
+    ----------
+    site_operators : a dict.
+        The operators of the site, as numpy arrays of ndim = 2.
+    conserved : a tuple of strings.
+        The names of the site operators for the conserved quantities.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 2.
+        The value of each conserved quantity (columns) for each state of
+	the site (rows).
+
+    Raises
+    ------
+    ValueError
+        if some conserved operator is not diagonal.
+    """
+    dim = site_operators['id'].shape[0]
+    result = np.zeros((dim, len(conserved)))
+    for i, name in enumerate(conserved):
+	operator = site_operators[name]
+	if np.any(operator - np.diag(np.diag(operator))):
+	    raise ValueError('Conserved operators must be diagonal.')
+	result[:, i] = np.diag(operator).real
+    return result
+
+def build_basis(number_of_sites, charges, sector=None, tolerance=1e-9):
+    """Returns the states with given values of the quantum numbers.
+
+    The states are built adding one site at a time, and dropping the ones
+    that can't reach the values you want with the sites left.
+
+    Parameters
+    ----------
+    number_of_sites : an int.
+        The number of sites of the chain.
+    charges : a numpy array of ndim = 2.
+        The quantum numbers of the states of a site, as returned by
+	`get_charges`.
+    sector : a tuple of doubles, optional.
+        The values of the quantum numbers. By default, all the states are
+	kept.
+    tolerance : a double.
+        The tolerance to compare the quantum numbers.
+
+    Returns
+    -------
+    result : a numpy array of ints.
+        The states, sorted.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from exact_diagonalization import build_basis
+    >>> build_basis(4, np.array([[-.5], [.5]]), (0.,))
+    array([ 3,  5,  6,  9, 10, 12])
+    """
+    dim, number_of_charges = charges.shape
+    lowest = charges.min(axis=0)
+    highest = charges.max(axis=0)
+    states = np.zeros(1, dtype=np.int64)
+    totals = np.zeros((1, number_of_charges))
+    for site in range(number_of_sites):
+	states = (states[:, np.newaxis] +
+		  np.arange(dim, dtype=np.int64) * dim ** site).ravel()
+	totals = (totals[:, np.newaxis, :] + charges).reshape(len(states),
+		                                              number_of_charges)
+	if sector is not None:
+	    sites_left = number_of_sites - site - 1
+	    missing = np.asarray(sector) - totals
+	    keep = np.all((missing >= sites_left * lowest - tolerance) &
+		          (missing <= sites_left * highest + tolerance), axis=1)
+	    states = states[keep]
+	    totals = totals[keep]
+    return np.sort(states)
+
+def get_sectors(number_of_sites, charges, decimals=9):
+    """Returns all the possible values of the quantum numbers.
+
+    Parameters
+    ----------
+    number_of_sites : an int.
+        The number of sites of the chain.
+    charges : a numpy array of ndim = 2.
+        The quantum numbers of the states of a site, as returned by
+	`get_charges`.
+    decimals : an int.
+        The number of decimals to tell apart two values.
+
+    Returns
+    -------
+    result : a list of tuples.
+        The values of the quantum numbers, sorted.
+    """
+    result = set([tuple(np.zeros(charges.shape[1]))])
+    for site in range(number_of_sites):
+	result = set(tuple(np.round(np.add(total, charge), decimals)) for
+		     total in result for charge in charges)
+    return sorted(result)
+
+def _apply_operators(states, dim, operators):
+    """Applies a product of operators on different sites to the states.
+
+    Parameters
+    ----------
+    states : a numpy array of ints.
+        The states.
+    dim : an int.
+        The dimension of the Hilbert space of a site.
+    operators : a list of tuples.
+        Each operator as (site, matrix).
+
+    Returns
+    -------
+    result : a list of tuples.
+        The result as a sum of (new_states, amplitudes), with the new
+	state and its amplitude for each of the `states`. The new state is
+	meaningless when the amplitude is zero.
+    """
+    result = [(states, np.ones(len(states)))]
+    for site, matrix in operators:
+	weight = dim ** site
+	if not np.any(matrix - np.diag(np.diag(matrix))):
+	    # diagonal operators don't change the states
+	    diagonal = np.diag(matrix)
+	    result = [(new_states, amplitudes *
+		       diagonal[(new_states // weight) % dim]) for
+		      new_states, amplitudes in result]
+	    continue
+	new_result = []
+	for new_states, amplitudes in result:
+	    digits = (new_states // weight) % dim
+	    for row, column in zip(*np.nonzero(matrix)):
+		new_result.append((new_states + (row - column) * weight,
+		                   np.where(digits == column,
+				            amplitudes * matrix[row, column], 0)))
+	result = new_result
+    return result
+
+def get_placements(model, number_of_sites, periodic=None):
+    """Returns all the terms of a model placed on a chain.
+
+    Parameters
+    ----------
+    model : a ModelFromSpec.
+        The model.
+    number_of_sites : an int.
+        The number of sites of the chain.
+    periodic : a bool, optional.
+        Whether to close the ring. By default, as the `periodic` attribute
+	of the model.
+
+    Returns
+    -------
+    result : a list of tuples.
+        Each term as (coupling, operators), and the operators as a list
+	of (site, name).
+
+    Notes
+    -----
+    With periodic boundary conditions, the bonds crossing the boundary
+    have the `boundary_coupling` of their term, if any, and their string
+    on the sites between their two ends along the chain, i.e. going the
+    other way around the ring.
+    """
+    if periodic is None:
+	periodic = model.periodic
+    result = []
+    for term in model.terms:
+	coupling = model.get_coupling(term.coupling)
+	if coupling == 0:
+	    continue
+	if len(term.operators) == 1:
+	    for site in range(number_of_sites):
+		result.append((coupling, [(site, term.operators[0])]))
+	    continue
+	left, right = term.operators
+	distance = term.get_range()
+	starts = range(number_of_sites - distance)
+	boundary_coupling = coupling
+	if periodic:
+	    starts = range(number_of_sites)
+	    if term.boundary_coupling is not None:
+		boundary_coupling = model.get_coupling(term.boundary_coupling)
+	for start in starts:
+	    factor = 1.
+	    if term.pattern is not None:
+		factor = term.pattern(start)
+	    if factor == 0:
+		continue
+	    end = (start + distance) % number_of_sites
+	    operators = [(start, left), (end, right)]
+	    if term.string is not None:
+		operators += [(site, term.string) for site in
+		              range(min(start, end) + 1, max(start, end))]
+	    if end < start:
+		result.append((factor * boundary_coupling, operators))
+	    else:
+		result.append((factor * coupling, operators))
+    return result
+
+def _place_block_operator(name, edge, direction, far_end):
+    """Returns a block operator as a list of (site, name).
+
+    The block has its edge at site `edge`, and its other sites at `edge +
+    direction`, `edge + 2 * direction`... up to its far end, at site
+    `far_end`.
+    """
+    if name == 'id':
+	return []
+    if '@' not in name:
+	return [(edge, name)]
+    operator, where = name.rsplit('@', 1)
+    string = None
+    if '*' in operator:
+	operator, string = operator.split('*', 1)
+    if where == 'end':
+	result = [(far_end, operator)]
+	if string is not None:
+	    result += [(edge + direction * d, string) for d in
+		       range(abs(far_end - edge))]
+	return result
+    distance = int(where)
+    result = [(edge + direction * distance, operator)]
+    if string is not None:
+	result += [(edge + direction * d, string) for d in range(distance)]
+    return result
+
+def get_superblock_placements(model, left_block_size, right_block_size):
+    """Returns the terms the DMRG puts in the superblock, on a chain.
+
+    Replays the calls to `System.add_to_hamiltonian` of a model (see
+    `model_specs`) as if the blocks were not truncated, and places each
+    operator on the sites of the chain it acts on: the left block, the
+    two single sites, and the right block, from left to right. The
+    Hamiltonian from these terms must have the same spectrum as the one
+    from `get_placements`, so you can check the terms of a model, and in
+    particular the bond closing the ring with periodic boundary
+    conditions, against the exact diagonalization of a small chain.
+
+    Parameters
+    ----------
+    model : a ModelFromSpec.
+        The model. Its `left_block_size` is set, if it has patterns.
+    left_block_size : an int.
+        The number of sites in the left block.
+    right_block_size : an int.
+        The number of sites in the right block.
+
+    Returns
+    -------
+    result : a list of tuples.
+        Each term as (coupling, operators), and the operators as a list
+	of (site, name), as for `get_placements`.
+
+    Examples
+    --------
+    The Heisenberg model on a ring of six sites:
+
+    >>> import numpy as np
+    >>> from exact_diagonalization import (ExactDiagonalization,
+    ...                                    get_superblock_placements)
+    >>> from model_specs import make_heisenberg_model
+    >>> site_operators = {'id': np.eye(2), 's_z': np.diag([-.5, .5]),
+    ...                   's_p': np.array([[0., 0.], [1., 0.]]),
+    ...                   's_m': np.array([[0., 1.], [0., 0.]])}
+    >>> model = make_heisenberg_model()
+    >>> model.periodic = True
+    >>> exact_diagonalization = ExactDiagonalization(model, site_operators, 6)
+    >>> exact = exact_diagonalization.build_hamiltonian()
+    >>> superblock = exact_diagonalization.build_operator(
+    ...     get_superblock_placements(model, 2, 2))
+    >>> print '%8.6f' % np.linalg.eigvalsh(superblock.toarray())[0]
+    -2.802776
+    >>> abs(superblock - exact).max() < 1e-12
+    True
+    """
+    if model.has_patterns:
+	model.left_block_size = left_block_size
+    number_of_sites = left_block_size + right_block_size + 2
+    plan = model.get_plan()
+    # the names of the operators in each block, as the DMRG keeps them
+    names = set(['id'])
+    for name, block_op, site_op in plan.operators_to_update:
+	names.add(name)
+    def get_block_names(block_size):
+	if block_size == 1:
+	    return set(name for name in names if '@' not in name)
+	result = set(['bh'])
+	for name in names:
+	    where = name.rsplit('@', 1)[-1]
+	    if ('@' not in name or where == 'end' or
+		    int(where) < block_size):
+		result.add(name)
+	return result
+    left_names = get_block_names(left_block_size)
+    right_names = get_block_names(right_block_size)
+    left_edge = left_block_size - 1
+    right_edge = left_block_size + 2
+    # the block Hamiltonians are the terms of the open chain inside them
+    open_placements = get_placements(model, number_of_sites, periodic=False)
+    def get_block_hamiltonian(first, last):
+	return [(coupling, operators) for coupling, operators in
+		open_placements if
+		all(first <= site <= last for site, name in operators)]
+    result = []
+    for args, kwargs in plan.get_hamiltonian_calls(left_names, right_names):
+	if kwargs.get('left_block_op') == 'bh':
+	    result += get_block_hamiltonian(0, left_edge)
+	    continue
+	if kwargs.get('right_block_op') == 'bh':
+	    result += get_block_hamiltonian(right_edge, number_of_sites - 1)
+	    continue
+	left, left_site, right_site, right, coupling = args
+	operators = _place_block_operator(left, left_edge, -1, 0)
+	if left_site != 'id':
+	    operators.append((left_block_size, left_site))
+	if right_site != 'id':
+	    operators.append((left_block_size + 1, right_site))
+	operators += _place_block_operator(right, right_edge, 1,
+		                           number_of_sites - 1)
+	result.append((coupling, operators))
+    return result
+
+class ExactDiagonalization(object):
+    """Exact diagonalization of a model on a chain.
+
+    Parameters
+    ----------
+    model : a ModelFromSpec.
+        The model.
+    site_operators : a dict.
+        The operators of the site, as numpy arrays of ndim = 2, e.g. the
+	`operators` of a dmrg101 `Site`.
+    number_of_sites : an int.
+        The number of sites of the chain.
+    conserved : a tuple of strings, optional.
+        The names of the site operators for the conserved quantities, which
+	must be diagonal.
+    sector : a tuple of doubles, optional.
+        The values of the conserved quantities. By default, the whole
+	Hilbert space is used.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from exact_diagonalization import ExactDiagonalization
+    >>> from model_specs import make_heisenberg_model
+    >>> site_operators = {'id': np.eye(2), 's_z': np.diag([-.5, .5]),
+    ...                   's_p': np.array([[0., 0.], [1., 0.]]),
+    ...                   's_m': np.array([[0., 1.], [0., 0.]])}
+    >>> exact_diagonalization = ExactDiagonalization(make_heisenberg_model(),
+    ...                                              site_operators, 4,
+    ...                                              ('s_z',), (0.,))
+    >>> energies, wavefunctions = exact_diagonalization.calculate_ground_state()
+    >>> print '%8.6f' % energies[0]
+    -1.616025
+    """
+    def __init__(self, model, site_operators, number_of_sites, conserved=(),
+		 sector=None):
+        super(ExactDiagonalization, self).__init__()
+	self.model = model
+	self.site_operators = site_operators
+	self.number_of_sites = number_of_sites
+	self.dim = site_operators['id'].shape[0]
+	charges = get_charges(site_operators, conserved)
+	if not conserved:
+	    sector = None
+	self.basis = build_basis(number_of_sites, charges, sector)
+
+    def get_placements(self):
+        """Returns all the terms of the model placed on the chain.
+
+	See `get_placements`.
+	"""
+	return get_placements(self.model, self.number_of_sites)
+
+    def build_operator(self, placements, target=None):
+        """Returns a sum of products of site operators as a sparse matrix.
+
+	Parameters
+	----------
+	placements : a list of tuples.
+	    Each term as (coupling, operators), and the operators as a list
+	    of (site, name), as returned by `get_placements`.
+	target : an ExactDiagonalization, optional.
+	    The one with the sector where the operator takes the states,
+	    e.g. with one more electron for a creation operator. By default,
+	    the same sector.
+
+	Returns
+	-------
+	result : a scipy.sparse.csr_matrix.
+	    The operator from the basis to the basis of `target`.
+
+	Raises
+	------
+	ValueError
+	    if the operator does not take the states to the sector of
+	    `target`.
+	"""
+	if target is None:
+	    target = self
+	size = len(target.basis)
+	columns = np.arange(len(self.basis))
+	all_rows = []
+	all_columns = []
+	all_values = []
+	for coupling, operators in placements:
+	    matrices = [(site, self.site_operators[name]) for site, name in
+		        operators]
+	    for new_states, amplitudes in _apply_operators(self.basis,
+		                                           self.dim, matrices):
+		nonzero = amplitudes != 0
+		new_states = new_states[nonzero]
+		rows = np.searchsorted(target.basis, new_states)
+		rows = np.minimum(rows, size - 1)
+		if np.any(target.basis[rows] != new_states):
+		    raise ValueError('The operator does not conserve the '
+			             'quantum numbers.')
+		all_rows.append(rows)
+		all_columns.append(columns[nonzero])
+		all_values.append(coupling * amplitudes[nonzero])
+	shape = (size, len(self.basis))
+	if not all_values:
+	    return csr_matrix(shape)
+	return coo_matrix((np.concatenate(all_values),
+	                   (np.concatenate(all_rows),
+			    np.concatenate(all_columns))),
+			  shape=shape).tocsr()
+
+    def build_hamiltonian(self):
+        """Returns the Hamiltonian as a sparse matrix.
+
+	Returns
+	-------
+	result : a scipy.sparse.csr_matrix.
+	    The Hamiltonian in the basis.
+
+	Raises
+	------
+	ValueError
+	    if the model does not conserve the quantum numbers.
+	"""
+	return self.build_operator(self.get_placements())
+
+    def get_product_state(self, local_states):
+        """Returns a product state as a vector in the basis.
+
+	Parameters
+	----------
+	local_states : a list of numpy arrays of ndim = 1.
+	    The state of each site.
+
+	Returns
+	-------
+	result : a numpy array of ndim = 1.
+	    The amplitude of each state of the basis. The part of the
+	    product state outside the basis is dropped.
+	"""
+	result = np.ones(len(self.basis), dtype=np.result_type(*local_states))
+	for site, local_state in enumerate(local_states):
+	    result *= local_state[(self.basis // self.dim ** site) % self.dim]
+	return result
+
+    def calculate_ground_state(self, number_of_states=1):
+        """Calculates the lowest eigenstates of the Hamiltonian.
+
+	Small Hamiltonians are diagonalized as dense matrices, and large
+	ones with the Lanczos algorithm.
+
+	Parameters
+	----------
+	number_of_states : an int.
+	    How many eigenstates you want.
+
+	Returns
+	-------
+	energies : a numpy array of ndim = 1.
+	    The energies, from the lowest.
+	wavefunctions : a numpy array of ndim = 2.
+	    The eigenstates as columns, in the basis.
+	"""
+	hamiltonian = self.build_hamiltonian()
+	if hamiltonian.shape[0] <= max(dense_limit, number_of_states + 1):
+	    energies, wavefunctions = np.linalg.eigh(hamiltonian.toarray())
+	else:
+	    energies, wavefunctions = eigsh(hamiltonian, number_of_states,
+		                            which='SA')
+	order = np.argsort(energies)[:number_of_states]
+	return energies[order], wavefunctions[:, order]
+
+def calculate_lowest_energy(model, site_operators, number_of_sites,
+	                    conserved=()):
+    """Returns the lowest energy of a model among all the sectors.
+
+    Parameters
+    ----------
+    model : a ModelFromSpec.
+        The model.
+    site_operators : a dict.
+        The operators of the site.
+    number_of_sites : an int.
+        The number of sites of the chain.
+    conserved : a tuple of strings, optional.
+        The names of the site operators for the conserved quantities.
+
+    Returns
+    -------
+    energy : a double.
+        The lowest energy.
+    sector : a tuple of doubles.
+        The values of the conserved quantities for the lowest energy.
+    """
+    charges = get_charges(site_operators, conserved)
+    result = None
+    for sector in get_sectors(number_of_sites, charges):
+	exact_diagonalization = ExactDiagonalization(model, site_operators,
+		                                     number_of_sites,
+						     conserved, sector)
+	energies, wavefunctions = (
+	    exact_diagonalization.calculate_ground_state() )
+	if result is None or energies[0] < result[0]:
+	    result = (energies[0], sector)
+    return result
+
+def main(args):
+    # the sites come from dmrg101, which you don't need to use the rest
+    from dmrg101.core.sites import ElectronicSite, SpinOneHalfSite
+    #
+    # create the site and model
+    #
+    number_of_sites = int(args['-n'])
+    if args['--model'] == 'heisenberg':
+	site = SpinOneHalfSite()
+	model = make_j1_j2_heisenberg_model(J2=float(args['--J2']))
+	conserved = ('s_z',)
+    elif args['--model'] == 'tfim':
+	site = SpinOneHalfSite()
+	model = make_tfim_model(float(args['-H']))
+	conserved = ()
+    elif args['--model'] == 'hubbard':
+	site = ElectronicSite()
+	add_parity_operators(site)
+	model = HubbardModelWithFlux(float(args['--phi']), float(args['-U']))
+	conserved = ('n_up', 'n_down')
+    else:
+	raise ValueError('Model must be heisenberg, tfim or hubbard.')
+    model.periodic = args['--pbc']
+    #
+    # diagonalize
+    #
+    energy, sector = calculate_lowest_energy(model, site.operators,
+	                                     number_of_sites, conserved)
+    energy_per_site = energy / number_of_sites
+    print "The ground state energy is %8.6f." % energy
+    print "The energy per site is %8.6f." % energy_per_site
+    if conserved:
+	print "The ground state has %s = %s." % (', '.join(conserved),
+		                                 ', '.join(map(str, sector)))
+    #
+    # compare with the DMRG
+    #
+    if args['--compare'] is not None:
+	data = load_table(args['--compare'])
+	dmrg_energy = data[-1, get_column_index('energy')]
+	relative_error = abs((dmrg_energy - energy_per_site) / energy_per_site)
+	print "The DMRG energy per site is %8.6f, relative error %g." % (
+	    dmrg_energy, relative_error)
+	if relative_error > float(args['--tolerance']):
+	    sys.exit('The DMRG energy differs from the exact one.')
+
+if __name__ == '__main__':
+    args = docopt(__doc__, version = 0.1)
+    main(args)
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+""" Thermodynamics of a chain at finite temperature with purification.
+
+Calculates the energy, specific heat and entropy of a chain at finite
+temperature. The thermal density matrix :math:`\\rho=e^{-\\beta H}/Z` is
+written as a pure state of the chain and a copy of it, the ancillas:
+
+.. math::
+    |\\psi(\\beta)\\rangle=e^{-\\beta H/2}|\\psi(0)\\rangle,\qquad
+    \\rho=\mathrm{Tr}_{ancillas}|\\psi(\\beta)\\rangle\langle\\psi(\\beta)|
+
+where at infinite temperature each site is maximally entangled with its
+ancilla, so :math:`\\rho(0)` is the identity. The Hamiltonian only acts on
+the physical sites, so you can take each site and its ancilla as a single
+`Site` of dmrg101, with dimension the square of that of the site and the
+same operators (see `make_purified_site`), and use the same models and
+`System` as for the ground state. The state at infinite temperature is a
+product state of these sites, and it is evolved in imaginary time with
+the time-dependent DMRG of `time_evolution`, i.e. with the gates of the
+bonds applied in sweeps of a `superblock.SuperblockSystem` keeping the
+states of the purified state (see `targeting`.) The energy is measured
+with the superblock Hamiltonian.
+
+Each step of the evolution cools the chain a bit more, so a single run
+gives all the temperatures from infinite down to `1 / beta`, with no
+sampling noise. The entropy is obtained by integrating the energy,
+
+.. math::
+    S(\\beta)=N\log d+\\beta E(\\beta)-\int_{0}^{\\beta}E(\\beta')d\\beta'
+
+and the specific heat is :math:`C=-\\beta^{2}dE/d\\beta`.
+
+With `--exact` the results are calculated instead with all the energies
+of the Hamiltonian from `exact_diagonalization`, for small chains.
+
+Each row of the output has the inverse temperature, the temperature, and
+the energy, specific heat and entropy per site, followed for the
+purification by the total discarded weight and the largest number of
+states kept.
+
+Usage:
+  finite_temperature.py (-n=<sites> --beta=<beta>) [--model=<model> -H=<field> --dbeta=<dbeta> -m=<states> -w=<weight> --exact --dir=DIR -o=FILE]
+  finite_temperature.py -h | --help
+
+Options:
+  -h --help         Shows this screen.
+  -n <sites>        Number of sites of the chain.
+  --beta=<beta>     Lowest inverse temperature.
+  --model=<model>   Model: heisenberg or tfim [default: heisenberg]
+  -H <field>        Transverse field for the tfim [default: 1]
+  --dbeta=<dbeta>   Step in inverse temperature [default: 0.05]
+  -m <states>       Largest number of states kept [default: 200]
+  -w <weight>       Largest discarded weight in each truncation
+                    [default: 1e-10]
+  --exact           Use all the energies of the Hamiltonian.
+  -o --output=FILE  Ouput file [default: finite_temperature.dat]
+  --dir=DIR         Ouput directory [default: ./]
+
+"""
+from dmrg101.core.sites import Site, SpinOneHalfSite
+from docopt import docopt
+from exact_diagonalization import ExactDiagonalization
+from model_specs import make_heisenberg_model, make_tfim_model
+from superblock import SuperblockSystem
+from targeting import TargetedSweeps
+from time_evolution import do_trotter_step, get_bond_hamiltonians, make_gates
+import numpy as np
+import os
+
+def make_purified_site(site):
+    """Returns a site made of a site and its ancilla.
+
+    Parameters
+    ----------
+    site : a Site.
+        The site.
+
+    Returns
+    -------
+    result : a Site.
+        A site with the square of the dimension, and the same operators
+	acting on the site, and as the identity on the ancilla, with the
+	state of the site as the first index.
+
+    Examples
+    --------
+    >>> from dmrg101.core.sites import SpinOneHalfSite
+    >>> from finite_temperature import make_purified_site
+    >>> purified_site = make_purified_site(SpinOneHalfSite())
+    >>> print purified_site.dim, purified_site.operators['s_z'].diagonal()
+    4 [-0.5 -0.5  0.5  0.5]
+    """
+    identity = np.eye(site.dim)
+    result = Site(site.dim * site.dim)
+    for name, operator in site.operators.iteritems():
+	if name not in result.operators:
+	    result.add_operator(name)
+	result.operators[name] = np.kron(operator, identity)
+    return result
+
+def cool_down(model, site, number_of_sites, beta, beta_step, max_states,
+	      max_discarded_weight):
+    """Cools a chain down from infinite temperature.
+
+    Parameters
+    ----------
+    model : a ModelFromSpec.
+        The model, with on-site and nearest neighbour terms.
+    site : a Site.
+        The site of the chain.
+    number_of_sites : an int.
+        The number of sites.
+    beta : a double.
+        The lowest inverse temperature.
+    beta_step : a double.
+        The step in inverse temperature.
+    max_states : an int.
+        The largest number of states you want to keep.
+    max_discarded_weight : a double.
+        The largest discarded weight in each truncation.
+
+    Yields
+    ------
+    beta : a double.
+        The inverse temperature, starting at zero.
+    energy : a double.
+        The energy.
+    discarded_weight : a double.
+        The total discarded weight so far.
+    states : an int.
+        The largest number of states kept.
+    """
+    purified_site = make_purified_site(site)
+    system = SuperblockSystem(purified_site)
+    system.model = model
+    system.number_of_sites = number_of_sites
+    sweeps = TargetedSweeps(system, number_of_sites, max_states,
+	                    max_discarded_weight)
+    # each site maximally entangled with its ancilla
+    local_state = np.eye(site.dim).ravel() / np.sqrt(site.dim)
+    sweeps.vectors['state'] = sweeps.make_product_state(
+	[local_state] * number_of_sites)
+    # each step of the evolution is exp(-beta_step * H / 2), as the
+    # density matrix is the square of the state
+    gates = make_gates(get_bond_hamiltonians(model, purified_site.operators,
+	                                     number_of_sites),
+		       beta_step / 4., imaginary=True)
+    number_of_steps = int(round(beta / beta_step))
+    for step in range(number_of_steps + 1):
+	if step > 0:
+	    do_trotter_step(sweeps, gates)
+	    state = sweeps.vectors['state']
+	    sweeps.vectors['state'] = state / np.linalg.norm(state)
+	# the sweeps are at the first configuration again
+	yield (step * beta_step, sweeps.get_energy(sweeps.vectors['state']),
+	       sweeps.discarded_weight, max(sweeps.max_states_kept, 1))
+
+def calculate_exact_energies(energies, betas):
+    """Returns the thermal average of the energy.
+
+    Parameters
+    ----------
+    energies : a numpy array of ndim = 1.
+        All the energies of the Hamiltonian.
+    betas : a numpy array of ndim = 1.
+        The inverse temperatures.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 1.
+        The average energy at each temperature.
+    """
+    energies = np.asarray(energies)
+    exponents = -np.outer(betas, energies - energies.min())
+    weights = np.exp(exponents)
+    return np.dot(weights, energies) / weights.sum(axis=1)
+
+def calculate_thermodynamics(betas, energies, dim, number_of_sites):
+    """Returns the specific heat and entropy from the energy.
+
+    Parameters
+    ----------
+    betas : a numpy array of ndim = 1.
+        The inverse temperatures, starting at zero.
+    energies : a numpy array of ndim = 1.
+        The energy at each temperature.
+    dim : an int.
+        The dimension of the Hilbert space of a site.
+    number_of_sites : an int.
+        The number of sites.
+
+    Returns
+    -------
+    specific_heat : a numpy array of ndim = 1.
+        The specific heat, :math:`-\\beta^{2}dE/d\\beta`.
+    entropy : a numpy array of ndim = 1.
+        The entropy.
+
+    Examples
+    --------
+    For a two-level system with energies -1 and 1:
+
+    >>> import numpy as np
+    >>> from finite_temperature import calculate_thermodynamics
+    >>> betas = np.linspace(0., 1., 1001)
+    >>> specific_heat, entropy = calculate_thermodynamics(betas,
+    ...                                                   -np.tanh(betas), 2, 1)
+    >>> print '%.3f %.3f' % (specific_heat[-1], entropy[-1])
+    0.420 0.365
+    """
+    betas = np.asarray(betas)
+    energies = np.asarray(energies)
+    specific_heat = -betas ** 2 * np.gradient(energies, betas)
+    integral = np.concatenate(([0.], np.cumsum(np.diff(betas) *
+	                                       (energies[1:] +
+						energies[:-1]) / 2.)))
+    entropy = number_of_sites * np.log(dim) + betas * energies - integral
+    return specific_heat, entropy
+
+def main(args):
+    #
+    # read command-line arguments and set the model
+    #
+    site = SpinOneHalfSite()
+    dim = site.dim
+    number_of_sites = int(args['-n'])
+    beta = float(args['--beta'])
+    beta_step = float(args['--dbeta'])
+    if args['--model'] == 'heisenberg':
+	model = make_heisenberg_model()
+    elif args['--model'] == 'tfim':
+	model = make_tfim_model(float(args['-H']))
+    else:
+	raise ValueError('Model must be heisenberg or tfim.')
+    #
+    # calculate the energy at each temperature
+    #
+    if args['--exact']:
+	exact_diagonalization = ExactDiagonalization(model, site.operators,
+		                                     number_of_sites)
+	hamiltonian = exact_diagonalization.build_hamiltonian().toarray()
+	betas = beta_step * np.arange(int(round(beta / beta_step)) + 1)
+	energies = calculate_exact_energies(np.linalg.eigvalsh(hamiltonian),
+		                            betas)
+	extra_columns = []
+    else:
+	rows = list(cool_down(model, site, number_of_sites, beta,
+		              beta_step, int(args['-m']), float(args['-w'])))
+	betas, energies, discarded_weights, states = map(np.array, zip(*rows))
+	extra_columns = [discarded_weights, states]
+    specific_heat, entropy = calculate_thermodynamics(betas, energies, dim,
+	                                              number_of_sites)
+    #
+    # save results
+    #
+    with np.errstate(divide='ignore'):
+	temperatures = 1. / betas
+    columns = [betas, temperatures, energies / number_of_sites,
+	       specific_heat / number_of_sites, entropy / number_of_sites]
+    output_file = os.path.join(os.path.abspath(args['--dir']), args['--output'])
+    f = open(output_file, 'w')
+    f.write('\n'.join(' '.join('%s' % x for x in row) for row in
+		      zip(*(columns + extra_columns))))
+    f.close()
+    print 'Results stored in ' + output_file
+
+if __name__ == '__main__':
+    args = docopt(__doc__, version = 0.1)
+    main(args)
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+""" Fits the central charge from the entanglement entropies of many files.
+
+For each file, takes the entanglement entropies of the lower branch (as
+`plot_entropies_obc.py` does) and fits them by least squares to the CFT
+result for open boundary conditions:
+
+.. :math: S_{vN} = \frac{c}{6}ln(x') + const
+
+where :math:`x'=(2L/\pi)\sin{\pi x /L}`. The central charge and its error
+bar, from the covariance of the fit, are written to a summary file, and a
+figure with the data and the fit is saved for each file. The figures are
+drawn without a display, so you can run this on a compute node, and the
+files are processed in parallel.
+
+If you don't pass the number of sites, it is taken from each file as the
+size of the largest block plus three, which is right for the output of the
+scripts implementing the full DMRG algorithm in this tutorial.
+
+With `--spectra`, the files are instead logs of the kept spectra, written
+with the `--spectra` option of the scripts, and you can fit the Renyi
+entropies, :math:`S_n=\frac{c}{12}(1+\frac{1}{n})ln(x') + const`.
+
+See e.g. P. Calabrese and J. Cardy, J. Stat. Mech. P06002 (2004).
+
+Usage:
+  fit_central_charge.py <file>... [-n=<sites> --half-sweep=<n> --dir=DIR -o=FILE -p=<processes> --format=EXT --spectra --renyi=<n>]
+  fit_central_charge.py -h | --help
+
+Options:
+  -h --help            Shows this screen.
+  -n <sites>           Number of sites of the chain.
+  --half-sweep=<n>     Use only the steps in this half-sweep [default: last]
+  -o --output=FILE     Ouput file for the fits [default: central_charges.dat]
+  --dir=DIR            Ouput directory [default: ./]
+  -p <processes>       Number of worker processes [default: 1]
+  --format=EXT         Format of the figures [default: png]
+  --spectra            The files are logs of the spectra (see spectra_log).
+  --renyi=<n>          Renyi index of the entropy, with --spectra [default: 1]
+
+"""
+from docopt import docopt
+from multiprocessing import Pool
+from result_files import get_column_index, load_table, select_rows
+from spectra_log import SpectraLogReader
+import numpy as np
+import os
+import sys
+
+def calculate_log_chord_length(sizes, number_of_sites):
+    """Returns the variable for the CFT fit, :math:`ln(x')`.
+
+    Parameters
+    ----------
+    sizes : a numpy array of ndim = 1.
+        The sizes of the growing block, not including the single site.
+    number_of_sites : an int.
+        The number of sites of the chain.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 1.
+        The logarithm of :math:`x'=(2L/\pi)\sin{\pi x /L}`, with x the
+	size of the block including the single site.
+    """
+    x_prime = np.sin(np.pi * (sizes + 1) / number_of_sites)
+    x_prime *= 2 * number_of_sites / np.pi
+    return np.log(x_prime)
+
+def fit_central_charge(x, y, renyi_index=1):
+    """Fits the entropies to the CFT result by least squares.
+
+    Parameters
+    ----------
+    x : a numpy array of ndim = 1.
+        The logarithm of the chord length, :math:`ln(x')`.
+    y : a numpy array of ndim = 1.
+        The entanglement entropies.
+    renyi_index : a double.
+        The Renyi index of the entropies, 1 for the von Neumann entropy.
+
+    Returns
+    -------
+    central_charge : a double.
+        The slope of the fit divided by :math:`(1+1/n)/12`, i.e. six
+	times the slope for the von Neumann entropy.
+    error : a double.
+        The standard error of `central_charge`, from the covariance of
+	the fit.
+    intercept : a double.
+        The non-universal constant in the fit.
+
+    Raises
+    ------
+    ValueError
+        if there are less than three points to fit.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from fit_central_charge import fit_central_charge
+    >>> x = np.linspace(0, 3, 10)
+    >>> c, error, intercept = fit_central_charge(x, x / 6 + .7)
+    >>> round(c, 6), round(intercept, 6)
+    (1.0, 0.7)
+    >>> c, error, intercept = fit_central_charge(x, x / 8 + .7, renyi_index=2)
+    >>> round(c, 6)
+    1.0
+    """
+    if len(x) < 3:
+	raise ValueError('You need at least three points to fit.')
+    design_matrix = np.column_stack((x, np.ones_like(x)))
+    coefficients, residuals, rank, singular_values = (
+	np.linalg.lstsq(design_matrix, y, rcond=-1) )
+    variance = np.sum((y - np.dot(design_matrix, coefficients)) ** 2)
+    variance /= len(x) - 2
+    covariance = variance * np.linalg.inv(np.dot(design_matrix.T,
+	                                         design_matrix))
+    slope, intercept = coefficients
+    factor = 12. / (1. + 1. / renyi_index)
+    return (factor * slope, factor * np.sqrt(covariance[0, 0]), intercept)
+
+def get_figure_names(data_files):
+    """Returns the name of the figure of each data file.
+
+    The names are the paths of the files relative to the directory that
+    has all of them, without the extension and with the separators
+    replaced by underscores, so that the figures of files with the same
+    name in different directories don't overwrite each other.
+
+    Parameters
+    ----------
+    data_files : a list of strings.
+        The names of the data files.
+
+    Returns
+    -------
+    result : a list of strings.
+        The names of the figures, without the extension.
+
+    Examples
+    --------
+    >>> from fit_central_charge import get_figure_names
+    >>> get_figure_names(['/runs/L100/heisenberg.dat',
+    ...                   '/runs/L200/heisenberg.dat'])
+    ['L100_heisenberg', 'L200_heisenberg']
+    >>> get_figure_names(['/runs/L100/heisenberg.dat'])
+    ['heisenberg']
+    """
+    paths = [os.path.abspath(data_file).split(os.sep) for data_file in
+	     data_files]
+    common = os.path.commonprefix([path[:-1] for path in paths])
+    return [os.path.splitext('_'.join(path[len(common):]))[0] for path in
+	    paths]
+
+def fit_and_plot_file(job):
+    """Fits the data in a file and saves a figure with the fit.
+
+    Parameters
+    ----------
+    job : a tuple.
+        The name of the data file, the number of sites (or None), the
+	half-sweep, the name of the figure file, its format, and the
+	Renyi index if the data file is a log of the spectra, or None.
+
+    Returns
+    -------
+    result : a tuple.
+        The name of the data file, the number of sites, the central
+	charge and its error.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    (data_file, number_of_sites, half_sweep, figure_file, figure_format,
+     renyi_index) = job
+    if renyi_index is not None:
+	data = SpectraLogReader(data_file).as_table(renyi_index)
+    else:
+	data = load_table(data_file)
+	renyi_index = 1
+    sizes = data[:, get_column_index('size')]
+    if number_of_sites is None:
+	number_of_sites = int(sizes.max()) + 3
+    # the system (opposed to enviroment) has even sites:
+    data = select_rows(data, half_sweep=half_sweep, parity='odd')
+    x = calculate_log_chord_length(data[:, get_column_index('size')],
+		                   number_of_sites)
+    y = data[:, get_column_index('entropy')]
+    central_charge, error, intercept = fit_central_charge(x, y, renyi_index)
+    figure = plt.figure()
+    axes = figure.add_subplot(111)
+    axes.plot(x, y, 'bo')
+    axes.plot(x, central_charge * x * (1. + 1. / renyi_index) / 12 +
+	      intercept, 'g-')
+    axes.set_xlabel("ln(x')")
+    axes.set_ylabel('S')
+    axes.set_title('c = %8.6f +/- %8.6f' % (central_charge, error))
+    figure.savefig(figure_file, format=figure_format)
+    plt.close(figure)
+    return data_file, number_of_sites, central_charge, error
+
+def process_file(job):
+    """Does `fit_and_plot_file`, returning its error instead of raising it.
+
+    `Pool.map` raises the first error of the jobs, and the fits of the
+    other files are lost, so the error of each file is kept with its
+    result, and reported at the end.
+
+    Parameters
+    ----------
+    job : a tuple.
+        The job, as for `fit_and_plot_file`.
+
+    Returns
+    -------
+    result : a tuple.
+        The result of `fit_and_plot_file` and None, or if it fails, the
+	name of the data file, None, nan, nan and the error message.
+    """
+    try:
+	return fit_and_plot_file(job) + (None,)
+    except Exception as error:
+	return (job[0], None, np.nan, np.nan,
+		'%s: %s' % (error.__class__.__name__, error))
+
+def main(args):
+    #
+    # read command-line arguments and build the list of jobs
+    #
+    output_dir = os.path.abspath(args['--dir'])
+    number_of_sites = args['-n']
+    if number_of_sites is not None:
+	number_of_sites = int(number_of_sites)
+    half_sweep = args['--half-sweep']
+    if half_sweep != 'last':
+	half_sweep = int(half_sweep)
+    figure_format = args['--format']
+    renyi_index = None
+    if args['--spectra']:
+	renyi_index = float(args['--renyi'])
+    jobs = []
+    data_files = [os.path.abspath(data_file) for data_file in args['<file>']]
+    for data_file, name in zip(data_files, get_figure_names(data_files)):
+	figure_file = os.path.join(output_dir, name + '.' + figure_format)
+	jobs.append((data_file, number_of_sites, half_sweep, figure_file,
+		     figure_format, renyi_index))
+    #
+    # do the fits in parallel
+    #
+    number_of_processes = int(args['-p'])
+    if number_of_processes > 1:
+	pool = Pool(number_of_processes)
+	results = pool.map(process_file, jobs)
+	pool.close()
+	pool.join()
+    else:
+	results = map(process_file, jobs)
+    #
+    # report the files that could not be fitted, and save the results of
+    # the others
+    #
+    failed = [result for result in results if result[-1] is not None]
+    for result in failed:
+	print 'Could not fit %s: %s' % (result[0], result[-1])
+    output_file = os.path.join(output_dir, args['--output'])
+    f = open(output_file, 'w')
+    f.write('\n'.join('%s %s %s %s' % result[:-1] for result in results if
+		       result[-1] is None))
+    f.close()
+    print 'Results stored in ' + output_file
+    if failed:
+	sys.exit('%d of %d files could not be fitted.' % (len(failed),
+		                                          len(results)))
+
+if __name__ == '__main__':
+    args = docopt(__doc__, version = 0.1)
+    main(args)
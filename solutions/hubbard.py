@@ -6,8 +6,15 @@ one-dimensional Hubbard model. The calculation of the ground state is done
 using the full DMRG algorithm, i.e. first the infinite algorithm, and then
 doing sweeps for convergence with the finite algorithm.
 
+With `--pbc`, the chain is closed in a ring, with periodic boundary
+conditions, or with `--antiperiodic` too, antiperiodic ones, i.e. a flux
+of :math:`\pi` threading the ring (see `hubbard_with_flux`.) Other fluxes
+make the hopping complex, and the core of dmrg101 only does real
+arithmetic, so this script doesn't take them: for those, use the exact
+diagonalization of small rings, `exact_diagonalization.py --phi`.
+
 Usage:
-  hubbard.py (-m=<states> -n=<sites> -s=<sweeps> -U=<U_over_t>) [--dir=DIR -o=FILE]
+  hubbard.py (-m=<states> -n=<sites> -s=<sweeps> -U=<U_over_t>) [--dir=DIR -o=FILE --pbc --antiperiodic --blocks=DIR --memory=<MB>] %(sweep_usage)s
   hubbard.py -h | --help
 
 Options:
@@ -16,92 +23,112 @@ Options:
   -m <states>       Number of states kept.
   -s <sweeps>       Number of sweeps in the finite algorithm.
   -U <U_over_t>     Electronic interaction in units of hopping.
+  --pbc             Close the chain in a ring. The naive ring: the
+                    bond closing it joins the far ends of the blocks,
+                    which needs about the square of the states of an
+                    open chain for the same accuracy (see model_specs).
+  --antiperiodic    With --pbc, antiperiodic boundary conditions. Other
+                    fluxes need complex numbers, which the DMRG doesn't
+                    do (use exact_diagonalization.py --phi).
   -o --output=FILE  Ouput file [default: hubbard.dat]
   --dir=DIR         Ouput directory [default: ./]
+%(sweep_options)s
+  --blocks=DIR                  Library of blocks from the infinite
+                                algorithm, to start from the largest
+                                ones saved by a previous run.
+  --memory=<MB>                 Memory budget. Keeps the blocks on disk,
+                                and then fewer states, if needed to fit.
 
 """
-from dmrg101.core.calculate_states_to_keep import calculate_states_to_keep
 from dmrg101.core.sites import ElectronicSite 
-from dmrg101.core.system import System
-from dmrg101.utils.models.hubbard_model import HubbardModel
+from block_library import load_blocks
+from distributed_matvec import make_communicator
 from docopt import docopt
+from hubbard_with_flux import HubbardModelWithFlux
+from lattices import add_parity_operators
+from memory_budget import fit_memory_budget
+from result_files import ResultsWriter
+from superblock import SuperblockSystem
+from sweeps import (get_extrapolation_states, make_sweep_hooks,
+	            report_sweep_hooks, run_sweeps, sweep_options,
+		    sweep_usage)
 import os
+import sys
+
+__doc__ = __doc__ % {'sweep_usage': sweep_usage,
+		     'sweep_options': sweep_options}
 
 def main(args):
     # 
     # create a system object with electron sites and blocks, and set
-    # its model to be the Hubbard model.
+    # its model to be the Hubbard model. The sites get the parity
+    # operators for the Jordan-Wigner string of the bond closing the
+    # ring.
     #
+    model = HubbardModelWithFlux(1. if args['--antiperiodic'] else 0.)
+    model.periodic = args['--pbc']
+    if model.phi and not model.periodic:
+	sys.exit('Antiperiodic boundary conditions need --pbc.')
     electronic_site = ElectronicSite()
-    system = System(electronic_site)
-    system.model = HubbardModel()
+    add_parity_operators(electronic_site)
+    communicator = make_communicator(int(args['--processes']))
+    system = SuperblockSystem(electronic_site, communicator=communicator,
+			      shared=args['--shared'])
+    system.model = model
     #
     # read command-line arguments and initialize some stuff
     #
-    number_of_sites = int(args['-n'])
+    system.number_of_sites = int(args['-n'])
     number_of_states_kept = int(args['-m'])
     number_of_sweeps = int(args['-s'])
     system.model.U = float(args['-U'])
+    hooks = make_sweep_hooks(args, number_of_sweeps)
+    extrapolation_states = get_extrapolation_states(args)
     number_of_states_infinite_algorithm = 10
-    if number_of_states_kept < number_of_states_infinite_algorithm:
-	number_of_states_kept = number_of_states_infinite_algorithm
-    sizes = []
-    energies = []
-    entropies = []
-    truncation_errors = []
-    system.number_of_sites = number_of_sites
+    output_file = os.path.join(os.path.abspath(args['--dir']), args['--output'])
     #
-    # infinite DMRG algorithm
+    # start from the largest blocks of the infinite algorithm saved for
+    # this model, if any, and save the new ones
     #
-    max_left_block_size = number_of_sites - 3
-    for left_block_size in range(1, max_left_block_size + 1):
-	energy, entropy, truncation_error = ( 
-	    system.infinite_dmrg_step(left_block_size, 
-		                      number_of_states_infinite_algorithm) )
-	current_size = left_block_size + 3
-	sizes.append(left_block_size)
-	energies.append(energy)
-	entropies.append(entropy)
-	truncation_errors.append(truncation_error)
+    cached_steps = []
+    if args['--blocks'] is not None:
+	system, cached_steps, save_blocks = load_blocks(
+	    args['--blocks'], system, electronic_site,
+	    number_of_states_infinite_algorithm)
+	system.communicator = communicator
+	system.shared = args['--shared']
+	hooks.append(save_blocks)
+    first_left_block_size = len(cached_steps) + 1
     #
-    # finite DMRG algorithm
+    # fit the calculation in the memory budget, if any, keeping the blocks
+    # on disk or fewer states if needed
     #
-    states_to_keep = calculate_states_to_keep(number_of_states_infinite_algorithm, 
-		                              number_of_states_kept,
-		                              number_of_sweeps)
-    half_sweep = 0
-    while half_sweep < len(states_to_keep):
-	# sweep to the left
-        for left_block_size in range(max_left_block_size, 0, -1):
-	    states = states_to_keep[half_sweep]
-            energy, entropy, truncation_error = ( 
-                system.finite_dmrg_step('right', left_block_size, states) )
-            sizes.append(left_block_size)
-            energies.append(energy)
-            entropies.append(entropy)
-            truncation_errors.append(truncation_error)
-	half_sweep += 1
-	# sweep to the right
-	# if this is the last sweep, stop at the middle
-	if half_sweep == 2 * number_of_sweeps - 1:
-	    max_left_block_size = number_of_sites / 2 - 1
-        for left_block_size in range(1, max_left_block_size + 1):
-            energy, entropy, truncation_error = ( 
-                system.finite_dmrg_step('left', left_block_size, states) )
-            sizes.append(left_block_size)
-            energies.append(energy)
-            entropies.append(entropy)
-            truncation_errors.append(truncation_error)
-	half_sweep += 1
-    # 
-    # save results
+    memory_budget = None
+    if args['--memory'] is not None:
+	memory_budget = fit_memory_budget(float(args['--memory']), system,
+		                          electronic_site, number_of_states_kept)
+	number_of_states_kept = memory_budget.number_of_states
+	extrapolation_states = memory_budget.fit_extrapolation_states(
+	    extrapolation_states, int(args['-m']))
+	hooks += memory_budget.hooks
     #
-    output_file = os.path.join(os.path.abspath(args['--dir']), args['--output'])
-    f = open(output_file, 'w')
-    zipped = zip (sizes, energies, entropies, truncation_errors)
-    f.write('\n'.join('%s %s %s %s' % x for x in zipped))
-    f.close()
+    # do the infinite and finite DMRG algorithms, saving the results of
+    # each step as you go. The processes of the superblock Hamiltonian
+    # stop, and the shared files are removed, at the end.
+    #
+    with system, ResultsWriter(output_file) as results:
+	for step in cached_steps:
+	    results.write(step)
+	for step in run_sweeps(system, number_of_states_kept,
+		               number_of_sweeps,
+			       number_of_states_infinite_algorithm, hooks,
+			       extrapolation_states, first_left_block_size):
+	    results.write(step)
     print 'Results stored in ' + output_file
+    report_sweep_hooks(hooks)
+    if memory_budget is not None:
+	memory_budget.close()
+	print memory_budget.report()
 
 if __name__ == '__main__':
     args = docopt(__doc__, version = 0.1)
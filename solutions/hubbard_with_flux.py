@@ -0,0 +1,112 @@
+"""The Hubbard model on a ring threaded by a magnetic flux.
+
+.. math::
+    H=-t\sum_{i,\sigma}\left(c^{\dagger}_{i,\sigma}c_{i+1,\sigma}+
+    h.c.\right)-t\sum_{\sigma}\left(e^{i\phi}c^{\dagger}_{L,\sigma}
+    c_{1,\sigma}+h.c.\right)+U\sum_{i}n_{i,\uparrow}n_{i,\downarrow}
+
+A flux :math:`\phi` threading a ring of :math:`L` sites gives a phase
+:math:`e^{i\phi/L}` to the hopping on each bond, but all of it can be
+moved to the bond closing the ring by a gauge transformation, which is
+what is done here. The flux only changes the energy with periodic
+boundary conditions: on an open chain, there is no closing bond, and the
+phase can be gauged away completely.
+
+The hopping across the closing bond needs the Jordan-Wigner string on all
+the other sites, so the site must have the parity operators (see
+`lattices.add_parity_operators`.) When the phase makes the hopping real,
+i.e. :math:`\phi=0,\pi` (periodic or antiperiodic boundary conditions),
+all the couplings are real numbers and the calculation keeps the real
+arithmetic. These are the only fluxes the DMRG in `hubbard.py` takes, as
+dmrg101 only does real arithmetic; the others work with the exact
+diagonalization (see `exact_diagonalization`.)
+
+Examples
+--------
+The energy of four free electrons on a ring of four sites depends on the
+flux:
+
+>>> import numpy as np
+>>> from exact_diagonalization import calculate_lowest_energy
+>>> from hubbard_with_flux import HubbardModelWithFlux
+>>> site_operators = {'id': np.eye(4),
+...                   'c_up': np.diag([1., 0., 1.], 1),
+...                   'c_down': np.diag([1., 1.], 2)}
+>>> site_operators['c_up_dag'] = site_operators['c_up'].T
+>>> site_operators['c_down_dag'] = site_operators['c_down'].T
+>>> site_operators['n_up'] = np.diag([0., 1., 0., 1.])
+>>> site_operators['n_down'] = np.diag([0., 0., 1., 1.])
+>>> site_operators['u'] = np.diag([0., 0., 0., 1.])
+>>> site_operators['p_up'] = np.diag([1., -1., 1., -1.])
+>>> site_operators['p_down'] = np.diag([1., 1., -1., -1.])
+>>> model = HubbardModelWithFlux()
+>>> model.periodic = True
+>>> for phi in (0., .5, 1.):
+...     model.phi = phi
+...     energy, sector = calculate_lowest_energy(model, site_operators, 4,
+...                                              ('n_up', 'n_down'))
+...     print '%8.6f %s' % (energy, model.get_num_type())
+-4.000000 double
+-5.226252 complex
+-5.656854 double
+"""
+from cmath import exp, pi
+from model_specs import ModelFromSpec, bond, on_site
+from num_types import num_type_for_couplings, real_if_possible
+
+def get_hopping(model):
+    """Returns the hopping across the closing bond, to the left.
+
+    Parameters
+    ----------
+    model : a HubbardModelWithFlux.
+        The model.
+
+    Returns
+    -------
+    result : a float or a complex.
+        The hopping, :math:`-e^{i\phi}`, real if possible.
+    """
+    return real_if_possible(-exp(1j * pi * model.phi))
+
+def get_conjugate_hopping(model):
+    """Returns the hopping across the closing bond, to the right."""
+    return get_hopping(model).conjugate()
+
+class HubbardModelWithFlux(ModelFromSpec):
+    """Implements a few convenience functions for Hubbard model with flux.
+
+    Set `periodic` to True for the flux to have any effect.
+
+    Attributes
+    ----------
+    U : a double.
+        The electronic interaction in units of hopping.
+    phi : a double.
+        The flux threading the ring, as the phase of the hopping across
+	the closing bond in units of pi.
+    """
+    def __init__(self, phi=0., U=0.):
+        terms = [bond('c_up', 'c_up_dag', -1., string='p_up',
+		      boundary_coupling=get_conjugate_hopping),
+		 bond('c_up_dag', 'c_up', -1., string='p_up',
+		      boundary_coupling=get_hopping),
+		 bond('c_down', 'c_down_dag', -1., string='p_down',
+		      boundary_coupling=get_conjugate_hopping),
+		 bond('c_down_dag', 'c_down', -1., string='p_down',
+		      boundary_coupling=get_hopping),
+		 on_site('u', 'U')]
+        super(HubbardModelWithFlux, self).__init__(terms, phi=phi, U=U)
+
+    def get_num_type(self):
+        """Returns the number type you need for the operators.
+
+	Returns
+	-------
+	result : a string.
+	    'complex' if the model is periodic and the hopping across the
+	    closing bond is not real, 'double' otherwise.
+	"""
+	if not self.periodic:
+	    return 'double'
+	return num_type_for_couplings([get_hopping(self), self.U])
@@ -7,7 +7,7 @@ calculation of the ground state is done using the infinite version of the
 DMRG algorithm.
 
 Usage:
-  infinite_heisenberg.py (-m=<states> -n=<sites>) [--dir=DIR -o=FILE]
+  infinite_heisenberg.py (-m=<states> -n=<sites>) [--dir=DIR -o=FILE --spectra=FILE]
   infinite_heisenberg.py -h | --help
 
 Options:
@@ -16,14 +16,16 @@ Options:
   -m <states>       Number of states kept.
   -o --output=FILE  Ouput file [default: infinite_heisenberg.dat]
   --dir=DIR         Ouput directory [default: ./]
+  --spectra=FILE    Binary file to store the kept spectra at each step.
 
 """
-from dmrg101.core.entropies import calculate_entropy, calculate_renyi
+from batch_entropies import calculate_entropy, calculate_truncation_error
 from dmrg101.core.reduced_DM import diagonalize, truncate
 from dmrg101.core.sites import SpinOneHalfSite
 from dmrg101.core.system import System
-from dmrg101.core.truncation_error import calculate_truncation_error
 from docopt import docopt
+from lazy_operators import Identity, add_kron_to_matrix
+from spectra_log import SpectraLogWriter
 import numpy as np
 import os
 
@@ -74,7 +76,12 @@ def set_block_hamiltonian_to_AF_Heisenberg(system):
         tmp_matrix_size = system.get_right_dim()
     tmp_matrix_for_bh = np.zeros((tmp_matrix_size, tmp_matrix_size))
     if 'bh' in system.growing_block.operators.keys():
-        system.add_to_block_hamiltonian(tmp_matrix_for_bh, 'bh', 'id')
+        # the identity on the site is never built, just added along the
+        # diagonal
+        block_hamiltonian = system.growing_block.operators['bh']
+        site_dim = tmp_matrix_size / block_hamiltonian.shape[0]
+        add_kron_to_matrix(tmp_matrix_for_bh, block_hamiltonian,
+                           Identity(site_dim))
     system.add_to_block_hamiltonian(tmp_matrix_for_bh, 's_z', 's_z')
     system.add_to_block_hamiltonian(tmp_matrix_for_bh, 's_p', 's_m', .5)
     system.add_to_block_hamiltonian(tmp_matrix_for_bh, 's_m', 's_p', .5)
@@ -98,7 +105,7 @@ def set_operators_to_update_to_AF_Heisenberg(system):
     system.add_to_operators_to_update('s_m', site_op='s_m')
 
 def grow_block_by_one_site(growing_block, ground_state_wf, system, 
-	                   number_of_states_kept):
+	                   number_of_states_kept, spectra_log=None, label=-1):
     """Grows one side of the system by one site.
 
     Calculates the truncation matrix by calculating the reduced density
@@ -119,6 +126,11 @@ def grow_block_by_one_site(growing_block, ground_state_wf, system,
         The number of states you want to keep in each block after the
 	truncation. If the `number_of_states_kept` is smaller than the
 	dimension of the current Hilbert space block, all states are kept.
+    spectra_log : a SpectraLogWriter, optional.
+        If given, the kept eigenvalues of the reduced density matrix are
+	appended to it.
+    label : an int.
+        The label used for the spectrum in `spectra_log`.
  
     Returns
     -------
@@ -142,13 +154,16 @@ def grow_block_by_one_site(growing_block, ground_state_wf, system,
     truncated_evals, truncation_matrix = truncate(evals, evecs,
 		                                  number_of_states_kept)
     entropy = calculate_entropy(truncated_evals)
-    truncation_error = calculate_truncation_error(truncated_evals)
+    truncation_error = calculate_truncation_error(evals, len(truncated_evals))
+    if spectra_log is not None:
+	spectra_log.append(truncated_evals, label)
     set_block_hamiltonian_to_AF_Heisenberg(system)
     set_operators_to_update_to_AF_Heisenberg(system)
     system.update_all_operators(truncation_matrix)
     return entropy, truncation_error
 
-def infinite_dmrg_step(system, current_size, number_of_states_kept):
+def infinite_dmrg_step(system, current_size, number_of_states_kept,
+		       spectra_log=None):
     """Performs one step of the infinite DMRG algorithm.
 
     Calculates the ground state of a system with a given size, then
@@ -171,6 +186,9 @@ def infinite_dmrg_step(system, current_size, number_of_states_kept):
         The number of states you want to keep in each block after the
 	truncation. If the `number_of_states_kept` is smaller than the
 	dimension of the current Hilbert space block, all states are kept.
+    spectra_log : a SpectraLogWriter, optional.
+        If given, the kept spectrum is appended to it, labelled by
+	`current_size`.
  
     Returns
     -------
@@ -196,7 +214,9 @@ def infinite_dmrg_step(system, current_size, number_of_states_kept):
     ground_state_energy, ground_state_wf = system.calculate_ground_state()
     entropy, truncation_error = grow_block_by_one_site('left', ground_state_wf, 
 		                                       system, 
-						       number_of_states_kept)
+						       number_of_states_kept,
+						       spectra_log,
+						       current_size)
     system.right_block = system.left_block
     return ground_state_energy / current_size, entropy, truncation_error
 
@@ -215,6 +235,11 @@ def main(args):
     energies = []
     entropies = []
     truncation_errors = []
+    spectra_log = None
+    if args['--spectra']:
+	spectra_file = os.path.join(os.path.abspath(args['--dir']),
+			            args['--spectra'])
+	spectra_log = SpectraLogWriter(spectra_file)
     #
     # infinite DMRG algorithm
     #
@@ -222,7 +247,8 @@ def main(args):
     for current_size in range(4, number_of_sites + 1, 2):
 	#block_size = current_size / 2 - 1
 	energy, entropy, truncation_error = ( 
-	    infinite_dmrg_step(system, current_size, number_of_states_kept) )
+	    infinite_dmrg_step(system, current_size, number_of_states_kept,
+		               spectra_log) )
 	sizes.append(current_size)
 	energies.append(energy)
 	entropies.append(entropy)
@@ -236,6 +262,9 @@ def main(args):
     f.write('\n'.join('%s %s %s %s' % x for x in zipped))
     f.close()
     print 'Results stored in ' + output_file
+    if spectra_log is not None:
+	spectra_log.close()
+	print 'Spectra stored in ' + spectra_file
 
 if __name__ == '__main__':
     args = docopt(__doc__, version = 0.1)
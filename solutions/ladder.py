@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""Implements the full DMRG algorithm for ladders and cylinders.
+
+Calculates the ground state energy and wavefunction for the AF Heisenberg
+or the Hubbard model on a ladder, or on a cylinder (i.e. a ladder with
+periodic boundary conditions along the rungs). The sites of the lattice
+are numbered along a chain (see `lattices`), choosing the numbering that
+keeps less operators in the blocks, and the calculation is done with the
+full DMRG algorithm on this chain, i.e. first the infinite algorithm, and
+then doing sweeps for convergence with the finite algorithm.
+
+During the infinite algorithm the chain is shorter than the lattice, and
+the bonds are those of the lattice near its left end, so this is only a
+guess for the wavefunction. The sweeps of the finite algorithm are done
+on the actual lattice.
+
+Usage:
+  ladder.py (-m=<states> -l=<length> -w=<width> -s=<sweeps>) [--model=<model> -U=<U_over_t> --cylinder --ordering=<ordering> --dir=DIR -o=FILE --memory=<MB>] %(sweep_usage)s
+  ladder.py -h | --help
+
+Options:
+  -h --help         Shows this screen.
+  -l <length>       Number of rungs of the ladder.
+  -w <width>        Number of legs of the ladder.
+  -m <states>       Number of states kept.
+  -s <sweeps>       Number of sweeps in the finite algorithm.
+  --model=<model>   Model: heisenberg or hubbard [default: heisenberg]
+  -U <U_over_t>     Electronic interaction in units of hopping [default: 0]
+  --cylinder        Use periodic boundary conditions along the rungs.
+  --ordering=<ordering>  Numbering of the sites: columns, snake or rows.
+                         By default, columns or rows, whichever keeps
+                         less operators.
+  -o --output=FILE  Ouput file [default: ladder.dat]
+  --dir=DIR         Ouput directory [default: ./]
+%(sweep_options)s
+  --memory=<MB>                 Memory budget. Keeps the blocks on disk,
+                                and then fewer states, if needed to fit.
+
+"""
+from dmrg101.core.sites import ElectronicSite, SpinOneHalfSite
+from distributed_matvec import make_communicator
+from docopt import docopt
+from lattices import (Cylinder, Ladder, add_parity_operators,
+		      make_heisenberg_lattice_model, make_hubbard_lattice_model)
+from memory_budget import fit_memory_budget
+from result_files import ResultsWriter
+from superblock import SuperblockSystem
+from sweeps import (get_extrapolation_states, make_sweep_hooks,
+	            report_sweep_hooks, run_sweeps, sweep_options,
+		    sweep_usage)
+import os
+
+__doc__ = __doc__ % {'sweep_usage': sweep_usage,
+		     'sweep_options': sweep_options}
+
+def main(args):
+    #
+    # create the lattice, and a system object with the sites and model
+    # you want. For the Hubbard model, the sites need the parity
+    # operators for the hopping between sites further apart in the chain.
+    #
+    length = int(args['-l'])
+    width = int(args['-w'])
+    if args['--cylinder']:
+	lattice = Cylinder(length, width)
+    else:
+	lattice = Ladder(length, width)
+    if args['--model'] == 'heisenberg':
+	site = SpinOneHalfSite()
+	model = make_heisenberg_lattice_model(lattice,
+		                              ordering=args['--ordering'])
+    elif args['--model'] == 'hubbard':
+	site = ElectronicSite()
+	add_parity_operators(site)
+	model = make_hubbard_lattice_model(lattice, float(args['-U']),
+		                           ordering=args['--ordering'])
+    else:
+	raise ValueError('Model must be heisenberg or hubbard.')
+    communicator = make_communicator(int(args['--processes']))
+    system = SuperblockSystem(site, communicator=communicator,
+			      shared=args['--shared'])
+    system.model = model
+    print 'Sites numbered by ' + model.ordering
+    #
+    # read command-line arguments and initialize some stuff
+    #
+    system.number_of_sites = lattice.get_number_of_sites()
+    number_of_states_kept = int(args['-m'])
+    number_of_sweeps = int(args['-s'])
+    hooks = make_sweep_hooks(args, number_of_sweeps)
+    extrapolation_states = get_extrapolation_states(args)
+    output_file = os.path.join(os.path.abspath(args['--dir']), args['--output'])
+    #
+    # fit the calculation in the memory budget, if any, keeping the blocks
+    # on disk or fewer states if needed
+    #
+    memory_budget = None
+    if args['--memory'] is not None:
+	memory_budget = fit_memory_budget(float(args['--memory']), system,
+		                          site, number_of_states_kept)
+	number_of_states_kept = memory_budget.number_of_states
+	extrapolation_states = memory_budget.fit_extrapolation_states(
+	    extrapolation_states, int(args['-m']))
+	hooks += memory_budget.hooks
+    #
+    # do the infinite and finite DMRG algorithms, saving the results of
+    # each step as you go. The driver sets the size of the left block in
+    # the model before each step. The processes of the superblock
+    # Hamiltonian stop, and the shared files are removed, at the end.
+    #
+    with system, ResultsWriter(output_file) as results:
+	for step in run_sweeps(system, number_of_states_kept,
+		               number_of_sweeps, hooks=hooks,
+			       extrapolation_states=extrapolation_states):
+	    results.write(step)
+    print 'Results stored in ' + output_file
+    report_sweep_hooks(hooks)
+    if memory_budget is not None:
+	memory_budget.close()
+	print memory_budget.report()
+
+if __name__ == '__main__':
+    args = docopt(__doc__, version = 0.1)
+    main(args)
@@ -0,0 +1,277 @@
+""" Ladders and cylinders mapped to a chain.
+
+The DMRG algorithm works on chains, so to study a lattice with more than
+one leg you number its sites one after the other, and the bonds of the
+lattice become bonds between sites of the chain at different distances.
+Each distance needs its own copies of the operators in the blocks (see
+`model_specs`), so the numbering that keeps the longest bond shortest
+keeps the memory smallest. Three numberings are considered:
+
+- 'columns' : each rung is numbered from the first leg to the last, and
+  all the rungs in the same direction. The legs become bonds at distance
+  `width`, and the rungs bonds at distance one.
+- 'snake' : the rungs are numbered alternating the direction, from the
+  first leg to the last and then from the last to the first. Some bonds
+  along the legs are at distance one, but others at distance up to
+  `2 * width - 1`, so it always keeps more operators than 'columns', and
+  it is never chosen by `Ladder.choose_ordering`. You can still ask for
+  it, e.g. to compare with other calculations using it.
+- 'rows' : each leg is numbered from the first rung to the last, and all
+  the legs one after the other. The legs become bonds at distance one,
+  and the rungs bonds at distance `length`, so it is only better for
+  lattices wider than long.
+
+A ladder has open boundary conditions along the rungs, and a cylinder
+periodic ones, i.e. the first and last legs are also coupled.
+
+For electrons, the hopping between sites further apart than nearest
+neighbours in the chain picks a sign from the electrons with the same spin
+in between. This is taken into account by a Jordan-Wigner string made of
+the parity operators `p_up` and `p_down`, which you add to the site with
+`add_parity_operators`.
+"""
+from model_specs import ModelFromSpec, bond, on_site
+import numpy as np
+
+orderings = ('columns', 'snake', 'rows')
+# the orderings that can keep the least operators, see `choose_ordering`
+chosen_orderings = ('columns', 'rows')
+
+class Ladder(object):
+    """A ladder, with open boundary conditions along the rungs.
+
+    Attributes
+    ----------
+    length : an int.
+        The number of rungs.
+    width : an int.
+        The number of legs.
+    """
+    periodic_rungs = False
+
+    def __init__(self, length, width):
+        super(Ladder, self).__init__()
+	self.length = length
+	self.width = width
+
+    def get_number_of_sites(self):
+        """Returns the number of sites of the lattice."""
+	return self.length * self.width
+
+    def get_bonds(self):
+        """Returns the bonds between nearest neighbours.
+
+	Returns
+	-------
+	result : a list of tuples.
+	    Each bond as a pair of sites, and each site as a tuple (x, y),
+	    where x is the rung and y is the leg.
+	"""
+	result = []
+	for x in range(self.length):
+	    for y in range(self.width):
+		if x + 1 < self.length:
+		    result.append(((x, y), (x + 1, y)))
+		if y + 1 < self.width:
+		    result.append(((x, y), (x, y + 1)))
+		elif self.periodic_rungs and self.width > 2:
+		    result.append(((x, 0), (x, y)))
+	return result
+
+    def get_index(self, site, ordering):
+        """Returns the position of a site in the chain.
+
+	Parameters
+	----------
+	site : a tuple of ints.
+	    The site, as (x, y).
+	ordering : a string.
+	    The numbering of the sites, one of `orderings`.
+
+	Returns
+	-------
+	result : an int.
+	    The position of the site in the chain, starting at 0.
+
+	Raises
+	------
+	ValueError
+	    if `ordering` is not one of the `orderings`.
+
+	Examples
+	--------
+	>>> from lattices import Ladder
+	>>> ladder = Ladder(3, 2)
+	>>> [ladder.get_index((1, 0), ordering) for ordering in orderings]
+	[2, 3, 1]
+	"""
+	x, y = site
+	if ordering == 'columns':
+	    return x * self.width + y
+	if ordering == 'snake':
+	    if x % 2 == 1:
+		y = self.width - 1 - y
+	    return x * self.width + y
+	if ordering == 'rows':
+	    return y * self.length + x
+	raise ValueError('Ordering must be one of %s.' % ', '.join(orderings))
+
+    def get_chain_bonds(self, ordering):
+        """Returns the bonds of the chain, grouped by distance.
+
+	Parameters
+	----------
+	ordering : a string.
+	    The numbering of the sites, one of `orderings`.
+
+	Returns
+	-------
+	result : a dict.
+	    For each distance, the set of sites of the chain where a bond
+	    with that distance starts.
+	"""
+	result = {}
+	for first, second in self.get_bonds():
+	    i = self.get_index(first, ordering)
+	    j = self.get_index(second, ordering)
+	    if i > j:
+		i, j = j, i
+	    result.setdefault(j - i, set()).add(i)
+	return result
+
+    def choose_ordering(self):
+        """Returns the ordering that keeps less operators in the blocks.
+
+	For each operator in a bond, the blocks keep a copy acting on each
+	site up to the longest bond from their edge (see `model_specs`), so
+	the number of operators kept is proportional to the longest bond.
+	For the same longest bond, the ordering with less terms in the
+	Hamiltonian of the superblock is chosen: a bond at distance `d` is
+	put in the superblock in `d + 2` ways.
+
+	Only the `chosen_orderings` are compared: the longest bond of
+	'snake' is `2 * width - 1`, and that of 'columns' is `width`.
+
+	Returns
+	-------
+	result : a string.
+	    One of the `chosen_orderings`.
+
+	Examples
+	--------
+	>>> from lattices import Ladder
+	>>> Ladder(8, 4).choose_ordering()
+	'columns'
+	>>> Ladder(2, 8).choose_ordering()
+	'rows'
+	"""
+	def cost(ordering):
+	    distances = self.get_chain_bonds(ordering).keys()
+	    return (max(distances),
+		    sum(distance + 2 for distance in distances))
+	return min(chosen_orderings, key=cost)
+
+class Cylinder(Ladder):
+    """A cylinder, i.e. a ladder with periodic boundary conditions along
+    the rungs.
+
+    Attributes
+    ----------
+    length : an int.
+        The number of rungs.
+    width : an int.
+        The number of legs.
+    """
+    periodic_rungs = True
+
+class BondPattern(object):
+    """The sites where a bond of a given distance starts.
+
+    Used as the `pattern` of a bond in `model_specs`: returns 1 if there
+    is a bond starting at a site, and 0 otherwise.
+    """
+    def __init__(self, starts):
+        super(BondPattern, self).__init__()
+	self.starts = frozenset(starts)
+
+    def __call__(self, site):
+	if site in self.starts:
+	    return 1.
+	return 0.
+
+def add_parity_operators(site):
+    """Adds the parity of the electrons with each spin to a site.
+
+    Parameters
+    ----------
+    site : an ElectronicSite.
+        The site. Gets the operators `p_up` and `p_down`, i.e. :math:`(-1)^
+	{n_{\uparrow}}` and :math:`(-1)^{n_{\downarrow}}`.
+    """
+    identity = np.eye(site.operators['n_up'].shape[0])
+    for spin in ('up', 'down'):
+	site.add_operator('p_' + spin)
+	site.operators['p_' + spin] += identity - 2 * site.operators['n_' +
+		                                                     spin]
+
+def make_lattice_model(lattice, bond_operators, site_terms=(), ordering=None,
+		       **parameters):
+    """Returns a model on a lattice, mapped to a chain.
+
+    Parameters
+    ----------
+    lattice : a Ladder or a Cylinder.
+        The lattice.
+    bond_operators : a list of tuples.
+        The terms in each bond of the lattice, as (left_operator,
+	right_operator, coupling, string), where string is the name of the
+	Jordan-Wigner string, or None.
+    site_terms : a list of Terms.
+        The on-site terms.
+    ordering : a string, optional.
+        The numbering of the sites. By default, the one chosen by the
+	lattice.
+    parameters : keyword arguments.
+        The parameters of the model.
+
+    Returns
+    -------
+    result : a ModelFromSpec.
+        The model. Remember to set its `left_block_size` before each DMRG
+	step.
+    """
+    if ordering is None:
+	ordering = lattice.choose_ordering()
+    terms = list(site_terms)
+    chain_bonds = lattice.get_chain_bonds(ordering)
+    for distance in sorted(chain_bonds.keys()):
+	pattern = BondPattern(chain_bonds[distance])
+	for left, right, coupling, string in bond_operators:
+	    terms.append(bond(left, right, coupling, distance, pattern,
+		              string))
+    result = ModelFromSpec(terms, **parameters)
+    result.ordering = ordering
+    return result
+
+def make_heisenberg_lattice_model(lattice, J=1., ordering=None):
+    """Returns the AF Heisenberg model on a lattice."""
+    return make_lattice_model(lattice,
+	                      [('s_z', 's_z', 'J', None),
+			       ('s_p', 's_m', lambda model: 0.5 * model.J,
+				None),
+			       ('s_m', 's_p', lambda model: 0.5 * model.J,
+				None)],
+			      ordering=ordering, J=J)
+
+def make_hubbard_lattice_model(lattice, U=0., ordering=None):
+    """Returns the Hubbard model on a lattice.
+
+    The site must have the parity operators, see `add_parity_operators`.
+    """
+    return make_lattice_model(lattice,
+	                      [('c_up', 'c_up_dag', -1., 'p_up'),
+			       ('c_up_dag', 'c_up', -1., 'p_up'),
+			       ('c_down', 'c_down_dag', -1., 'p_down'),
+			       ('c_down_dag', 'c_down', -1., 'p_down')],
+			      [on_site('u', 'U')],
+			      ordering=ordering, U=U)
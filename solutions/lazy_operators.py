@@ -0,0 +1,227 @@
+""" Kronecker products with symbolic identities.
+
+Most of the terms in the Hamiltonian of a DMRG system are products of one
+or two non-trivial operators with identities, e.g. `('id', 'id', 'id',
+'u')`. Building the identities as full matrices, and then doing the
+Kronecker products with them, is a waste of memory and time, as the
+identity just copies the other factor along the diagonal. The functions in
+this module take a symbolic `Identity` instead of a matrix, and never
+build it.
+
+The same goes for the product of the superblock Hamiltonian by the
+wavefunction: the Hamiltonians of each block come in terms with the
+identity on the other block, and `apply_kron` just skips the products by
+the identity (see `distributed_matvec`.)
+"""
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+class Identity(object):
+    """A symbolic identity operator.
+
+    Attributes
+    ----------
+    dim : an int.
+        The dimension of the Hilbert space the identity acts on.
+    """
+    def __init__(self, dim):
+        super(Identity, self).__init__()
+	self.dim = dim
+
+def get_dim(operator):
+    """Returns the dimension of an operator, symbolic or not.
+
+    Parameters
+    ----------
+    operator : a numpy array of ndim = 2, or an Identity.
+        The operator.
+
+    Returns
+    -------
+    result : an int.
+        The dimension of the Hilbert space the operator acts on.
+    """
+    if isinstance(operator, Identity):
+	return operator.dim
+    return operator.shape[0]
+
+def _diagonal_view(matrix_4d, axis):
+    """Returns a writeable view with the repeated index along `axis` fixed.
+
+    For a matrix reshaped as M[i, j, k, l], returns the view V[a, b, c]
+    equal to M[a, b, a, c] if `axis` is 0, or to M[a, b, c, b] if `axis` is
+    1. No data is copied.
+    """
+    s0, s1, s2, s3 = matrix_4d.strides
+    d0, d1 = matrix_4d.shape[:2]
+    if axis == 0:
+	return as_strided(matrix_4d, shape=(d0, d1, d1),
+			  strides=(s0 + s2, s1, s3))
+    return as_strided(matrix_4d, shape=(d0, d1, d0),
+		      strides=(s0, s1 + s3, s2))
+
+def add_kron_to_matrix(matrix, left_op, right_op, param=1.0):
+    """Adds the Kronecker product of two operators to a matrix in place.
+
+    Does `matrix += param * kron(left_op, right_op)`, but if any of the
+    operators is an `Identity`, the identity is never built and the other
+    operator is just added along the diagonal.
+
+    Parameters
+    ----------
+    matrix : a numpy array of ndim = 2.
+        The matrix you add the product to. Its dimension must be the
+	product of the dimensions of the operators. It must be contiguous.
+    left_op : a numpy array of ndim = 2, or an Identity.
+        The operator acting on the left part of the Hilbert space.
+    right_op : a numpy array of ndim = 2, or an Identity.
+        The operator acting on the right part of the Hilbert space.
+    param : a double or complex.
+        A factor multiplying the product.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from lazy_operators import Identity, add_kron_to_matrix
+    >>> s_z = np.array([[-.5, 0], [0, .5]])
+    >>> matrix = np.zeros((6, 6))
+    >>> add_kron_to_matrix(matrix, Identity(3), s_z)
+    >>> np.allclose(matrix, np.kron(np.eye(3), s_z))
+    True
+    """
+    left_dim = get_dim(left_op)
+    right_dim = get_dim(right_op)
+    matrix_4d = matrix.reshape(left_dim, right_dim, left_dim, right_dim)
+    left_is_identity = isinstance(left_op, Identity)
+    right_is_identity = isinstance(right_op, Identity)
+    if left_is_identity and right_is_identity:
+	diagonal = matrix.reshape(-1)[::left_dim * right_dim + 1]
+	diagonal += param
+    elif left_is_identity:
+	_diagonal_view(matrix_4d, 0)[...] += param * right_op
+    elif right_is_identity:
+	_diagonal_view(matrix_4d, 1)[...] += param * left_op[:, np.newaxis, :]
+    else:
+	matrix_4d += param * (left_op[:, np.newaxis, :, np.newaxis] *
+			      right_op[np.newaxis, :, np.newaxis, :])
+
+def apply_kron(matrix, left_op, right_op, param=1.0):
+    """Applies the Kronecker product of two operators to a wavefunction.
+
+    The wavefunction is written as a matrix, with the rows labelling the
+    left part and the columns the right part of the Hilbert space. Then
+    `kron(left_op, right_op)` acting on the wavefunction is `left_op *
+    matrix * right_op.T`, and the products with identities are skipped.
+
+    Parameters
+    ----------
+    matrix : a numpy array of ndim = 2.
+        The wavefunction written as a matrix.
+    left_op : a numpy array of ndim = 2, a scipy sparse matrix, or an
+        Identity.
+        The operator acting on the left part of the Hilbert space.
+    right_op : a numpy array of ndim = 2, a scipy sparse matrix, or an
+        Identity.
+        The operator acting on the right part of the Hilbert space.
+    param : a double or complex.
+        A factor multiplying the product.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 2.
+        The result of the product, as a new matrix.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from lazy_operators import Identity, apply_kron
+    >>> s_z = np.array([[-.5, 0], [0, .5]])
+    >>> psi = np.arange(6.).reshape(3, 2)
+    >>> np.allclose(apply_kron(psi, Identity(3), s_z, 2.).ravel(),
+    ...             2. * np.kron(np.eye(3), s_z).dot(psi.ravel()))
+    True
+    """
+    result = matrix
+    # the methods work also for sparse operators, unlike np.dot
+    if not isinstance(left_op, Identity):
+	result = left_op.dot(result)
+    if not isinstance(right_op, Identity):
+	result = right_op.dot(result.T).T
+    if result is matrix:
+	result = matrix.copy()
+    if param != 1.0:
+	result *= param
+    return result
+
+class KronOperator(object):
+    """The Kronecker product of two operators, without building it.
+
+    It acts on a vector (or the columns of a matrix) as `kron(left_op,
+    right_op)` does, applying each factor on its own index, so it costs
+    about the product of the dimensions of the factors times the
+    dimension of the vector, instead of its square. An `Identity` factor
+    is just skipped. It has the methods of a matrix that `apply_kron`
+    and `distributed_matvec` use, so it can stand for a block operator of
+    the superblock, i.e. a block operator times a site operator.
+
+    Parameters
+    ----------
+    left_op : a numpy array of ndim = 2, a scipy sparse matrix, or an
+        Identity.
+        The operator acting on the left (slower) index.
+    right_op : a numpy array of ndim = 2, a scipy sparse matrix, or an
+        Identity.
+        The operator acting on the right (faster) index.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from lazy_operators import Identity, KronOperator
+    >>> s_z = np.array([[-.5, 0], [0, .5]])
+    >>> block_op = np.arange(9.).reshape(3, 3)
+    >>> vectors = np.arange(12.).reshape(6, 2)
+    >>> operator = KronOperator(block_op, s_z)
+    >>> np.allclose(operator.dot(vectors), np.kron(block_op, s_z).dot(vectors))
+    True
+    >>> operator = KronOperator(Identity(3), s_z)
+    >>> np.allclose(operator.dot(vectors), np.kron(np.eye(3), s_z).dot(vectors))
+    True
+    """
+    def __init__(self, left_op, right_op):
+        super(KronOperator, self).__init__()
+	self.left_op = left_op
+	self.right_op = right_op
+	self.shape = (get_dim(left_op) * get_dim(right_op),) * 2
+
+    @property
+    def size(self):
+        """The number of elements stored, i.e. those of the factors."""
+	return sum(getattr(operator, 'nnz', np.size(operator)) for operator in
+		   (self.left_op, self.right_op) if
+		   not isinstance(operator, Identity))
+
+    def dot(self, matrix):
+        """Returns the product of the operator by a vector or a matrix."""
+	left_dim = get_dim(self.left_op)
+	right_dim = get_dim(self.right_op)
+	result = np.reshape(matrix, (left_dim, right_dim, -1))
+	if not isinstance(self.left_op, Identity):
+	    result = self.left_op.dot(result.reshape(left_dim, -1))
+	    result = result.reshape(left_dim, right_dim, -1)
+	if not isinstance(self.right_op, Identity):
+	    result = self.right_op.dot(
+		result.transpose(1, 0, 2).reshape(right_dim, -1))
+	    result = result.reshape(right_dim, left_dim, -1).transpose(1, 0, 2)
+	if (isinstance(self.left_op, Identity) and
+		isinstance(self.right_op, Identity)):
+	    result = result.copy()
+	return result.reshape(np.shape(matrix))
+
+    def astype(self, dtype, copy=True):
+        """Returns the operator with its factors cast to a type."""
+	operators = [operator if isinstance(operator, Identity) else
+		     operator.astype(dtype, copy=copy) for operator in
+		     (self.left_op, self.right_op)]
+	if operators[0] is self.left_op and operators[1] is self.right_op:
+	    return self
+	return KronOperator(*operators)
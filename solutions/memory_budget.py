@@ -0,0 +1,383 @@
+""" Keeping the memory used by the DMRG algorithm under a budget.
+
+Most of the memory in a DMRG calculation goes to a few kinds of
+matrices, whose size depends on the number of states kept `m` and the
+dimension `d` of the Hilbert space of a site:
+
+- the operators of the blocks, :math:`m\\times m`, for each operator the
+  model needs in the blocks, and for the two blocks,
+- the operators of the block that grows, before the truncation,
+  :math:`md\\times md`,
+- the wavefunction of the superblock, the reduced density matrix and its
+  eigenvectors, and the vectors of the Lanczos algorithm, all with
+  :math:`(md)^{2}` elements, and
+- the blocks of all sizes kept for the sweeps of the finite algorithm,
+  about twice the number of sites times the operators of a block.
+
+`MemoryBudget` adds these up to estimate the memory needed for a given
+`m`. If it is over the budget, the blocks are stored on disk instead (see
+`StoreBlocksOnDisk`), and if it is still over, the number of states is
+reduced to the largest that fits. After the calculation, you can compare
+the estimate with the actual peak memory of the process. The scripts make
+their budget with `fit_memory_budget`.
+
+The estimate is rough, as it doesn't know how the `System` stores its
+blocks, so leave some room in the budget.
+"""
+import mmap
+import numpy as np
+import resource
+import sys
+import tempfile
+
+def get_peak_memory():
+    """Returns the peak memory used by the process so far, in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, and OS X bytes
+    if sys.platform == 'darwin':
+	return peak
+    return peak * 1024
+
+def count_block_operators(model):
+    """Returns the number of operators a model keeps in each block.
+
+    These are the operators to update, plus the identity and the block
+    Hamiltonian.
+
+    Parameters
+    ----------
+    model : a ModelFromSpec.
+        The model.
+    """
+    saved_left_block_size = model.left_block_size
+    if model.has_patterns and model.left_block_size is None:
+	# any size gives the same operators
+	model.left_block_size = 0
+    try:
+	return len(model.get_plan().operators_to_update) + 2
+    finally:
+	model.left_block_size = saved_left_block_size
+
+class MemoryBudget(object):
+    """Estimates the memory of a DMRG calculation and fits it to a budget.
+
+    Parameters
+    ----------
+    budget : a double.
+        The memory you can use, in bytes.
+    number_of_block_operators : an int.
+        The number of operators kept in each block, e.g. from
+	`count_block_operators`.
+    site_dim : an int.
+        The dimension of the Hilbert space of a site.
+    number_of_sites : an int.
+        The number of sites of the chain.
+    itemsize : an int.
+        The bytes for each element of the matrices, e.g. 8 for double
+	precision, 4 for single and 16 for complex.
+    number_of_lanczos_vectors : an int.
+        How many vectors of the size of the superblock the Lanczos
+	algorithm keeps.
+
+    Attributes
+    ----------
+    baseline : an int.
+        The peak memory of the process when the budget was made, which is
+	added to the estimates.
+    number_of_states : an int, or None.
+        The number of states chosen by `choose_states`.
+    on_disk : a bool.
+        Whether `choose_states` decided to keep the blocks on disk.
+    hooks : a list.
+        The hooks for `sweeps.run_sweeps` to keep the blocks on disk,
+	from `fit_memory_budget`.
+
+    Examples
+    --------
+    With 256 MB for a chain of 100 spins with 8 operators in each block:
+
+    >>> from memory_budget import MemoryBudget
+    >>> budget = MemoryBudget(2 ** 28, 8, 2, 100)
+    >>> budget.baseline = 0
+    >>> print '%.1f MB' % (budget.estimate(200) / 2. ** 20)
+    511.5 MB
+    >>> print '%.1f MB' % (budget.estimate(200, on_disk=True) / 2. ** 20)
+    18.3 MB
+    >>> budget.choose_states(100)
+    (100, False)
+    >>> budget.choose_states(200)
+    (200, True)
+    >>> budget.choose_states(2000)
+    (747, True)
+    >>> budget.fit_extrapolation_states([1600, 1200, 800], 2000)
+    [598, 448, 299]
+    """
+    def __init__(self, budget, number_of_block_operators, site_dim,
+	         number_of_sites, itemsize=8, number_of_lanczos_vectors=4):
+        super(MemoryBudget, self).__init__()
+	self.budget = budget
+	self.number_of_block_operators = number_of_block_operators
+	self.site_dim = site_dim
+	self.number_of_sites = number_of_sites
+	self.itemsize = itemsize
+	self.number_of_lanczos_vectors = number_of_lanczos_vectors
+	self.baseline = get_peak_memory()
+	self.number_of_states = None
+	self.on_disk = False
+	self.hooks = []
+
+    def estimate(self, number_of_states, on_disk=False):
+        """Returns the estimated peak memory, in bytes.
+
+	Parameters
+	----------
+	number_of_states : an int.
+	    The number of states kept.
+	on_disk : a bool.
+	    Whether the blocks are kept on disk.
+	"""
+	block = number_of_states ** 2
+	enlarged = (number_of_states * self.site_dim) ** 2
+	elements = (self.number_of_block_operators * enlarged +
+		    (self.number_of_lanczos_vectors + 3) * enlarged)
+	if not on_disk:
+	    elements += (self.number_of_block_operators * block *
+			 (2 * self.number_of_sites + 2))
+	return self.baseline + self.itemsize * elements
+
+    def choose_states(self, number_of_states):
+        """Chooses how many states to keep, and where to keep the blocks.
+
+	Keeps `number_of_states` with the blocks in memory if it fits in
+	the budget, or else with the blocks on disk. If it doesn't fit
+	either, keeps the largest number of states that fits, with the
+	blocks on disk.
+
+	Parameters
+	----------
+	number_of_states : an int.
+	    The number of states you want to keep.
+
+	Returns
+	-------
+	number_of_states : an int.
+	    The number of states to keep.
+	on_disk : a bool.
+	    Whether to keep the blocks on disk.
+
+	Raises
+	------
+	ValueError
+	    if not even a single state fits in the budget.
+	"""
+	if self.estimate(number_of_states) <= self.budget:
+	    result = (number_of_states, False)
+	elif self.estimate(number_of_states, True) <= self.budget:
+	    result = (number_of_states, True)
+	else:
+	    if self.estimate(1, True) > self.budget:
+		raise ValueError('The memory budget is too small.')
+	    # the estimate grows with the number of states
+	    low, high = 1, number_of_states
+	    while high - low > 1:
+		middle = (low + high) / 2
+		if self.estimate(middle, True) <= self.budget:
+		    low = middle
+		else:
+		    high = middle
+	    result = (low, True)
+	self.number_of_states, self.on_disk = result
+	return result
+
+    def fit_extrapolation_states(self, extrapolation_states,
+	                         number_of_states):
+        """Fits the numbers of states for the extrapolation in the budget.
+
+	The sweeps added for the extrapolation keep fewer states than the
+	last one, so they fit if it does. When `choose_states` keeps fewer
+	states than you asked for, they are scaled down with it, so the
+	extrapolation still has the same number of points, with the same
+	ratios between them.
+
+	Parameters
+	----------
+	extrapolation_states : a list of ints.
+	    The numbers of states you want for the extrapolation,
+	    decreasing.
+	number_of_states : an int.
+	    The number of states you asked `choose_states` for.
+
+	Returns
+	-------
+	result : a list of ints.
+	    The numbers of states for the extrapolation, decreasing and
+	    smaller than `self.number_of_states`.
+	"""
+	ratio = float(self.number_of_states) / number_of_states
+	result = []
+	for states in extrapolation_states:
+	    states = int(round(states * ratio))
+	    if 0 < states < min(result or [self.number_of_states]):
+		result.append(states)
+	return result
+
+    def report(self):
+        """Returns a line comparing the estimate with the actual peak."""
+	megabyte = 2. ** 20
+	return ('Memory: budget %.1f MB, estimate %.1f MB, peak %.1f MB, '
+		'%d states, blocks %s' % (
+		    self.budget / megabyte,
+		    self.estimate(self.number_of_states, self.on_disk) /
+		    megabyte,
+		    get_peak_memory() / megabyte, self.number_of_states,
+		    'on disk' if self.on_disk else 'in memory'))
+
+    def close(self):
+        """Removes the files of the blocks kept on disk, if any."""
+	for hook in self.hooks:
+	    hook.close()
+
+def fit_memory_budget(megabytes, system, site, number_of_states):
+    """Fits a calculation in a memory budget.
+
+    Parameters
+    ----------
+    megabytes : a double.
+        The memory you can use, in megabytes.
+    system : a System.
+        The system, with its model and number of sites set.
+    site : a Site.
+        The site of the system.
+    number_of_states : an int.
+        The number of states you want to keep.
+
+    Returns
+    -------
+    result : a MemoryBudget.
+        The budget, with the number of states to keep chosen, and the
+	hooks to keep the blocks on disk if needed. Close it after the
+	calculation.
+    """
+    result = MemoryBudget(megabytes * 2 ** 20,
+	                  count_block_operators(system.model),
+			  site.operators['id'].shape[0],
+			  system.number_of_sites)
+    number_of_states, on_disk = result.choose_states(number_of_states)
+    if on_disk:
+	result.hooks.append(StoreBlocksOnDisk())
+    return result
+
+def is_on_disk(operator):
+    """Returns whether an operator is mapped from a file.
+
+    Casting or copying an array mapped from a file gives a `numpy.memmap`
+    too, but with the data in memory, so the type is not enough.
+
+    Parameters
+    ----------
+    operator : a numpy array or a scipy.sparse matrix.
+        The operator.
+    """
+    if hasattr(operator, 'tocsr'):
+	# for sparse matrices, where their elements are
+	operator = getattr(operator, 'data', None)
+    # views of a mapped array, e.g. the elements of a sparse matrix, can
+    # be plain arrays, so follow them to the array they come from
+    while operator is not None:
+	if isinstance(operator, mmap.mmap):
+	    return True
+	if isinstance(operator, np.memmap) and operator._mmap is not None:
+	    return True
+	operator = getattr(operator, 'base', None)
+    return False
+
+class StoreBlocksOnDisk(object):
+    """Moves the operators of the blocks to files on disk after each step.
+
+    A hook for `sweeps.run_sweeps`. The operators of the blocks, both the
+    current ones and those of all sizes kept for the sweeps in
+    `old_left_blocks` and `old_right_blocks`, are replaced by arrays
+    mapped from files, which the operating system can drop from memory
+    when it needs it, and read back when they are used. The arrays are
+    copy-on-write, so changing them doesn't change the files. Operators
+    already mapped from a file are left alone, and the new ones, e.g. those
+    updated in the last step, are written. Put this hook after any hook
+    changing the operators.
+
+    Parameters
+    ----------
+    directory : a string, optional.
+        Where the files go. By default, the temporary directory, which
+	should be on a disk, not in memory.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from memory_budget import StoreBlocksOnDisk, is_on_disk
+    >>> class Block(object):
+    ...     def __init__(self):
+    ...         self.operators = {'id': np.eye(2), 's_z': np.diag([-.5, .5])}
+    >>> class System(object):
+    ...     def __init__(self):
+    ...         self.left_block, self.right_block = Block(), Block()
+    ...         self.old_left_blocks = [Block(), self.left_block]
+    ...         self.old_right_blocks = [Block(), self.right_block]
+    >>> system = System()
+    >>> hook = StoreBlocksOnDisk()
+    >>> hook(system, None)
+    False
+    >>> is_on_disk(system.left_block.operators['s_z'])
+    True
+    >>> is_on_disk(system.old_right_blocks[0].operators['s_z'])
+    True
+
+    Operators computed from them are in memory, and the next step puts
+    them back on disk:
+
+    >>> operators = system.left_block.operators
+    >>> operators['s_z'] = 2 * operators['s_z']
+    >>> is_on_disk(operators['s_z'])
+    False
+    >>> hook(system, None)
+    False
+    >>> is_on_disk(operators['s_z']), operators['s_z'].diagonal()
+    (True, memmap([-1.,  1.]))
+    >>> hook.close()
+    """
+    def __init__(self, directory=None):
+        super(StoreBlocksOnDisk, self).__init__()
+	if directory is None:
+	    directory = tempfile.gettempdir()
+	self.directory = directory
+	self.store = None
+
+    def __call__(self, system, step):
+	# imported here, as it needs scipy, which takes a while to import
+	# and is not needed when the blocks stay in memory
+	from shared_operators import SharedOperatorStore, attach_operators
+	# the files of the previous step can be removed, as the arrays
+	# mapped from them stay valid until they are freed
+	self.close()
+	self.store = SharedOperatorStore(self.directory)
+	blocks = []
+	for block in ([system.left_block, system.right_block] +
+		      list(getattr(system, 'old_left_blocks', [])) +
+		      list(getattr(system, 'old_right_blocks', []))):
+	    # the current blocks are usually also in the lists
+	    if all(block is not other for other in blocks):
+		blocks.append(block)
+	for index, block in enumerate(blocks):
+	    for name, operator in block.operators.items():
+		if not is_on_disk(operator):
+		    self.store.put('%d:%s' % (index, name), operator)
+	operators = attach_operators(self.store.get_handle(), mode='c')
+	for key, operator in operators.iteritems():
+	    index, name = key.split(':', 1)
+	    blocks[int(index)].operators[name] = operator
+	return False
+
+    def close(self):
+        """Removes the files of the last step."""
+	if self.store is not None:
+	    self.store.close()
+	    self.store = None
@@ -0,0 +1,695 @@
+""" Declarative specification of models for the DMRG algorithm.
+
+Each model class (e.g. `HeisenbergModel`) writes by hand three methods
+doing almost the same: setting the terms of the Hamiltonian of the system,
+the terms of the block Hamiltonian, and the operators you need to update
+when the block grows. Here you just list the terms of the Hamiltonian, on
+one site or on a bond between nearest neighbours, and these three things
+are worked out for you.
+
+For example, the AF Heisenberg model is:
+
+>>> from model_specs import ModelFromSpec, bond
+>>> model = ModelFromSpec([bond('s_z', 's_z', 'J'),
+...                        bond('s_p', 's_m', 0.5),
+...                        bond('s_m', 's_p', 0.5)], J=1.)
+>>> [name for name, block_op, site_op in model.get_plan().operators_to_update]
+['s_m', 's_p', 's_z']
+
+The couplings can be numbers, the name of a parameter of the model (like
+'J' above), or a function taking the model and returning a number. The
+list of terms is compiled only once, the first time the model is used,
+and compiled again only if the value of some parameter changes.
+
+The Hilbert space of the system is made of four parts: the left block,
+the left single site, the right single site, and the right block. A bond
+term `bond(a, b, coupling)` means the operator `a` acting on one site and
+`b` acting on the site to its right, and it is added to the three bonds of
+the system (left block--left site, left site--right site, and right
+site--right block). The operators `a` and `b` are the ones you need to
+keep updated in the blocks.
+
+Terms can also couple sites further apart, e.g. `bond(a, b, coupling,
+distance=2)` for next-nearest neighbours. Then the blocks must also keep
+the operators acting on the sites that are not at their edge: the operator
+`a` acting on the site at distance `d` from the edge of the block is
+called `a@d` (and `a@0` is just `a`). Only the operators, and the
+distances, that some term needs are kept in the blocks, i.e. a term with
+range `r` needs `a@d` and `b@d` for `d < r`. Terms with zero coupling are
+dropped, and they don't add any operator to the blocks.
+
+For periodic boundary conditions, set the `periodic` attribute of the
+model to True. The bond closing the ring joins the sites at the far ends
+of the two blocks, so the blocks keep also the operators acting on their
+far end, called `a@end`, and the superblock gets a block--block term.
+Only nearest neighbour bonds without pattern are supported with periodic
+boundary conditions. The Jordan-Wigner string of the closing bond goes
+the other way around the ring, over all the other sites, so the far end
+operators keep it over the rest of their block (`a*string@end`). The
+closing bond can have its own `boundary_coupling`, e.g. a twist of the
+boundary conditions, or the phase from a flux threading the ring.
+
+This is the naive ring. The terms are right, i.e. without truncation
+the superblock has the Hamiltonian of the ring
+(`exact_diagonalization.get_superblock_placements` checks this against
+the exact diagonalization of a small ring), but it costs more than an
+open chain in two ways. Each bond operator needs a far end operator in
+each block, and each bond adds a block--block term to the superblock, so
+a DMRG step has more products of :math:`md\\times md` operators with the
+wavefunction. And, with the sites arranged as block--site--site--block,
+the reduced density matrix must describe the entanglement across both
+the middle and the closing bond, about twice that of an open chain, so
+you need about the square of the number of states of the open chain for
+the same truncation error. The usual remedy, a superblock arranged as
+block--site--block--site so that a single site sits next to each end of
+the closing bond, needs a different `System` than the one in dmrg101, and
+is not done here. Use it for small rings, or check how the energy
+converges with the number of states.
+
+Bonds that are not the same all along the chain, e.g. when a ladder is
+mapped to a chain, take a `pattern`: a function of the site where the bond
+starts returning the factor multiplying the coupling (zero if there is no
+bond). Then the terms depend on where the single sites are, and the driver
+must set the `left_block_size` attribute of the model before each DMRG
+step. The terms are compiled once for each value of `left_block_size`.
+
+For fermions, a bond between sites further apart needs a Jordan-Wigner
+string, i.e. a parity operator on each site in between. Pass the name of
+this operator as the `string` of the bond, and it is put on the single
+sites in between, and kept in the block operators acting away from the
+edge, which are then called `a*string@d`.
+"""
+from numbers import Number
+
+class Term(object):
+    """A term of the Hamiltonian.
+
+    Attributes
+    ----------
+    operators : a tuple of strings.
+        The names of the site operators in the term, one for an on-site
+	term and two for a bond, from left to right.
+    coupling : a number, a string, or a function.
+        The coupling multiplying the term.
+    distance : an int.
+        The distance between the sites of a bond.
+    pattern : a function, or None.
+        A function taking the site where the bond starts (counting from 0
+	at the left end of the chain) and returning a factor for the
+	coupling. None means the bond is on every site.
+    string : a string, or None.
+        The name of the operator acting on the sites between the two
+	sites of a bond. None means the identity.
+    boundary_coupling : a number, a string, a function, or None.
+        The coupling of the bond closing the ring, with periodic boundary
+	conditions. None means the same as `coupling`.
+    """
+    def __init__(self, operators, coupling=1.0, distance=1, pattern=None,
+		 string=None, boundary_coupling=None):
+        super(Term, self).__init__()
+	self.operators = tuple(operators)
+	self.coupling = coupling
+	self.distance = distance
+	self.pattern = pattern
+	self.string = string
+	self.boundary_coupling = boundary_coupling
+	if len(self.operators) == 1:
+	    self.distance = 0
+
+    def get_range(self):
+        """Returns the distance between the first and the last site."""
+	return self.distance
+
+def on_site(operator, coupling=1.0):
+    """Returns an on-site term.
+
+    Parameters
+    ----------
+    operator : a string.
+        The name of the site operator.
+    coupling : a number, a string, or a function.
+        The coupling multiplying the term.
+
+    Returns
+    -------
+    result : a Term.
+        The term.
+    """
+    return Term((operator,), coupling)
+
+def bond(left_operator, right_operator, coupling=1.0, distance=1,
+	 pattern=None, string=None, boundary_coupling=None):
+    """Returns a term acting on two sites.
+
+    Parameters
+    ----------
+    left_operator : a string.
+        The name of the operator acting on the left site.
+    right_operator : a string.
+        The name of the operator acting on the right site.
+    coupling : a number, a string, or a function.
+        The coupling multiplying the term.
+    distance : an int.
+        The distance between the two sites, 1 for nearest neighbours.
+    pattern : a function, optional.
+        A function taking the site where the bond starts and returning a
+	factor for the coupling, zero if there is no bond.
+    string : a string, optional.
+        The name of the operator acting on the sites in between, e.g. the
+	parity for fermions.
+    boundary_coupling : a number, a string, or a function, optional.
+        The coupling of the bond closing the ring, with periodic boundary
+	conditions. By default, the same as `coupling`.
+
+    Returns
+    -------
+    result : a Term.
+        The term.
+
+    Raises
+    ------
+    ValueError
+        if `distance` is smaller than 1.
+    """
+    if distance < 1:
+	raise ValueError('Distance must be at least one.')
+    return Term((left_operator, right_operator), coupling, distance,
+		pattern, string, boundary_coupling)
+
+def get_shifted_name(operator, distance, string=None):
+    """Returns the name of a block operator acting away from the edge.
+
+    Parameters
+    ----------
+    operator : a string.
+        The name of the site operator.
+    distance : an int.
+        The distance from the site the operator acts on to the edge of
+	the block.
+    string : a string, optional.
+        The name of the operator acting on the sites between the operator
+	and the edge of the block.
+
+    Returns
+    -------
+    result : a string.
+        The name of the operator in the block.
+
+    Examples
+    --------
+    >>> from model_specs import get_shifted_name
+    >>> get_shifted_name('s_z', 0), get_shifted_name('s_z', 2)
+    ('s_z', 's_z@2')
+    >>> get_shifted_name('c_up', 2, 'p_up')
+    'c_up*p_up@2'
+    """
+    if distance == 0:
+	return operator
+    if string is not None:
+	operator = '%s*%s' % (operator, string)
+    return '%s@%d' % (operator, distance)
+
+def get_far_end_name(operator, string=None):
+    """Returns the name of a block operator acting on its far end.
+
+    Parameters
+    ----------
+    operator : a string.
+        The name of the site operator.
+    string : a string, optional.
+        The name of the operator acting on the other sites of the block.
+
+    Returns
+    -------
+    result : a string.
+        The name of the operator in the block.
+
+    Examples
+    --------
+    >>> from model_specs import get_far_end_name
+    >>> get_far_end_name('s_z'), get_far_end_name('c_up', 'p_up')
+    ('s_z@end', 'c_up*p_up@end')
+    """
+    if string is not None:
+	operator = '%s*%s' % (operator, string)
+    return operator + '@end'
+
+def _resolve_far_end(name, operators):
+    """Returns the name of a far end operator that exists in a block.
+
+    A block made of a single site doesn't have far end operators, as its
+    far end is its edge, so the operator acting on the edge, without any
+    string, is used.
+    """
+    if name in operators:
+	return name
+    return name[:-len('@end')].split('*')[0]
+
+def _place_operator(slots, operator, position, string=None):
+    """Puts an operator acting on a position of the system in its slot.
+
+    The positions are labelled as: ..., -2, -1 for the sites in the left
+    block, 0 for the left site, 1 for the right site, and 2, 3, ... for
+    the sites in the right block.
+    """
+    if position < 0:
+	slots[0] = get_shifted_name(operator, -1 - position, string)
+    elif position < 2:
+	slots[1 + position] = operator
+    else:
+	slots[3] = get_shifted_name(operator, position - 2, string)
+
+class CompiledModel(object):
+    """The terms of a model, compiled for the DMRG system.
+
+    Attributes
+    ----------
+    hamiltonian_terms : a list of tuples.
+        The arguments for `System.add_to_hamiltonian`, for the terms that
+	don't depend on whether the blocks have a block Hamiltonian. A term
+	is only added if the blocks have the operators it needs.
+    block_site_terms : a list of tuples.
+        (operator, coupling) for the on-site terms, that must be added on
+	a block when it does not have a block Hamiltonian yet (i.e. when the
+	block is a single site.)
+    block_hamiltonian_terms : a dict.
+        For each growing side, 'left' or 'right', a list with the
+	arguments (block_op, site_op, coupling) for
+	`System.add_to_block_hamiltonian`.
+    operators_to_update : a list of tuples.
+        The arguments (name, block_op, site_op) for
+	`System.add_to_operators_to_update`, for the operators you need in
+	the blocks.
+    boundary_terms : a list of tuples.
+        The arguments for `System.add_to_hamiltonian` for the bonds
+	closing the ring with periodic boundary conditions, using the far
+	end operators of the blocks.
+
+    Notes
+    -----
+    Which of the terms go in the Hamiltonian depends only on the names of
+    the operators in the blocks (the block layout), which are the same in
+    most DMRG steps, even if the operators themselves change after each
+    truncation. So the list of calls to the `System` is built once for
+    each layout and reused in the next steps, which only look up the new
+    operators by name. A new parameter, `periodic`, or `left_block_size`
+    gives a new `CompiledModel` (see `ModelFromSpec.get_plan`), so the
+    lists are built again.
+
+    Examples
+    --------
+    >>> from model_specs import make_heisenberg_model
+    >>> model = make_heisenberg_model()
+    >>> names = ['id', 'bh', 's_z', 's_p', 's_m']
+    >>> calls = model.get_plan().get_hamiltonian_calls(names, names)
+    >>> calls is model.get_plan().get_hamiltonian_calls(names, names)
+    True
+    >>> model.J = 2.
+    >>> calls is model.get_plan().get_hamiltonian_calls(names, names)
+    False
+    >>> model.J, model.periodic = 1., True
+    >>> calls is model.get_plan().get_hamiltonian_calls(names, names)
+    False
+    """
+    def __init__(self):
+        super(CompiledModel, self).__init__()
+	self.hamiltonian_terms = []
+	self.boundary_terms = []
+	self.block_site_terms = []
+	self.block_hamiltonian_terms = {'left': [], 'right': []}
+	self.operators_to_update = []
+	self.hamiltonian_calls = {}
+	self.block_hamiltonian_calls = {}
+
+    def get_hamiltonian_calls(self, left_operators, right_operators):
+        """Returns the calls to `System.add_to_hamiltonian` for some blocks.
+
+	Parameters
+	----------
+	left_operators : a dict or a list.
+	    The operators (or their names) in the left block.
+	right_operators : a dict or a list.
+	    The operators (or their names) in the right block.
+
+	Returns
+	-------
+	result : a list of tuples.
+	    The arguments for each call, as (args, kwargs).
+	"""
+	key = (frozenset(left_operators), frozenset(right_operators))
+	result = self.hamiltonian_calls.get(key)
+	if result is not None:
+	    return result
+	result = []
+	if 'bh' in left_operators:
+	    result.append(((), {'left_block_op': 'bh'}))
+	else:
+	    for operator, coupling in self.block_site_terms:
+		result.append(((operator, 'id', 'id', 'id', coupling), {}))
+	if 'bh' in right_operators:
+	    result.append(((), {'right_block_op': 'bh'}))
+	else:
+	    for operator, coupling in self.block_site_terms:
+		result.append((('id', 'id', 'id', operator, coupling), {}))
+	for term in self.hamiltonian_terms:
+	    if term[0] in left_operators and term[3] in right_operators:
+		result.append((term, {}))
+	for left, left_site, right_site, right, coupling in self.boundary_terms:
+	    result.append(((_resolve_far_end(left, left_operators), left_site,
+		            right_site, _resolve_far_end(right, right_operators),
+			    coupling), {}))
+	self.hamiltonian_calls[key] = result
+	return result
+
+    def get_block_hamiltonian_calls(self, growing_side, block_operators):
+        """Returns the calls to `System.add_to_block_hamiltonian`.
+
+	Parameters
+	----------
+	growing_side : a string.
+	    The block that grows, 'left' or 'right'.
+	block_operators : a dict or a list.
+	    The operators (or their names) in the growing block.
+
+	Returns
+	-------
+	result : a list of tuples.
+	    The arguments for each call, but the auxiliary matrix.
+	"""
+	key = (growing_side, frozenset(block_operators))
+	result = self.block_hamiltonian_calls.get(key)
+	if result is not None:
+	    return result
+	if 'bh' in block_operators:
+	    result = [('bh', 'id')]
+	else:
+	    result = [(operator, 'id', coupling) for operator, coupling in
+		      self.block_site_terms]
+	result += [term for term in self.block_hamiltonian_terms[growing_side]
+		   if term[0] in block_operators]
+	self.block_hamiltonian_calls[key] = result
+	return result
+
+class ModelFromSpec(object):
+    """A model built from a list of terms.
+
+    It has the same interface as the models in dmrg101, so you can use it
+    as the `model` of a `System`.
+
+    Parameters
+    ----------
+    terms : a list of Terms.
+        The terms of the Hamiltonian.
+    parameters : keyword arguments.
+        The parameters of the model, used as couplings. They are set as
+	attributes of the model, so you can change them later.
+
+    Attributes
+    ----------
+    periodic : a bool.
+        Whether to use periodic boundary conditions. False by default.
+    left_block_size : an int, or None.
+        The number of sites in the left block. You only need to set it
+	when some bond has a pattern.
+    """
+    def __init__(self, terms, **parameters):
+        super(ModelFromSpec, self).__init__()
+	self.terms = list(terms)
+	self.periodic = False
+	self.left_block_size = None
+	self.parameter_names = sorted(parameters.keys())
+	for name, value in parameters.items():
+	    setattr(self, name, value)
+	self.has_patterns = any(term.pattern is not None for term in
+		                self.terms)
+	self.plans = {}
+
+    def get_coupling(self, coupling):
+        """Returns the value of a coupling.
+
+	Parameters
+	----------
+	coupling : a number, a string, or a function.
+	    The coupling: a number is returned as is, a string is the name
+	    of a parameter of the model, and a function is called with the
+	    model as argument.
+
+	Returns
+	-------
+	result : a number.
+	    The value of the coupling.
+	"""
+	if isinstance(coupling, Number):
+	    return coupling
+	if isinstance(coupling, basestring):
+	    return getattr(self, coupling)
+	return coupling(self)
+
+    def get_plan(self):
+        """Returns the compiled terms, compiling them if needed.
+
+	Returns
+	-------
+	result : a CompiledModel.
+	    The compiled terms, for the current value of the parameters.
+	"""
+	key = ((self.periodic,) +
+	       tuple(getattr(self, name) for name in self.parameter_names))
+	if self.has_patterns:
+	    key += (self.left_block_size,)
+	plan = self.plans.get(key)
+	if plan is None:
+	    plan = self.compile()
+	    self.plans[key] = plan
+	return plan
+
+    def get_max_range(self):
+        """Returns the largest distance between two sites in a term."""
+	return max([term.get_range() for term in self.terms] + [0])
+
+    def compile(self):
+        """Compiles the terms into the terms for the DMRG system.
+
+	Returns
+	-------
+	result : a CompiledModel.
+	    The compiled terms.
+
+	Raises
+	------
+	ValueError
+	    if some term acts on more than two sites, if the model is
+	    periodic and some bond is not between nearest neighbours or has
+	    a pattern, or if some bond has a pattern and `left_block_size`
+	    is not set.
+	"""
+	if self.has_patterns and self.left_block_size is None:
+	    raise ValueError('Set left_block_size for bonds with a pattern.')
+	result = CompiledModel()
+	operators_to_update = {}
+	for term in self.terms:
+	    coupling = self.get_coupling(term.coupling)
+	    if coupling == 0:
+		continue
+	    if len(term.operators) == 1:
+		operator = term.operators[0]
+		result.hamiltonian_terms.append(('id', operator, 'id', 'id',
+		                                 coupling))
+		result.hamiltonian_terms.append(('id', 'id', operator, 'id',
+		                                 coupling))
+		result.block_site_terms.append((operator, coupling))
+		for side in ('left', 'right'):
+		    result.block_hamiltonian_terms[side].append(('id', operator,
+		                                                 coupling))
+	    elif len(term.operators) == 2:
+		left, right = term.operators
+		distance = term.get_range()
+		pattern = term.pattern
+		string = term.string
+		# all the ways to put the bond in the system, but inside a
+		# single block, which is already in the block Hamiltonian
+		for position in range(-distance, 2):
+		    factor = 1.
+		    if pattern is not None:
+			start = self.left_block_size + position
+			factor = pattern(start) if start >= 0 else 0.
+		    if factor == 0:
+			continue
+		    slots = ['id', 'id', 'id', 'id']
+		    if string is not None:
+			# the single sites between the two operators
+			for site in range(max(position + 1, 0),
+				          min(position + distance, 2)):
+			    slots[1 + site] = string
+		    _place_operator(slots, left, position, string)
+		    _place_operator(slots, right, position + distance, string)
+		    result.hamiltonian_terms.append(tuple(slots) +
+			                            (factor * coupling,))
+		far_left = get_shifted_name(left, distance - 1, string)
+		far_right = get_shifted_name(right, distance - 1, string)
+		left_factor = right_factor = 1.
+		if pattern is not None:
+		    # the new site is the left site when the left block
+		    # grows, and the right site when the right block grows
+		    start = self.left_block_size - distance
+		    left_factor = pattern(start) if start >= 0 else 0.
+		    right_factor = pattern(self.left_block_size + 1)
+		if left_factor != 0:
+		    result.block_hamiltonian_terms['left'].append(
+			(far_left, right, left_factor * coupling))
+		if right_factor != 0:
+		    result.block_hamiltonian_terms['right'].append(
+			(far_right, left, right_factor * coupling))
+		for operator in (left, right):
+		    operators_to_update[operator] = (operator, 'id', operator)
+		    for d in range(1, distance):
+			name = get_shifted_name(operator, d, string)
+			block_op = get_shifted_name(operator, d - 1, string)
+			operators_to_update[name] = (name, block_op,
+				                     string or 'id')
+		if self.periodic:
+		    if distance != 1 or pattern is not None:
+			raise ValueError('Periodic models only support nearest '
+				         'neighbour bonds without pattern.')
+		    boundary_coupling = coupling
+		    if term.boundary_coupling is not None:
+			boundary_coupling = self.get_coupling(
+			    term.boundary_coupling)
+		    # the bond from the last site (far end of the right
+		    # block) to the first (far end of the left block), with
+		    # the string on all the sites in between
+		    result.boundary_terms.append(
+			(get_far_end_name(right, string), string or 'id',
+			 string or 'id', get_far_end_name(left, string),
+			 boundary_coupling))
+		    for operator in (left, right):
+			name = get_far_end_name(operator, string)
+			operators_to_update[name] = (name, name,
+				                     string or 'id')
+	    else:
+		raise ValueError('Terms must act on one or two sites.')
+	result.operators_to_update = [operators_to_update[name] for name in
+		                      sorted(operators_to_update.keys())]
+	return result
+
+    def set_hamiltonian(self, system):
+        """Sets a system Hamiltonian to the Hamiltonian of the model.
+
+	The terms that need an operator that is not (yet) in a block, i.e.
+	when the block is smaller than the range of the term, are skipped.
+
+        Parameters
+        ----------
+        system : a System.
+            The System you want to set the Hamiltonian for.
+        """
+	calls = self.get_plan().get_hamiltonian_calls(
+	    system.left_block.operators, system.right_block.operators)
+        system.clear_hamiltonian()
+	add_to_hamiltonian = system.add_to_hamiltonian
+	for args, kwargs in calls:
+	    add_to_hamiltonian(*args, **kwargs)
+
+    def set_block_hamiltonian(self, tmp_matrix_for_bh, system):
+        """Sets the block Hamiltonian to the one of the model.
+
+        Parameters
+        ----------
+	tmp_matrix_for_bh : a numpy array of ndim = 2.
+	    An auxiliary matrix to keep track of the result.
+        system : a System.
+            The System you want to set the Hamiltonian for.
+        """
+	calls = self.get_plan().get_block_hamiltonian_calls(
+	    system.growing_side, system.growing_block.operators)
+	for args in calls:
+	    system.add_to_block_hamiltonian(tmp_matrix_for_bh, *args)
+
+    def set_operators_to_update(self, system):
+        """Sets the operators to update to the ones needed by the model.
+
+        Parameters
+        ----------
+        system : a System.
+            The System you want to set the Hamiltonian for.
+
+	Notes
+	-----
+	The block Hamiltonian, althought needs to be updated, is treated
+	separately by the very functions in the `System` class. An operator
+	acting at distance `d` from the edge is only added once the block
+	has more than `d` sites.
+        """
+	block_operators = system.growing_block.operators
+	for name, block_op, site_op in self.get_plan().operators_to_update:
+	    if block_op.endswith('@end'):
+		block_op = _resolve_far_end(block_op, block_operators)
+	    if block_op in block_operators:
+		system.add_to_operators_to_update(name, block_op=block_op,
+			                          site_op=site_op)
+
+def make_heisenberg_model(J=1.):
+    """Returns the AF Heisenberg model.
+
+    .. math::
+        H=J\sum_{i}\vec{S}_{i}\cdot\vec{S}_{i+1}
+    """
+    return ModelFromSpec([bond('s_z', 's_z', 'J'),
+	                  bond('s_p', 's_m', lambda model: 0.5 * model.J),
+	                  bond('s_m', 's_p', lambda model: 0.5 * model.J)],
+			 J=J)
+
+def make_j1_j2_heisenberg_model(J1=1., J2=0.):
+    """Returns the Heisenberg model with next-nearest neighbour coupling.
+
+    .. math::
+        H=J_{1}\sum_{i}\vec{S}_{i}\cdot\vec{S}_{i+1}+
+	J_{2}\sum_{i}\vec{S}_{i}\cdot\vec{S}_{i+2}
+    """
+    return ModelFromSpec([bond('s_z', 's_z', 'J1'),
+	                  bond('s_p', 's_m', lambda model: 0.5 * model.J1),
+	                  bond('s_m', 's_p', lambda model: 0.5 * model.J1),
+	                  bond('s_z', 's_z', 'J2', 2),
+	                  bond('s_p', 's_m', lambda model: 0.5 * model.J2, 2),
+	                  bond('s_m', 's_p', lambda model: 0.5 * model.J2, 2)],
+			 J1=J1, J2=J2)
+
+def make_tfim_model(h=0.):
+    """Returns the Ising model in a transverse field.
+
+    .. math::
+        H=\sum_{i}\left[S^{z}_{i}S^{z}_{i+1} + h S^{x}_{i}\right]
+    """
+    return ModelFromSpec([bond('s_z', 's_z'),
+	                  on_site('s_x', 'h')],
+			 h=h)
+
+def make_hubbard_model(U=0.):
+    """Returns the Hubbard model.
+
+    .. math::
+        H=-\sum_{i,\sigma}\left(c^{\dagger}_{i,\sigma}c_{i+1,\sigma}+
+	h.c.\right)+U\sum_{i}n_{i,\uparrow}n_{i,\downarrow}
+    """
+    return ModelFromSpec([bond('c_up', 'c_up_dag', -1.),
+	                  bond('c_up_dag', 'c_up', -1.),
+	                  bond('c_down', 'c_down_dag', -1.),
+	                  bond('c_down_dag', 'c_down', -1.),
+	                  on_site('u', 'U')],
+			 U=U)
+
+def make_extended_hubbard_model(U=0., V=0.):
+    """Returns the Hubbard model with nearest neighbour interaction.
+
+    .. math::
+        H=-\sum_{i,\sigma}\left(c^{\dagger}_{i,\sigma}c_{i+1,\sigma}+
+	h.c.\right)+U\sum_{i}n_{i,\uparrow}n_{i,\downarrow}+
+	V\sum_{i}n_{i}n_{i+1}
+    """
+    return ModelFromSpec([bond('c_up', 'c_up_dag', -1.),
+	                  bond('c_up_dag', 'c_up', -1.),
+	                  bond('c_down', 'c_down_dag', -1.),
+	                  bond('c_down_dag', 'c_down', -1.),
+	                  bond('n', 'n', 'V'),
+	                  on_site('u', 'U')],
+			 U=U, V=V)
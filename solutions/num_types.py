@@ -0,0 +1,67 @@
+""" Helpers to choose between real and complex arithmetic.
+
+Operators and wavefunctions are real unless the Hamiltonian has a complex
+coupling, e.g. a hopping with a phase coming from a magnetic flux or from
+twisted boundary conditions. Complex arithmetic doubles the memory and
+makes the matrix products about four times slower, so these functions
+keep everything real whenever possible, and tell you when a coupling
+really needs complex numbers. The DMRG in dmrg101 only does real
+arithmetic, so only the exact diagonalization can use complex couplings.
+
+The number types are named as in the `num_type` argument of the
+`Wavefunction` class, i.e. 'double' and 'complex'.
+"""
+
+def real_if_possible(coupling, tolerance=1e-14):
+    """Returns the coupling as a real number if its imaginary part vanishes.
+
+    Parameters
+    ----------
+    coupling : a number.
+        The coupling you want to check.
+    tolerance : a double.
+        Imaginary parts smaller than this (in absolute value) are dropped.
+
+    Returns
+    -------
+    result : a float or a complex.
+        The real part of `coupling` if the imaginary part is negligible,
+	or `coupling` itself otherwise.
+
+    Examples
+    --------
+    >>> from num_types import real_if_possible
+    >>> from cmath import exp, pi
+    >>> real_if_possible(exp(1j * pi))
+    -1.0
+    """
+    coupling = complex(coupling)
+    if abs(coupling.imag) < tolerance:
+	return coupling.real
+    return coupling
+
+def num_type_for_couplings(couplings, tolerance=1e-14):
+    """Returns the number type you need for a Hamiltonian.
+
+    Parameters
+    ----------
+    couplings : a list of numbers.
+        All the couplings appearing in the Hamiltonian.
+    tolerance : a double.
+        Imaginary parts smaller than this (in absolute value) are dropped.
+
+    Returns
+    -------
+    result : a string.
+        'double' if all the couplings are real, 'complex' otherwise.
+
+    Examples
+    --------
+    >>> from num_types import num_type_for_couplings
+    >>> num_type_for_couplings([1., -0.5, 1j])
+    'complex'
+    """
+    for coupling in couplings:
+	if isinstance(real_if_possible(coupling, tolerance), complex):
+	    return 'complex'
+    return 'double'
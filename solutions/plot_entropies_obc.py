@@ -20,42 +20,65 @@ above, as a guide to the eye (not a real fit to data.)
 
 See e.g. A. B. Kallin et al, Phys. Rev. Lett. 103, 117203 (2009).
 
+You can plot only the steps of a given half-sweep, using -1 for the
+infinite algorithm, or 'last'.
+
+With `--spectra`, the file is instead a log of the kept spectra, written
+with the `--spectra` option of the scripts, and you can plot the Renyi
+entropies, for which the slope is :math:`c(1+1/n)/12`.
+
 Usage:
-  plot_entropies.py <file> (-n=<sites>) 
+  plot_entropies.py <file> (-n=<sites>) [--half-sweep=<n> --spectra --renyi=<n>]
   plot_entropies.py -h | --help
 
 Options:
-  -h --help       Shows this screen.
+  -h --help         Shows this screen.
   -n <sites>        Number of sites of the chain.
+  --half-sweep=<n>  Plot only the steps in this half-sweep.
+  --spectra         The file is a log of the spectra (see spectra_log).
+  --renyi=<n>       Renyi index of the entropy, with --spectra [default: 1]
 
 """
 from docopt import docopt
+from result_files import get_column_index, load_table, select_rows
+from spectra_log import SpectraLogReader
 import numpy as np
-import math
-import matplotlib.pyplot as plt
 import os
 
-args = docopt(__doc__, version = 0.1)
-data_file = os.path.abspath(args['<file>'])
-number_of_sites = int(args['-n'])
-fin = open(data_file, 'r')
-x = []
-y = []
-for lines in fin:
-    line = lines.split()
+def main(args):
+    data_file = os.path.abspath(args['<file>'])
+    number_of_sites = int(args['-n'])
+    half_sweep = args['--half-sweep']
+    if half_sweep is not None and half_sweep != 'last':
+	half_sweep = int(half_sweep)
+    renyi_index = float(args['--renyi'])
+    if args['--spectra']:
+	data = SpectraLogReader(data_file).as_table(renyi_index)
+    else:
+	data = load_table(data_file)
     # the system (opposed to enviroment) has even sites:
-    if int(line[0]) % 2 == 1:
-	x_prime = math.sin(math.pi * (float(line[0]) + 1) / number_of_sites)
-	x_prime *= 2 * number_of_sites / math.pi
-        x.append(math.log(x_prime))
-        y.append(float(line[2]))
-
-# cft_result is the part of the CFT result proportional to the central
-# charge (there are other smaller terms for finite number_of_sites),
-# forced to pass by the last point of your data. So it's not a real fit,
-# just a guide to the eye.
-cft_result = np.array(x) / 6 
-cft_result += y[-1] - x[-1] / 6
-plt.plot(x, y, 'bo')
-plt.plot(x, cft_result, 'g-')
-plt.show()
+    data = select_rows(data, half_sweep=half_sweep, parity='odd')
+    sizes = data[:, get_column_index('size')]
+    x_prime = np.sin(np.pi * (sizes + 1) / number_of_sites)
+    x_prime *= 2 * number_of_sites / np.pi
+    x = np.log(x_prime)
+    y = data[:, get_column_index('entropy')]
+    #
+    # cft_result is the part of the CFT result proportional to the central
+    # charge (there are other smaller terms for finite number_of_sites),
+    # forced to pass by the last point of your data. So it's not a real
+    # fit, just a guide to the eye.
+    #
+    slope = (1. + 1. / renyi_index) / 12
+    cft_result = np.array(x) * slope
+    cft_result += y[-1] - x[-1] * slope
+    # imported here, as it is slow to import, so that bad arguments or
+    # files are reported right away
+    import matplotlib.pyplot as plt
+    plt.plot(x, y, 'bo')
+    plt.plot(x, cft_result, 'g-')
+    plt.show()
+
+if __name__ == '__main__':
+    args = docopt(__doc__, version = 0.1)
+    main(args)
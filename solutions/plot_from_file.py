@@ -4,30 +4,40 @@
 The file must contain two columns of the same lenght. The first column
 will be the data in the x-axis, the second column the data in the y-axis.
 
+Columns can be given by number, or, for the output files of the scripts
+implementing the DMRG algorithm, by name: size, energy, entropy, or
+truncation_error. For these files you can also plot only the steps of a
+given half-sweep, using -1 for the infinite algorithm, or 'last'.
+
 Usage:
-  plot_from_file.py <file> [-x=<x_col> -y=<y_col>]
+  plot_from_file.py <file> [-x=<x_col> -y=<y_col> --half-sweep=<n>]
   plot_from_file.py -h | --help
 
 Options:
-  -h --help   Shows this screen.
-  -x <x_col>  Which column has the data for x-axis [default: 0]
-  -y <y_col>  Which column has the data for y-axis [default: 1]
+  -h --help         Shows this screen.
+  -x <x_col>        Which column has the data for x-axis [default: 0]
+  -y <y_col>        Which column has the data for y-axis [default: 1]
+  --half-sweep=<n>  Plot only the steps in this half-sweep.
 
 """
 from docopt import docopt
-import matplotlib.pyplot as plt
+from result_files import get_column_index, load_table, select_rows
 import os
 
-args = docopt(__doc__, version = 0.1)
-data_file = os.path.abspath(args['<file>'])
-x_col = int(args['-x'])
-y_col = int(args['-y'])
-fin = open(data_file, 'r')
-x = []
-y = []
-for lines in fin:
-    line = lines.split()
-    x.append(float(line[x_col]))
-    y.append(float(line[y_col]))
-plt.plot(x, y)
-plt.show()
+def main(args):
+    data_file = os.path.abspath(args['<file>'])
+    x_col = get_column_index(args['-x'])
+    y_col = get_column_index(args['-y'])
+    half_sweep = args['--half-sweep']
+    if half_sweep is not None and half_sweep != 'last':
+	half_sweep = int(half_sweep)
+    data = select_rows(load_table(data_file), half_sweep=half_sweep)
+    # imported here, as it is slow to import, so that bad arguments or
+    # files are reported right away
+    import matplotlib.pyplot as plt
+    plt.plot(data[:, x_col], data[:, y_col])
+    plt.show()
+
+if __name__ == '__main__':
+    args = docopt(__doc__, version = 0.1)
+    main(args)
@@ -0,0 +1,113 @@
+""" Helpers to run the early steps of the DMRG algorithm in single precision.
+
+During the infinite algorithm and the first sweeps of the finite algorithm
+the truncation error is large (around 1e-5), so multiplying by the
+superblock Hamiltonian in double precision is a waste of memory and
+bandwidth. A precision policy decides which floating point type is used
+for its operators at each step:
+
+- 'double' : all the steps use float64 (the default),
+- 'single' : all the steps use float32, and
+- 'mixed' : the infinite algorithm and the early sweeps use float32, and
+  the last sweeps are promoted to float64.
+
+Only what is cast runs in the lower precision. The `System` of dmrg101
+builds the superblock Hamiltonian, runs the Lanczos algorithm and
+diagonalizes the reduced density matrix in float64, whatever the type of
+the block operators, so the scripts using it (e.g. `heisenberg.py`) run
+in double precision, and don't have a precision policy. Where the product
+of the superblock Hamiltonian by the wavefunction is done here, as in
+`distributed_matvec`, `cast_superblock_terms` casts the operators and
+the wavefunction is cast for each product, and the products, which take
+most of the time of the Lanczos algorithm, do run in float32. The Lanczos
+vectors are kept in float64, so the energy is still accurate to about
+the rounding error of float32 times the norm of the Hamiltonian.
+"""
+from lazy_operators import Identity
+import numpy as np
+
+precision_policies = ('double', 'single', 'mixed')
+
+def dtype_for_half_sweep(policy, half_sweep, number_of_half_sweeps,
+		         number_of_final_half_sweeps=2):
+    """Returns the floating point type to use in a given half-sweep.
+
+    Parameters
+    ----------
+    policy : a string.
+        The precision policy. It must be one of `precision_policies`.
+    half_sweep : an int.
+        The half-sweep you are doing. Use -1 for the infinite algorithm.
+    number_of_half_sweeps : an int.
+        The total number of half-sweeps in the finite algorithm.
+    number_of_final_half_sweeps : an int.
+        How many half-sweeps at the end are done in double precision when
+	the policy is 'mixed'.
+
+    Returns
+    -------
+    result : a numpy dtype.
+        Either np.float32 or np.float64.
+
+    Raises
+    ------
+    ValueError
+        if `policy` is not one of the `precision_policies`.
+
+    Examples
+    --------
+    >>> from precision import dtype_for_half_sweep
+    >>> dtype_for_half_sweep('mixed', -1, 6).__name__
+    'float32'
+    >>> dtype_for_half_sweep('mixed', 4, 6).__name__
+    'float64'
+    """
+    if policy not in precision_policies:
+	raise ValueError('Precision policy must be one of %s.' %
+			 ', '.join(precision_policies))
+    if policy == 'double':
+	return np.float64
+    if policy == 'single':
+	return np.float32
+    first_double_half_sweep = number_of_half_sweeps - number_of_final_half_sweeps
+    if half_sweep < first_double_half_sweep:
+	return np.float32
+    return np.float64
+
+def cast_superblock_terms(terms, dtype):
+    """Casts the operators in the terms of a superblock Hamiltonian.
+
+    Operators in several terms are cast only once, so they are still
+    shared in the result. Symbolic identities are kept as they are.
+
+    Parameters
+    ----------
+    terms : a list of tuples.
+        The terms, as (coupling, left_operator, right_operator), with the
+	operators as numpy arrays or scipy sparse matrices.
+    dtype : a numpy dtype.
+        The floating point type you want for the operators.
+
+    Returns
+    -------
+    result : a list of tuples.
+        The terms with the operators cast.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from precision import cast_superblock_terms
+    >>> sigma_x = np.array([[0., 1.], [1., 0.]])
+    >>> terms = cast_superblock_terms([(1., sigma_x, sigma_x)], np.float32)
+    >>> terms[0][1].dtype, terms[0][1] is terms[0][2]
+    (dtype('float32'), True)
+    """
+    cast = {}
+    def get_cast(operator):
+	if isinstance(operator, Identity):
+	    return operator
+	if id(operator) not in cast:
+	    cast[id(operator)] = operator.astype(dtype, copy=False)
+	return cast[id(operator)]
+    return [(coupling, get_cast(left_operator), get_cast(right_operator))
+	    for coupling, left_operator, right_operator in terms]
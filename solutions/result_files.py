@@ -0,0 +1,257 @@
+""" Fast loading of the result files written by the DMRG scripts.
+
+The scripts implementing the DMRG algorithm write a text file with a row
+per DMRG step and four columns: the size of the growing block (not
+including the single site), the energy per site, the entanglement entropy,
+and the truncation error. The functions here read these files in one go
+with NumPy, instead of line by line, and let you pick columns by name and
+select the rows for a given half-sweep or parity of the block size.
+`ResultsWriter` writes these files, one step at a time.
+
+If you read the same files many times, `load_table` can save a binary
+copy next to each one, with the extension '.npz' added, and read it
+instead of parsing the text the next times. The copy records the size and
+modification time of the text file, and it is only used when both are
+the same, so a file that grew, or was replaced by another one, is read
+again.
+"""
+import numpy as np
+import os
+
+dmrg_columns = ('size', 'energy', 'entropy', 'truncation_error')
+
+def _read_text(filename):
+    """Parses a text file with columns of numbers into a 2-D array."""
+    f = open(filename, 'r')
+    first_line = f.readline()
+    text = first_line + f.read()
+    f.close()
+    number_of_columns = len(first_line.split())
+    if number_of_columns == 0:
+	return np.zeros((0, 0))
+    values = np.fromstring(text, sep=' ')
+    if values.size % number_of_columns:
+	raise ValueError('All the rows in %s must have %d columns.' %
+			 (filename, number_of_columns))
+    return values.reshape(-1, number_of_columns)
+
+def _get_stamp(filename):
+    """Returns the size and modification time of a file."""
+    status = os.stat(filename)
+    return np.array([status.st_size, status.st_mtime])
+
+def load_table(filename, use_sidecar=False):
+    """Loads a text file with columns of numbers.
+
+    Parameters
+    ----------
+    filename : a string.
+        The name of the text file.
+    use_sidecar : a bool, optional.
+        Whether to use (and create if needed) a binary copy of the file.
+	By default, the text is always parsed, and no file is written.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 2.
+        The data, with the same rows and columns as the file.
+
+    Raises
+    ------
+    ValueError
+        if the rows of the file do not have all the same number of
+	columns.
+
+    Examples
+    --------
+    The binary copy is not used once the text file changes:
+
+    >>> import os, tempfile
+    >>> from result_files import load_table
+    >>> directory = tempfile.mkdtemp()
+    >>> filename = os.path.join(directory, 'results.dat')
+    >>> with open(filename, 'w') as f:
+    ...     f.write('1 -0.4 0.1 0.0\\n')
+    >>> load_table(filename, use_sidecar=True).shape
+    (1, 4)
+    >>> with open(filename, 'a') as f:
+    ...     f.write('2 -0.42 0.2 0.0\\n')
+    >>> load_table(filename, use_sidecar=True).shape
+    (2, 4)
+    >>> sorted(os.listdir(directory))
+    ['results.dat', 'results.dat.npz']
+    >>> for name in os.listdir(directory):
+    ...     os.remove(os.path.join(directory, name))
+    >>> os.rmdir(directory)
+    """
+    if not use_sidecar:
+	return _read_text(filename)
+    sidecar = filename + '.npz'
+    # taken before reading, so a change while reading is seen next time
+    stamp = _get_stamp(filename)
+    if os.path.exists(sidecar):
+	try:
+	    with np.load(sidecar) as saved:
+		if np.array_equal(saved['stamp'], stamp):
+		    return saved['data']
+	except (IOError, KeyError, ValueError):
+	    # a broken copy, which is written again
+	    pass
+    result = _read_text(filename)
+    try:
+	np.savez(sidecar, data=result, stamp=stamp)
+    except IOError:
+	pass
+    return result
+
+def get_column_index(column, names=dmrg_columns):
+    """Returns the index of a column given by name or by number.
+
+    Parameters
+    ----------
+    column : a string or an int.
+        The name of the column, or its index as a number or a string of
+	digits.
+    names : a tuple of strings.
+        The names of the columns.
+
+    Returns
+    -------
+    result : an int.
+        The index of the column.
+
+    Raises
+    ------
+    ValueError
+        if `column` is not a number or one of the `names`.
+
+    Examples
+    --------
+    >>> from result_files import get_column_index
+    >>> get_column_index('entropy')
+    2
+    >>> get_column_index('3')
+    3
+    """
+    if isinstance(column, int):
+	return column
+    if column.isdigit():
+	return int(column)
+    if column not in names:
+	raise ValueError('Column must be a number or one of %s.' %
+			 ', '.join(names))
+    return names.index(column)
+
+def get_half_sweeps(sizes):
+    """Labels each DMRG step with the half-sweep it belongs to.
+
+    The steps of the infinite algorithm are labelled -1, and the
+    half-sweeps of the finite algorithm 0, 1, 2... A new half-sweep starts
+    each time the size of the growing block changes direction, or it is
+    repeated.
+
+    Parameters
+    ----------
+    sizes : a numpy array of ndim = 1.
+        The size of the growing block at each step, i.e. the first column
+	of the results file.
+
+    Returns
+    -------
+    result : a numpy array of ints.
+        The half-sweep for each step.
+
+    Examples
+    --------
+    >>> from result_files import get_half_sweeps
+    >>> get_half_sweeps([1, 2, 3, 3, 2, 1, 1, 2, 3])
+    array([-1, -1, -1,  0,  0,  0,  1,  1,  1])
+    """
+    sizes = np.asarray(sizes)
+    steps = np.sign(np.diff(sizes))
+    starts_new = np.zeros(len(sizes), dtype=bool)
+    starts_new[1:] = steps == 0
+    starts_new[2:] |= ((steps[1:] != steps[:-1]) & (steps[1:] != 0) &
+		       (steps[:-1] != 0))
+    return np.cumsum(starts_new) - 1
+
+def select_rows(table, half_sweep=None, parity=None, size_column=0):
+    """Selects the rows for a given half-sweep and/or parity of the size.
+
+    Parameters
+    ----------
+    table : a numpy array of ndim = 2.
+        The data, as returned by `load_table`.
+    half_sweep : an int or 'last', optional.
+        The half-sweep you want, as labelled by `get_half_sweeps`. By
+	default rows of all half-sweeps are kept.
+    parity : a string, optional.
+        Either 'odd' or 'even'. Keeps only the rows where the size of the
+	growing block has this parity. By default all rows are kept.
+    size_column : an int.
+        The column with the size of the growing block.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 2.
+        The selected rows.
+
+    Raises
+    ------
+    ValueError
+        if `parity` is not 'odd' or 'even'.
+    """
+    sizes = table[:, size_column]
+    mask = np.ones(len(table), dtype=bool)
+    if half_sweep is not None:
+	half_sweeps = get_half_sweeps(sizes)
+	if half_sweep == 'last':
+	    half_sweep = half_sweeps.max()
+	mask &= half_sweeps == half_sweep
+    if parity is not None:
+	if parity not in ('odd', 'even'):
+	    raise ValueError('Parity must be odd or even.')
+	mask &= (sizes.astype(int) % 2 == 1) == (parity == 'odd')
+    return table[mask]
+
+class ResultsWriter(object):
+    """Writes the results of the DMRG steps, as they are calculated.
+
+    Each step is a row with the four `dmrg_columns`. The file is flushed
+    at the end of each half-sweep, so you can look at the results of a
+    calculation while it is running. Use it as a context manager, or call
+    `close` when you are done.
+
+    Parameters
+    ----------
+    filename : a string.
+        The name of the results file. Any existing file with the same
+	name is overwritten.
+    """
+    def __init__(self, filename):
+        super(ResultsWriter, self).__init__()
+	self.filename = filename
+	self.f = open(filename, 'w')
+
+    def write(self, step):
+        """Writes the results of a DMRG step.
+
+	Parameters
+	----------
+	step : a sweeps.Step.
+	    The results of the step.
+	"""
+	self.f.write('%s %s %s %s\n' % (step.left_block_size, step.energy,
+		                        step.entropy, step.truncation_error))
+	if step.is_last:
+	    self.f.flush()
+
+    def close(self):
+        """Closes the results file."""
+	self.f.close()
+
+    def __enter__(self):
+	return self
+
+    def __exit__(self, *args):
+	self.close()
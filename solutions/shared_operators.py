@@ -0,0 +1,146 @@
+""" Operators in shared memory for several processes.
+
+When several processes use the same operators, e.g. the block and site
+operators for the terms of the superblock Hamiltonian at each DMRG step
+(see `distributed_matvec` and `superblock`), sending them to each process
+copies them, and each copy takes its own memory. Here the operators are
+written once to files in shared memory (`/dev/shm` in Linux), and each
+process maps them to NumPy arrays without copying them. Sparse matrices
+are kept as the three arrays of their CSR format. The processes only need
+the handle of the store, a small dict with the names of the files, shapes
+and types, which is cheap to send.
+
+A `SharedOperatorStore` owns the files, and removes them when closed.
+The processes attach to it with `attach_operators`, and get read-only
+arrays, so they must not change the operators in place.
+
+Examples
+--------
+>>> import numpy as np
+>>> from shared_operators import SharedOperatorStore, attach_operators
+>>> with SharedOperatorStore() as store:
+...     store.put('s_z', np.diag([-0.5, 0.5]))
+...     operators = attach_operators(store.get_handle())
+...     print operators['s_z'].diagonal()
+[-0.5  0.5]
+"""
+from scipy.sparse import csr_matrix, issparse
+import numpy as np
+import os
+import shutil
+import tempfile
+
+def get_shared_directory():
+    """Returns the directory for the shared files.
+
+    It is `/dev/shm` when it exists, so the files stay in memory, and the
+    temporary directory otherwise.
+    """
+    if os.path.isdir('/dev/shm'):
+	return '/dev/shm'
+    return tempfile.gettempdir()
+
+class SharedOperatorStore(object):
+    """Writes operators to shared memory.
+
+    Parameters
+    ----------
+    directory : a string, optional.
+        Where the files go. By default, the one from
+	`get_shared_directory`.
+    """
+    def __init__(self, directory=None):
+        super(SharedOperatorStore, self).__init__()
+	if directory is None:
+	    directory = get_shared_directory()
+	self.directory = tempfile.mkdtemp(prefix='dmrg_operators_',
+		                          dir=directory)
+	self.entries = {}
+	self.number_of_files = 0
+
+    def _write_array(self, array):
+        """Writes an array to a new file, and returns its description."""
+	array = np.ascontiguousarray(array)
+	filename = os.path.join(self.directory,
+		                '%d.bin' % self.number_of_files)
+	self.number_of_files += 1
+	if array.size:
+	    mapped = np.memmap(filename, dtype=array.dtype, mode='w+',
+		               shape=array.shape)
+	    mapped[...] = array
+	    mapped.flush()
+	    del mapped
+	else:
+	    open(filename, 'wb').close()
+	return (filename, array.dtype.str, array.shape)
+
+    def put(self, name, operator):
+        """Writes an operator to shared memory.
+
+	Parameters
+	----------
+	name : a string.
+	    The name of the operator. Writing twice with the same name
+	    replaces the operator.
+	operator : a numpy array or a scipy.sparse matrix.
+	    The operator.
+	"""
+	if issparse(operator):
+	    operator = csr_matrix(operator)
+	    self.entries[name] = ('csr', operator.shape,
+		                  [self._write_array(operator.data),
+				   self._write_array(operator.indices),
+				   self._write_array(operator.indptr)])
+	else:
+	    self.entries[name] = ('dense', None,
+		                  [self._write_array(operator)])
+
+    def get_handle(self):
+        """Returns what a process needs to attach to the operators."""
+	return dict(self.entries)
+
+    def close(self):
+        """Removes the files."""
+	if os.path.isdir(self.directory):
+	    shutil.rmtree(self.directory)
+	self.entries = {}
+
+    def __enter__(self):
+	return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+	self.close()
+
+def _attach_array(description, mode):
+    """Maps an array written by a SharedOperatorStore."""
+    filename, dtype, shape = description
+    if not np.prod(shape):
+	return np.zeros(shape, dtype=dtype)
+    return np.memmap(filename, dtype=dtype, mode=mode, shape=shape)
+
+def attach_operators(handle, mode='r'):
+    """Maps the operators of a SharedOperatorStore without copying them.
+
+    Parameters
+    ----------
+    handle : a dict.
+        The handle, as returned by `SharedOperatorStore.get_handle`.
+    mode : a string, optional.
+        How to map the files, as in `numpy.memmap`. By default read-only;
+	with 'c' the arrays can be changed, without changing the files.
+
+    Returns
+    -------
+    result : a dict.
+        The operators, by name, as numpy arrays or
+	scipy.sparse.csr_matrix.
+    """
+    result = {}
+    for name, (kind, shape, arrays) in handle.iteritems():
+	arrays = [_attach_array(description, mode) for description in
+		  arrays]
+	if kind == 'csr':
+	    result[name] = csr_matrix(tuple(arrays), shape=shape, copy=False)
+	else:
+	    result[name] = arrays[0]
+    return result
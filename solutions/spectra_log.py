@@ -0,0 +1,255 @@
+""" A compact binary log for the entanglement spectra of a DMRG run.
+
+At each DMRG step you diagonalize the reduced density matrix, but the
+scripts only keep the entropy and the truncation error. The classes here
+store the full spectrum (the kept eigenvalues) for each step, so you can
+calculate later any function of it without running DMRG again.
+
+The log is made of two files, both append-only:
+
+- the data file, with all the eigenvalues one after the other, as
+  little-endian float64 numbers, and
+- the index file, with the same name plus '.idx', with three
+  little-endian int64 numbers per step: a label for the step (e.g. the
+  size of the block), the half-sweep (-1 for the infinite algorithm),
+  and the offset where the spectrum of the step ends in the data file.
+
+As the data file is just a plain array of numbers, reading the log
+memory-maps it, and you only load the spectra you use.
+
+To log the spectra of the full DMRG algorithm, pass a `LogSpectra` to
+`sweeps.run_sweeps`, or use the `--spectra` option of the scripts. Each
+step is labelled with the size of the left block, as in the first column
+of the results file, so `as_table` gives the same rows as the results
+file, with the entropies calculated from the spectra.
+"""
+from batch_entropies import calculate_entropies
+import numpy as np
+import os
+
+class SpectraLogWriter(object):
+    """Appends spectra to a log.
+
+    Use it as a context manager, or call `close` when you are done.
+
+    Examples
+    --------
+    >>> import os, tempfile
+    >>> from spectra_log import SpectraLogWriter, SpectraLogReader
+    >>> filename = os.path.join(tempfile.mkdtemp(), 'spectra.bin')
+    >>> with SpectraLogWriter(filename) as log:
+    ...     log.append([.5, .5], label=4)
+    ...     log.append([.7, .2, .1], label=6)
+    ...     log.append([.6, .3, .1], label=6, half_sweep=0)
+    >>> reader = SpectraLogReader(filename)
+    >>> len(reader)
+    3
+    >>> reader[1]
+    memmap([0.7, 0.2, 0.1])
+    >>> reader.spectra_for_label(6, half_sweep=0)
+    [memmap([0.6, 0.3, 0.1])]
+    """
+    def __init__(self, filename, append=False):
+        """Opens the log for writing.
+
+	Parameters
+	----------
+	filename : a string.
+	    The name of the data file.
+	append : a bool.
+	    Whether to keep what is already in the log. If False, any
+	    existing log with the same name is overwritten.
+	"""
+        super(SpectraLogWriter, self).__init__()
+	mode = 'ab' if append else 'wb'
+	self.data_file = open(filename, mode)
+	self.index_file = open(filename + '.idx', mode)
+	self.end = os.path.getsize(filename) // 8
+
+    def append(self, spectrum, label=-1, half_sweep=-1):
+        """Appends a spectrum to the log.
+
+	Parameters
+	----------
+	spectrum : a list (or 1-D array) of doubles.
+	    The eigenvalues you want to store.
+	label : an int.
+	    A label for the spectrum, e.g. the size of the block.
+	half_sweep : an int.
+	    The half-sweep of the step, -1 for the infinite algorithm.
+	"""
+	spectrum = np.asarray(spectrum, dtype='<f8').ravel()
+	spectrum.tofile(self.data_file)
+	self.end += spectrum.size
+	np.array([label, half_sweep, self.end],
+		 dtype='<i8').tofile(self.index_file)
+
+    def close(self):
+        """Flushes and closes the files of the log."""
+	self.data_file.close()
+	self.index_file.close()
+
+    def __enter__(self):
+	return self
+
+    def __exit__(self, *args):
+	self.close()
+
+class SpectraLogReader(object):
+    """Reads the spectra stored in a log.
+
+    The data file is memory-mapped, so the spectra are only read from disk
+    when you use them.
+
+    Attributes
+    ----------
+    labels : a numpy array of ints.
+        The labels of the spectra in the log, in the order they were
+	stored.
+    half_sweeps : a numpy array of ints.
+        The half-sweep of each spectrum.
+    """
+    def __init__(self, filename):
+        """Opens the log for reading.
+
+	Parameters
+	----------
+	filename : a string.
+	    The name of the data file.
+	"""
+        super(SpectraLogReader, self).__init__()
+	index = np.fromfile(filename + '.idx', dtype='<i8').reshape(-1, 3)
+	self.labels = index[:, 0]
+	self.half_sweeps = index[:, 1]
+	self.ends = index[:, 2]
+	self.starts = np.concatenate(([0], self.ends[:-1]))
+	if os.path.getsize(filename) > 0:
+	    self.data = np.memmap(filename, dtype='<f8', mode='r')
+	else:
+	    self.data = np.zeros(0)
+
+    def __len__(self):
+	return len(self.labels)
+
+    def __getitem__(self, step):
+        """Returns the spectrum for a given step as a read-only view."""
+	return self.data[self.starts[step]:self.ends[step]]
+
+    def spectra_for_label(self, label, half_sweep=None):
+        """Returns all the spectra with a given label.
+
+	Parameters
+	----------
+	label : an int.
+	    The label you want the spectra for.
+	half_sweep : an int, optional.
+	    Keep only the spectra of this half-sweep. By default, the
+	    spectra of all half-sweeps are returned.
+
+	Returns
+	-------
+	result : a list of numpy arrays.
+	    The spectra, in the order they were stored.
+	"""
+	mask = self.labels == label
+	if half_sweep is not None:
+	    mask &= self.half_sweeps == half_sweep
+	return [self[step] for step in np.flatnonzero(mask)]
+
+    def as_padded_array(self, steps=None):
+        """Returns the spectra stacked in a 2-D array, padded with zeros.
+
+	The result can be passed directly to
+	`batch_entropies.calculate_entropies`.
+
+	Parameters
+	----------
+	steps : a list of ints, optional.
+	    The steps you want. By default all of them.
+
+	Returns
+	-------
+	result : a numpy array of ndim = 2.
+	    One spectrum per row.
+	"""
+	if steps is None:
+	    steps = range(len(self))
+	steps = np.asarray(steps, dtype=int)
+	lengths = self.ends[steps] - self.starts[steps]
+	number_of_columns = lengths.max() if len(steps) else 0
+	result = np.zeros((len(steps), number_of_columns))
+	for row, step in enumerate(steps):
+	    result[row, :lengths[row]] = self[step]
+	return result
+
+    def as_table(self, renyi_index=1):
+        """Returns the spectra as a table like the results files.
+
+	Parameters
+	----------
+	renyi_index : a double.
+	    The Renyi index of the entropy, 1 for the von Neumann entropy.
+
+	Returns
+	-------
+	result : a numpy array of ndim = 2.
+	    A row per step, with the `result_files.dmrg_columns`: the
+	    label, NaN for the energy, which is not in the log, the
+	    entropy, and the truncation error of the kept spectrum, so
+	    it can be passed to `result_files.select_rows`.
+
+	Examples
+	--------
+	>>> import os, tempfile
+	>>> from spectra_log import SpectraLogWriter, SpectraLogReader
+	>>> filename = os.path.join(tempfile.mkdtemp(), 'spectra.bin')
+	>>> with SpectraLogWriter(filename) as log:
+	...     log.append([.5, .5], label=1)
+	...     log.append([.75, .25], label=2)
+	>>> table = SpectraLogReader(filename).as_table(renyi_index=2)
+	>>> table[:, 0]
+	array([1., 2.])
+	>>> np.allclose(table[:, 2], -np.log([.5, .625]))
+	True
+	"""
+	spectra = self.as_padded_array()
+	result = np.empty((len(self), 4))
+	result[:, 0] = self.labels
+	result[:, 1] = np.nan
+	if len(self):
+	    result[:, 2] = calculate_entropies(spectra, [renyi_index])[:, 0]
+	result[:, 3] = 1. - np.sum(spectra, axis=1)
+	return result
+
+class LogSpectra(object):
+    """Appends the kept spectrum of each DMRG step to a log.
+
+    A hook for `sweeps.run_sweeps`. After each step, the spectrum the
+    step kept (`Step.spectrum`) is appended to the log, labelled with the
+    size of the left block and the half-sweep.
+
+    Parameters
+    ----------
+    filename : a string.
+        The name of the data file of the log. Any existing log with the
+	same name is overwritten.
+
+    Attributes
+    ----------
+    filename : a string.
+        The name of the data file of the log.
+    """
+    def __init__(self, filename):
+        super(LogSpectra, self).__init__()
+	self.filename = filename
+	self.log = SpectraLogWriter(filename)
+
+    def __call__(self, system, step):
+	if step.spectrum is not None:
+	    self.log.append(step.spectrum, step.left_block_size,
+		            step.half_sweep)
+	return False
+
+    def close(self):
+        """Closes the log."""
+	self.log.close()
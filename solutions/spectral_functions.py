@@ -0,0 +1,487 @@
+#!/usr/bin/env python
+""" Spectral functions with the kernel polynomial method and the DMRG.
+
+Calculates spectral functions like
+
+.. math::
+    A(\omega)=\sum_{n}|\langle n|A|0\rangle|^{2}\delta(\omega-E_{n}+E_{0})
+
+by expanding the delta function in Chebyshev polynomials of the
+Hamiltonian. The Hamiltonian is rescaled to have its spectrum inside
+[-1, 1], and then the moments
+
+.. math::
+    \mu_{n}=\langle 0|A^{\dagger}T_{n}(H)A|0\rangle
+
+are calculated with the recursion of the Chebyshev polynomials, which
+only needs to multiply vectors by the Hamiltonian and keep two vectors in
+memory. The spectral function at all the frequencies is then rebuilt from
+the moments in one go, with the Jackson kernel to damp the oscillations
+from cutting the expansion. The resolution is about the width of the
+spectrum divided by the number of moments. Compared to the correction
+vector method, which solves a linear system for each frequency, the whole
+spectrum costs one set of multiplications by the Hamiltonian.
+
+The functions here only need a function multiplying a vector by the
+Hamiltonian. The script uses the superblock Hamiltonian of the DMRG: it
+finds the ground state with the finite algorithm on a
+`superblock.SuperblockSystem`, and then for each momentum builds the
+operator at that momentum times the ground state in a sweep, adding the
+operator of each site as it becomes single, with blocks that keep the
+states of the ground state, this vector, and the first Chebyshev vectors
+(see `targeting`.) The moments are then calculated with the superblock
+Hamiltonian. As the blocks don't keep the quantum numbers, the spectrum
+of the superblock Hamiltonian used to rescale it is that of all the
+sectors. It calculates:
+
+- heisenberg : the dynamical spin structure factor :math:`S^{zz}(k,
+  \omega)` of the AF Heisenberg model,
+- hubbard : the spectral function :math:`A(k,\omega)` of the electrons
+  with spin up in the Hubbard model at half-filling, i.e. adding an
+  electron for :math:`\omega>0` and removing it for :math:`\omega<0`.
+  The Hamiltonian has the chemical potential :math:`U/2`, so the ground
+  state is at half-filling and :math:`\omega` is measured from the Fermi
+  level. The blocks keep the parity of the electrons with spin up, for
+  the Jordan-Wigner string of the operators.
+
+With `--exact` the moments are calculated instead with the full
+Hamiltonian from `exact_diagonalization` in the sector of each vector,
+for small chains.
+
+As the chain has open boundary conditions, the momenta are those of the
+standing waves, :math:`k=\pi j/(n+1)` with :math:`j=1,\ldots,n`. Each row
+of the output has k, the frequency, and the spectral function.
+
+Usage:
+  spectral_functions.py (-n=<sites>) [--model=<model> -U=<U_over_t> --moments=<moments> --frequencies=<frequencies> -m=<states> -w=<weight> --sweeps=<sweeps> --exact --save-moments=FILE --dir=DIR -o=FILE]
+  spectral_functions.py -h | --help
+
+Options:
+  -h --help         Shows this screen.
+  -n <sites>        Number of sites of the chain.
+  --model=<model>   Model: heisenberg or hubbard [default: heisenberg]
+  -U <U_over_t>     Electronic interaction in units of hopping [default: 0]
+  --moments=<moments>          Number of Chebyshev moments [default: 200]
+  --frequencies=<frequencies>  Number of frequencies [default: 400]
+  -m <states>                  Largest number of states kept [default: 100]
+  -w <weight>                  Largest discarded weight in each truncation
+                               [default: 1e-8]
+  --sweeps=<sweeps>            Number of sweeps for the ground state
+                               [default: 4]
+  --exact                      Use the exact Hamiltonian.
+  --save-moments=FILE          Save also the moments to this file, to
+                               rebuild the spectra with other settings.
+  -o --output=FILE  Ouput file [default: spectral_functions.dat]
+  --dir=DIR         Ouput directory [default: ./]
+
+"""
+from dmrg101.core.sites import ElectronicSite, SpinOneHalfSite
+from docopt import docopt
+from exact_diagonalization import ExactDiagonalization
+from lattices import add_parity_operators
+from model_specs import (ModelFromSpec, make_heisenberg_model,
+			 make_hubbard_model, on_site)
+from scipy.sparse.linalg import LinearOperator, eigsh
+from superblock import SuperblockSystem
+from sweeps import run_sweeps
+from targeting import TargetedSweeps
+import numpy as np
+import os
+
+def estimate_spectral_bounds(matvec, dim, margin=0.01):
+    """Returns the lowest and highest energies of a Hamiltonian.
+
+    Parameters
+    ----------
+    matvec : a function.
+        Multiplies a vector by the Hamiltonian.
+    dim : an int.
+        The dimension of the Hamiltonian.
+    margin : a double.
+        The bounds are widened by this fraction of the width of the
+	spectrum, as the Chebyshev expansion needs the spectrum strictly
+	inside [-1, 1] after rescaling.
+
+    Returns
+    -------
+    lowest : a double.
+        A lower bound for the energies.
+    highest : a double.
+        An upper bound for the energies.
+    """
+    if dim <= 2:
+	hamiltonian = np.array([matvec(column) for column in np.eye(dim)]).T
+	energies = np.linalg.eigvalsh(hamiltonian)
+	lowest, highest = energies[0], energies[-1]
+    else:
+	hamiltonian = LinearOperator((dim, dim), matvec=matvec,
+		                     dtype=np.float64)
+	lowest = eigsh(hamiltonian, 1, which='SA',
+		       return_eigenvectors=False)[0]
+	highest = eigsh(hamiltonian, 1, which='LA',
+		        return_eigenvectors=False)[0]
+    width = max(highest - lowest, 1e-8)
+    return lowest - margin * width, highest + margin * width
+
+def get_scale_and_shift(lowest, highest):
+    """Returns how to rescale a Hamiltonian to have its spectrum in [-1, 1].
+
+    The rescaled Hamiltonian is :math:`(H - shift) / scale`.
+    """
+    return (highest - lowest) / 2., (highest + lowest) / 2.
+
+def calculate_chebyshev_moments(matvec, vector, number_of_moments, scale,
+	                        shift):
+    """Calculates the Chebyshev moments of a spectral function.
+
+    The moments are :math:`\mu_{n}=\langle v|T_{n}(\\tilde{H})|v\\rangle`,
+    with :math:`\\tilde{H}=(H-shift)/scale`. Only two vectors are kept in
+    memory, and each multiplication by the Hamiltonian gives two moments,
+    using :math:`T_{2n}=2T_{n}^{2}-T_{0}` and
+    :math:`T_{2n+1}=2T_{n+1}T_{n}-T_{1}`.
+
+    Parameters
+    ----------
+    matvec : a function.
+        Multiplies a vector by the Hamiltonian.
+    vector : a numpy array of ndim = 1.
+        The vector, e.g. the ground state with an operator applied.
+    number_of_moments : an int.
+        The number of moments.
+    scale : a double.
+        The half-width of the spectrum.
+    shift : a double.
+        The center of the spectrum.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 1.
+        The moments.
+
+    Examples
+    --------
+    For a two-level system, the moments are the Chebyshev polynomials at
+    the energies:
+
+    >>> import numpy as np
+    >>> from spectral_functions import calculate_chebyshev_moments
+    >>> hamiltonian = np.diag([-0.5, 0.5])
+    >>> vector = np.array([1., 0.])
+    >>> moments = calculate_chebyshev_moments(hamiltonian.dot, vector, 6,
+    ...                                       1., 0.)
+    >>> print ' '.join('%.2f' % x for x in moments)
+    1.00 -0.50 -0.50 1.00 -0.50 -0.50
+    """
+    def rescaled_matvec(x):
+	return (matvec(x) - shift * x) / scale
+    result = np.empty(number_of_moments)
+    previous = vector
+    current = rescaled_matvec(vector)
+    mu_0 = np.vdot(vector, vector).real
+    mu_1 = np.vdot(vector, current).real
+    result[0] = mu_0
+    if number_of_moments > 1:
+	result[1] = mu_1
+    for n in range(1, (number_of_moments + 1) / 2):
+	# current is T_n |v>, previous T_{n-1} |v>
+	if 2 * n < number_of_moments:
+	    result[2 * n] = 2 * np.vdot(current, current).real - mu_0
+	if 2 * n + 1 < number_of_moments:
+	    previous, current = current, 2 * rescaled_matvec(current) - previous
+	    result[2 * n + 1] = 2 * np.vdot(current, previous).real - mu_1
+    return result
+
+def get_jackson_kernel(number_of_moments):
+    """Returns the Jackson kernel to damp the moments.
+
+    Examples
+    --------
+    >>> from spectral_functions import get_jackson_kernel
+    >>> print ' '.join('%.3f' % x for x in get_jackson_kernel(4))
+    1.000 0.809 0.447 0.138
+    """
+    n = np.arange(number_of_moments)
+    angle = np.pi / (number_of_moments + 1)
+    return ((number_of_moments - n + 1) * np.cos(angle * n) +
+	    np.sin(angle * n) / np.tan(angle)) / (number_of_moments + 1)
+
+def reconstruct_spectral_functions(moments, energies, scale, shift):
+    """Rebuilds spectral functions from their Chebyshev moments.
+
+    All the spectral functions and energies are done at once, as a
+    product of the matrix of damped moments and the matrix of Chebyshev
+    polynomials at the energies.
+
+    Parameters
+    ----------
+    moments : a numpy array of ndim = 1 or 2.
+        The moments, with one spectral function per row.
+    energies : a numpy array of ndim = 1.
+        The energies of the Hamiltonian where you want the spectral
+	functions.
+    scale : a double.
+        The half-width of the spectrum used for the moments.
+    shift : a double.
+        The center of the spectrum used for the moments.
+
+    Returns
+    -------
+    result : a numpy array.
+        The spectral functions, with one row per row of `moments`, and
+	one column per energy. It is zero for energies outside the
+	spectrum.
+    """
+    moments = np.asarray(moments)
+    number_of_moments = moments.shape[-1]
+    damped = moments * get_jackson_kernel(number_of_moments)
+    damped[..., 1:] *= 2
+    x = (np.asarray(energies, dtype=float) - shift) / scale
+    inside = np.abs(x) < 1
+    angles = np.arccos(x[inside])
+    polynomials = np.cos(np.outer(np.arange(number_of_moments), angles))
+    result = np.zeros(moments.shape[:-1] + x.shape)
+    result[..., inside] = (np.dot(damped, polynomials) /
+	                   (np.pi * scale * np.sqrt(1 - x[inside] ** 2)))
+    return result
+
+def get_standing_wave_momenta(number_of_sites):
+    """Returns the momenta of the standing waves in an open chain."""
+    return np.pi * np.arange(1, number_of_sites + 1) / (number_of_sites + 1)
+
+def get_standing_wave(number_of_sites, momentum):
+    """Returns the amplitude of a standing wave on each site."""
+    sites = np.arange(1, number_of_sites + 1)
+    return np.sqrt(2. / (number_of_sites + 1)) * np.sin(momentum * sites)
+
+def calculate_moments_for_momenta(sweeps, operator, number_of_moments,
+	                          scale, shift, string=None,
+				  name='ground_state'):
+    """Calculates the moments for an operator at each momentum.
+
+    For each momentum, a sweep to the right adds the operator at each site
+    times the ground state as the site becomes single, building the
+    operator at that momentum times the ground state, and keeping the
+    states of both. A sweep back keeps also the states of the first
+    Chebyshev vectors. Then the moments are calculated with the
+    superblock Hamiltonian at the first configuration.
+
+    Parameters
+    ----------
+    sweeps : a TargetedSweeps.
+        The sweeps, at the first configuration, with the ground state in
+	`vectors`.
+    operator : a string.
+        The name of the site operator.
+    number_of_moments : an int.
+        The number of moments.
+    scale : a double.
+        The half-width of the spectrum of the superblock Hamiltonian.
+    shift : a double.
+        The center of the spectrum of the superblock Hamiltonian.
+    string : a string, optional.
+        The name of the Jordan-Wigner string for fermionic operators, which
+	must be one of the `block_operators` of the sweeps.
+    name : a string, optional.
+        The name of the ground state in `vectors`.
+
+    Returns
+    -------
+    moments : a numpy array of ndim = 2.
+        The moments, with one row per momentum.
+    """
+    number_of_sites = sweeps.number_of_sites
+    moments = []
+    for momentum in get_standing_wave_momenta(number_of_sites):
+	amplitudes = get_standing_wave(number_of_sites, momentum)
+	sweeps.vectors['excited'] = np.zeros_like(sweeps.vectors[name])
+	added = set()
+	def add_sites(last):
+	    ground_state = sweeps.vectors[name]
+	    for site in range(number_of_sites):
+		if site not in added and sweeps.get_part(site) is not None:
+		    sweeps.vectors['excited'] = (sweeps.vectors['excited'] +
+			amplitudes[site] * sweeps.apply_site_operator(
+			    ground_state, site, operator, string))
+		    added.add(site)
+	    return [(.5, ground_state), (.5, sweeps.vectors['excited'])]
+	def add_chebyshev_vectors(last):
+	    matvec = sweeps.get_hamiltonian()
+	    def rescaled_matvec(x):
+		return (matvec(x) - shift * x) / scale
+	    vectors = [sweeps.vectors['excited']]
+	    vectors.append(rescaled_matvec(vectors[0]))
+	    vectors.append(2 * rescaled_matvec(vectors[1]) - vectors[0])
+	    return ([(.5, sweeps.vectors[name])] +
+		    [(1 / 6., vector) for vector in vectors])
+	sweeps.sweep('left', add_sites)
+	sweeps.sweep('right', add_chebyshev_vectors)
+	moments.append(calculate_chebyshev_moments(sweeps.get_hamiltonian(),
+		                                   sweeps.vectors['excited'],
+						   number_of_moments, scale,
+						   shift))
+    return np.array(moments)
+
+def calculate_exact_moments(exact_diagonalization, target, operator,
+	                    ground_state, number_of_moments, string=None):
+    """Calculates the moments for an operator at each momentum exactly.
+
+    Parameters
+    ----------
+    exact_diagonalization : an ExactDiagonalization.
+        The one for the sector of the ground state.
+    target : an ExactDiagonalization.
+        The one for the sector where the operator takes the ground state.
+    operator : a string.
+        The name of the site operator.
+    ground_state : a numpy array of ndim = 1.
+        The ground state.
+    number_of_moments : an int.
+        The number of moments.
+    string : a string, optional.
+        The name of the Jordan-Wigner string for fermionic operators.
+
+    Returns
+    -------
+    moments : a numpy array of ndim = 2.
+        The moments, with one row per momentum.
+    scale : a double.
+        The half-width of the spectrum of the target Hamiltonian.
+    shift : a double.
+        The center of the spectrum of the target Hamiltonian.
+    """
+    number_of_sites = exact_diagonalization.number_of_sites
+    hamiltonian = target.build_hamiltonian()
+    scale, shift = get_scale_and_shift(
+	*estimate_spectral_bounds(hamiltonian.dot, hamiltonian.shape[0]))
+    site_operators = []
+    for site in range(number_of_sites):
+	operators = [(site, operator)]
+	if string is not None:
+	    operators += [(i, string) for i in range(site)]
+	site_operators.append(exact_diagonalization.build_operator(
+	    [(1., operators)], target).dot(ground_state))
+    moments = []
+    for momentum in get_standing_wave_momenta(number_of_sites):
+	vector = np.dot(get_standing_wave(number_of_sites, momentum),
+		        site_operators)
+	moments.append(calculate_chebyshev_moments(hamiltonian.dot, vector,
+		                                   number_of_moments, scale,
+						   shift))
+    return np.array(moments), scale, shift
+
+def main(args):
+    #
+    # read command-line arguments and set the model
+    #
+    number_of_sites = int(args['-n'])
+    number_of_moments = int(args['--moments'])
+    number_of_frequencies = int(args['--frequencies'])
+    if args['--model'] == 'heisenberg':
+	site = SpinOneHalfSite()
+	model = make_heisenberg_model()
+	conserved = ('s_z',)
+	sector = (number_of_sites % 2 / 2.,)
+	# the operators, how they change the sector, and the sign of the
+	# frequency
+	operators = [('s_z', 0, 1.)]
+	string = None
+    elif args['--model'] == 'hubbard':
+	site = ElectronicSite()
+	add_parity_operators(site)
+	U = float(args['-U'])
+	# with the chemical potential of half-filling the ground state is
+	# the one at half-filling, which the DMRG finds with no quantum
+	# numbers, and the frequencies are measured from the Fermi level
+	model = ModelFromSpec(make_hubbard_model(U).terms +
+		              [on_site('n', -U / 2.)], U=U)
+	conserved = ('n_up', 'n_down')
+	sector = ((number_of_sites + 1) / 2, number_of_sites / 2)
+	# adding and removing an electron with spin up
+	operators = [('c_up_dag', 1, 1.), ('c_up', -1, -1.)]
+	string = 'p_up'
+    else:
+	raise ValueError('Model must be heisenberg or hubbard.')
+    #
+    # calculate the ground state and the moments
+    #
+    parts = []
+    if args['--exact']:
+	exact_diagonalization = ExactDiagonalization(model, site.operators,
+		                                     number_of_sites,
+						     conserved, sector)
+	energies, wavefunctions = exact_diagonalization.calculate_ground_state()
+	ground_state_energy = energies[0]
+	ground_state = wavefunctions[:, 0]
+	for operator, change, sign in operators:
+	    target = exact_diagonalization
+	    if change:
+		target = ExactDiagonalization(model, site.operators,
+			                      number_of_sites, conserved,
+					      (sector[0] + change, sector[1]))
+	    moments, scale, shift = calculate_exact_moments(
+		exact_diagonalization, target, operator, ground_state,
+		number_of_moments, string)
+	    parts.append((moments, scale, shift, sign))
+    else:
+	max_states = int(args['-m'])
+	system = SuperblockSystem(site)
+	system.model = model
+	system.number_of_sites = number_of_sites
+	for step in run_sweeps(system, max_states, int(args['--sweeps'])):
+	    pass
+	block_operators = ()
+	if string is not None:
+	    block_operators = (string,)
+	sweeps = TargetedSweeps(system, number_of_sites, max_states,
+		                float(args['-w']), block_operators)
+	if block_operators:
+	    sweeps.rebuild_blocks()
+	# ends at the first configuration
+	ground_state_energy = sweeps.find_ground_state('right')
+	hamiltonian = sweeps.get_hamiltonian()
+	scale, shift = get_scale_and_shift(*estimate_spectral_bounds(
+	    hamiltonian, len(sweeps.vectors['ground_state'])))
+	for operator, change, sign in operators:
+	    moments = calculate_moments_for_momenta(sweeps, operator,
+		                                    number_of_moments, scale,
+						    shift, string)
+	    parts.append((moments, scale, shift, sign))
+    print "The ground state energy is %8.6f." % ground_state_energy
+    width = max(2 * part[1] for part in parts)
+    #
+    # rebuild the spectral functions at all the frequencies, with the
+    # energies of the target Hamiltonian at E_0 + omega for the
+    # excitations, and E_0 - omega for removing electrons
+    #
+    if args['--model'] == 'heisenberg':
+	frequencies = np.linspace(0., width, number_of_frequencies)
+    else:
+	frequencies = np.linspace(-width, width, number_of_frequencies)
+    spectral_functions = 0.
+    for moments, scale, shift, sign in parts:
+	spectral_functions = spectral_functions + (
+	    reconstruct_spectral_functions(moments, ground_state_energy +
+		                           sign * frequencies, scale, shift))
+    #
+    # save results
+    #
+    if args['--save-moments'] is not None:
+	np.savez_compressed(args['--save-moments'],
+		            ground_state_energy=ground_state_energy,
+			    moments=[part[0] for part in parts],
+			    scales=[part[1] for part in parts],
+			    shifts=[part[2] for part in parts],
+			    signs=[part[3] for part in parts])
+    output_file = os.path.join(os.path.abspath(args['--dir']), args['--output'])
+    f = open(output_file, 'w')
+    momenta = get_standing_wave_momenta(number_of_sites)
+    for momentum, row in zip(momenta, spectral_functions):
+	for frequency, value in zip(frequencies, row):
+	    f.write('%s %s %s\n' % (momentum, frequency, value))
+	f.write('\n')
+    f.close()
+    print 'Results stored in ' + output_file
+
+if __name__ == '__main__':
+    args = docopt(__doc__, version = 0.1)
+    main(args)
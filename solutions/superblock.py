@@ -0,0 +1,284 @@
+""" A System applying the superblock Hamiltonian without building it.
+
+The `System` in dmrg101 builds each term of the superblock Hamiltonian as
+the Kronecker products of a block and a site operator on each side, i.e.
+two matrices of dimension :math:`md\\times md`, with the full identities
+for the parts of the system the term doesn't act on. Most terms are
+products with identities, e.g. the block Hamiltonian of the left block
+is `('bh', 'id', 'id', 'id')`, so most of the memory and the time of the
+multiplication by the wavefunction goes in copying identities.
+
+`SuperblockSystem` does the same DMRG steps, but keeps each side of a
+term as the block and site operators it is made of (a
+`lazy_operators.KronOperator`), and applies the terms to the wavefunction
+with `lazy_operators.apply_kron`, skipping the products by the identity.
+The block Hamiltonian and the operators to update when a block grows are
+also built with `add_kron_to_matrix`, without building the identity of
+the block or of the site.
+
+The terms are applied with a `distributed_matvec.
+DistributedSuperblockHamiltonian`, so they can be split among several
+processes by passing a `MultiprocessingCommunicator` (`--processes` in
+the scripts). Each process gets the block and site operators of its
+terms at each step, and only the wavefunction and the results travel
+between the processes in the Lanczos iterations. With `shared` (`--shared`
+in the scripts) these operators are written once to shared memory at each
+step (see `shared_operators`), and the processes map them instead of
+getting a copy.
+
+It only changes how the calls from the model to the system are done, so
+it works with any model that has the methods of the models in dmrg101,
+e.g. the ones in `model_specs`.
+"""
+from dmrg101.core.system import System
+from dmrg101.core.wavefunction import Wavefunction
+from distributed_matvec import (DistributedSuperblockHamiltonian,
+				SerialCommunicator)
+from lazy_operators import Identity, KronOperator, add_kron_to_matrix
+from scipy.sparse.linalg import LinearOperator, eigsh
+from shared_operators import SharedOperatorStore
+import numpy as np
+
+def get_operator(part, name):
+    """Returns an operator of a block or site, with a symbolic identity.
+
+    Parameters
+    ----------
+    part : a Block or Site.
+        The block or site.
+    name : a string.
+        The name of the operator, 'id' for the identity.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 2, or an Identity.
+        The operator.
+    """
+    if name == 'id':
+	return Identity(part.dim)
+    return part.operators[name]
+
+class SuperblockSystem(System):
+    """A System applying the Hamiltonian term by term.
+
+    Parameters
+    ----------
+    left_site : a Site.
+        The site of the left side of the system.
+    right_site : a Site, optional.
+        The site of the right side. By default the same as the left.
+    communicator : a SerialCommunicator or MultiprocessingCommunicator,
+        optional.
+        The communicator splitting the terms among processes. By default,
+	all the terms are applied in this process. It is not saved when
+	the system is pickled, e.g. in a `block_library.BlockLibrary`.
+    shared : a bool, optional.
+        Whether to keep the operators of the terms in shared memory for
+	the processes.
+
+    Attributes
+    ----------
+    superblock_terms : a list of tuples.
+        The terms of the superblock Hamiltonian, as (param, left_op,
+	right_op), where each operator acts on a block and its site.
+
+    Examples
+    --------
+    >>> from dmrg101.core.sites import SpinOneHalfSite
+    >>> from model_specs import make_heisenberg_model
+    >>> from superblock import SuperblockSystem
+    >>> system = SuperblockSystem(SpinOneHalfSite())
+    >>> system.model = make_heisenberg_model()
+    >>> energy, ground_state_wf = system.calculate_ground_state()
+    >>> round(energy, 6)
+    -1.616025
+    """
+    def __init__(self, left_site, right_site=None, communicator=None,
+	         shared=False):
+        super(SuperblockSystem, self).__init__(left_site, right_site)
+	if communicator is None:
+	    communicator = SerialCommunicator()
+	self.communicator = communicator
+	self.shared = shared
+	self.store = None
+	self.clear_hamiltonian()
+
+    def __getstate__(self):
+	# the processes of a communicator cannot be pickled, the shared
+	# files belong to this run, and the terms are built again at the
+	# next step
+	state = dict(self.__dict__)
+	state.update(communicator=None, store=None, superblock_terms=[],
+		     superblock_operators={})
+	return state
+
+    def __setstate__(self, state):
+	self.__dict__.update(state)
+	self.communicator = SerialCommunicator()
+
+    def close(self):
+        """Stops the processes and removes the shared files, if any."""
+	self.communicator.close()
+	if self.store is not None:
+	    self.store.close()
+	    self.store = None
+
+    def __enter__(self):
+	return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+	self.close()
+
+    def clear_hamiltonian(self):
+        """Removes all the terms of the superblock Hamiltonian."""
+	self.superblock_terms = []
+	self.superblock_operators = {}
+
+    def _get_kron(self, first, first_op, second, second_op):
+        """Returns the product of the operators of a block and a site.
+
+	The same operators give the same product, so the terms sharing it
+	share also its factors.
+	"""
+	key = (id(first), first_op, id(second), second_op)
+	result = self.superblock_operators.get(key)
+	if result is None:
+	    if first_op == 'id' and second_op == 'id':
+		result = Identity(first.dim * second.dim)
+	    else:
+		result = KronOperator(get_operator(first, first_op),
+			              get_operator(second, second_op))
+	    self.superblock_operators[key] = result
+	return result
+
+    def add_to_hamiltonian(self, left_block_op='id', left_site_op='id',
+	                   right_site_op='id', right_block_op='id',
+			   param=1.0):
+        """Adds a term to the superblock Hamiltonian.
+
+	The arguments are the same as for `System.add_to_hamiltonian`, but
+	no matrix is built.
+	"""
+	left_op = self._get_kron(self.left_block, left_block_op,
+		                 self.left_site, left_site_op)
+	right_op = self._get_kron(self.right_site, right_site_op,
+		                  self.right_block, right_block_op)
+	self.superblock_terms.append((param, left_op, right_op))
+
+    def get_superblock_hamiltonian(self):
+        """Sets the Hamiltonian of the model, and returns it as an operator.
+
+	Returns
+	-------
+	result : a scipy.sparse.linalg.LinearOperator.
+	    The superblock Hamiltonian, acting on the wavefunction as a
+	    vector, i.e. `Wavefunction.as_matrix` raveled.
+	"""
+	self.set_hamiltonian()
+	# distributed_matvec has the states of the left as the fastest
+	# index, and the wavefunction has those of the right
+	terms = [(param, right_op, left_op) for param, left_op, right_op in
+		 self.superblock_terms]
+	if self.shared:
+	    # the files of the previous step can be removed, as the arrays
+	    # mapped from them stay valid until they are freed
+	    if self.store is not None:
+		self.store.close()
+	    self.store = SharedOperatorStore()
+	distributed = DistributedSuperblockHamiltonian(terms, self.communicator,
+		                                       self.store)
+	return LinearOperator(distributed.shape, matvec=distributed.matvec,
+		              dtype=np.float64)
+
+    def calculate_ground_state(self, initial_wf=None,
+	                       min_lanczos_iterations=3,
+			       too_many_iterations=1000, precision=0.000001):
+        """Calculates the ground state of the system Hamiltonian.
+
+	Parameters
+	----------
+	initial_wf : a Wavefunction, optional.
+	    The wavefunction to start the Lanczos algorithm with.
+	min_lanczos_iterations : an int, optional.
+	    Not used, kept for the interface of `System`.
+	too_many_iterations : an int, optional.
+	    The largest number of iterations of the Lanczos algorithm.
+	precision : a double, optional.
+	    Not used, the eigenvalue is converged to machine precision.
+
+	Returns
+	-------
+	energy : a double.
+	    The energy of the ground state of the superblock.
+	ground_state_wf : a Wavefunction.
+	    The ground state.
+	"""
+	hamiltonian = self.get_superblock_hamiltonian()
+	left_dim = self.get_left_dim()
+	right_dim = self.get_right_dim()
+	v0 = None
+	if initial_wf is not None:
+	    v0 = initial_wf.as_matrix.ravel()
+	energies, vectors = eigsh(hamiltonian, 1, which='SA', v0=v0,
+		                  maxiter=too_many_iterations)
+	ground_state_wf = Wavefunction(left_dim, right_dim)
+	ground_state_wf.as_matrix[...] = vectors[:, 0].reshape(left_dim,
+		                                               right_dim)
+	return energies[0], ground_state_wf
+
+    def update_all_operators(self, truncation_matrix):
+        """Updates the operators of the growing block, and keeps the
+	truncation matrix in the new block.
+
+	The truncation matrix is kept as `truncation_matrix` of the block,
+	with its rows as the states of the smaller block and the site, with
+	the site fastest, for the blocks of both sides. So it is the same
+	for a right block from the infinite algorithm, which is the left
+	one, and for one grown on the right. The `targeting` module uses it
+	to carry wavefunctions from one step to the next.
+	"""
+	super(SuperblockSystem, self).update_all_operators(truncation_matrix)
+	if self.growing_side == 'left':
+	    new_block = self.left_block
+	else:
+	    new_block = self.right_block
+	    # the right block grows as the site times the block
+	    states = truncation_matrix.shape[1]
+	    truncation_matrix = truncation_matrix.reshape(
+		self.growing_site.dim, -1, states).transpose(1, 0, 2).reshape(
+		    -1, states)
+	new_block.truncation_matrix = truncation_matrix
+
+    def _get_growing_kron(self, block_op, site_op):
+        """Returns the factors of a growing block operator, in order."""
+	block_op = get_operator(self.growing_block, block_op)
+	site_op = get_operator(self.growing_site, site_op)
+	if self.growing_side == 'left':
+	    return block_op, site_op
+	return site_op, block_op
+
+    def add_to_block_hamiltonian(self, tmp_matrix_for_bh, block_op='id',
+	                         site_op='id', param=1.0):
+        """Adds a term to the Hamiltonian of the growing block.
+
+	The arguments are the same as for
+	`System.add_to_block_hamiltonian`.
+	"""
+	left_op, right_op = self._get_growing_kron(block_op, site_op)
+	add_kron_to_matrix(tmp_matrix_for_bh, left_op, right_op, param)
+
+    def add_to_operators_to_update(self, name, block_op='id', site_op='id'):
+        """Adds an operator to the ones updated when the block grows.
+
+	The arguments are the same as for
+	`System.add_to_operators_to_update`.
+	"""
+	left_op, right_op = self._get_growing_kron(block_op, site_op)
+	dim = self.growing_block.dim * self.growing_site.dim
+	dtype = np.result_type(*[operator.dtype for operator in
+		                 (left_op, right_op) if
+				 not isinstance(operator, Identity)] or
+			       [np.float64])
+	result = np.zeros((dim, dim), dtype=dtype)
+	add_kron_to_matrix(result, left_op, right_op)
+	self.operators_to_add_to_block[name] = result
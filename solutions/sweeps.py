@@ -0,0 +1,588 @@
+""" The loop over DMRG steps of the full DMRG algorithm.
+
+The full DMRG algorithm is the same for all models: first the infinite
+algorithm, growing the system until it has the number of sites you want,
+and then the finite algorithm, sweeping back and forth keeping more states
+at each half-sweep. `run_sweeps` does these steps on a `System`, and
+yields the results of each step as they are calculated, so you can save
+them, print them, or stop whenever you want. The entropy and the
+truncation error of each step are calculated from the spectrum of the
+reduced density matrix with `batch_entropies`, which stays accurate for
+zero, negative, or tiny eigenvalues.
+
+You can also pass hooks, i.e. functions called with the system and the
+results after each step, to do things like keeping the block operators
+on disk, checking the convergence, or saving a checkpoint. If
+some hook returns True the sweeps stop after that step, and if it returns
+'finish' the sweeps jump to the last sweep once the current half-sweep
+is done, i.e. to keeping the final number of states and stopping at the
+middle of the chain.
+
+To extrapolate the energy to zero truncation error, you can add a few
+sweeps at the end keeping less and less states (see `EnergyExtrapolation`.)
+As these sweeps start from the blocks of the previous one, which keeps
+more states, the result is as good as doing a full calculation for each
+number of states, for the cost of one sweep each.
+
+The scripts share the command-line options for these hooks: put
+`sweep_usage` in their usage and `sweep_options` in their options, make
+the hooks with `make_sweep_hooks`, and print what they found with
+`report_sweep_hooks`, which closes also the log of the spectra, if
+any. The number of processes for the superblock Hamiltonian, and whether
+they share the operators, go to the `superblock.SuperblockSystem` of the
+script (see `distributed_matvec.make_communicator`).
+"""
+from dmrg101.core.calculate_states_to_keep import calculate_states_to_keep
+from batch_entropies import calculate_entropy, calculate_truncation_error
+from spectra_log import LogSpectra
+import numpy as np
+import os
+import time
+
+sweep_usage = ('[--energy-tolerance=<tol> --truncation-tolerance=<tol> '
+	       '--extrapolate=<states> --spectra=FILE '
+	       '--processes=<processes> --shared]')
+
+sweep_options = """\
+  --energy-tolerance=<tol>      Jump to the last sweep when the energy per
+                                site changes less than this between
+                                half-sweeps.
+  --truncation-tolerance=<tol>  Require also the largest truncation error in
+                                the half-sweep to be less than this.
+  --extrapolate=<states>        Add sweeps keeping these numbers of states,
+                                e.g. 40,30,20, and extrapolate the energy
+                                to zero truncation error.
+  --spectra=FILE                Binary file to store the kept spectra at
+                                each step (see spectra_log).
+  --processes=<processes>       Split the terms of the superblock
+                                Hamiltonian among these processes (see
+                                distributed_matvec) [default: 1]
+  --shared                      Keep the operators of the terms in shared
+                                memory for the processes, instead of
+                                sending each process a copy."""
+
+class Step(object):
+    """The results of a DMRG step.
+
+    Attributes
+    ----------
+    half_sweep : an int.
+        The half-sweep, -1 for the infinite algorithm.
+    growing_side : a string.
+        The block that grows, 'left' or 'right'.
+    left_block_size : an int.
+        The number of sites in the left block.
+    number_of_states : an int.
+        The number of states kept.
+    energy : a double.
+        The energy per site.
+    entropy : a double.
+        The entanglement entropy of the kept spectrum.
+    truncation_error : a double.
+        The truncation error.
+    is_last : a bool.
+        Whether this is the last step of the half-sweep.
+    time : a double.
+        The time spent in the step, in seconds.
+    spectrum : a numpy array, or None.
+        The eigenvalues of the reduced density matrix kept in the step,
+	if known.
+    """
+    def __init__(self, half_sweep, growing_side, left_block_size,
+		 number_of_states, energy, entropy, truncation_error, is_last,
+		 time, spectrum=None):
+        super(Step, self).__init__()
+	self.half_sweep = half_sweep
+	self.growing_side = growing_side
+	self.left_block_size = left_block_size
+	self.number_of_states = number_of_states
+	self.energy = energy
+	self.entropy = entropy
+	self.truncation_error = truncation_error
+	self.is_last = is_last
+	self.time = time
+	self.spectrum = spectrum
+
+class RecordTruncation(object):
+    """Keeps the spectrum truncated by the `System` in a DMRG step.
+
+    The `System` in dmrg101 returns only the entropy and the truncation
+    error of each step. Inside a `with` block, the `truncate` function the
+    system calls is wrapped to keep the eigenvalues it gets and the ones
+    it keeps, and the original is put back when the block ends, even if
+    the step fails.
+
+    Attributes
+    ----------
+    evals : a numpy array, or None.
+        All the eigenvalues of the reduced density matrix in the last
+	truncation, None if there was none.
+    truncated_evals : a numpy array, or None.
+        The eigenvalues kept in the last truncation.
+
+    Examples
+    --------
+    >>> from dmrg101.core import system
+    >>> from sweeps import RecordTruncation
+    >>> truncate = system.truncate
+    >>> try:
+    ...     with RecordTruncation():
+    ...         raise RuntimeError('the step failed')
+    ... except RuntimeError:
+    ...     pass
+    >>> system.truncate is truncate
+    True
+    """
+    def __init__(self):
+        super(RecordTruncation, self).__init__()
+	self.evals = None
+	self.truncated_evals = None
+	self.module = None
+	self.truncate = None
+
+    def record(self, evals, *args, **kwargs):
+        """Calls `truncate` and keeps the eigenvalues."""
+	truncated_evals, truncation_matrix = self.truncate(evals, *args,
+		                                           **kwargs)
+	self.evals = evals
+	self.truncated_evals = truncated_evals
+	return truncated_evals, truncation_matrix
+
+    def __enter__(self):
+	# the system looks up `truncate` in its module at each call
+	from dmrg101.core import system
+	self.module = system
+	self.truncate = system.truncate
+	system.truncate = self.record
+	return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+	self.module.truncate = self.truncate
+
+def plan_half_sweeps(number_of_sites, states_to_keep,
+	             number_of_states_infinite_algorithm,
+		     extrapolation_states=(), first_left_block_size=1):
+    """Returns the DMRG steps for the infinite and the finite algorithm.
+
+    Parameters
+    ----------
+    number_of_sites : an int.
+        The number of sites of the chain.
+    states_to_keep : a list of ints.
+        The number of states kept in each half-sweep of the finite
+	algorithm.
+    number_of_states_infinite_algorithm : an int.
+        The number of states kept in the infinite algorithm.
+    extrapolation_states : a list of ints.
+        The number of states kept in each of the sweeps added at the end
+	for the extrapolation.
+    first_left_block_size : an int.
+        The size of the left block in the first step of the infinite
+	algorithm, larger than one if the system starts with blocks from a
+	previous calculation.
+
+    Returns
+    -------
+    result : a list of tuples.
+        For each half-sweep, starting with the infinite algorithm, the
+	half-sweep, the growing side, the sizes of the left block, and the
+	number of states kept. The last half-sweep stops when the two
+	blocks have the same size.
+
+    Examples
+    --------
+    >>> from sweeps import plan_half_sweeps
+    >>> for half_sweep in plan_half_sweeps(8, [10, 20], 10):
+    ...     print half_sweep
+    (-1, 'left', [1, 2, 3, 4, 5], 10)
+    (0, 'right', [5, 4, 3, 2, 1], 10)
+    (1, 'left', [1, 2, 3], 20)
+    >>> plan_half_sweeps(8, [10, 20], 10, first_left_block_size=4)[0]
+    (-1, 'left', [4, 5], 10)
+    """
+    max_left_block_size = number_of_sites - 3
+    result = [(-1, 'left', range(first_left_block_size,
+	                         max_left_block_size + 1),
+	       number_of_states_infinite_algorithm)]
+    states_to_keep = list(states_to_keep)
+    for states in extrapolation_states:
+	states_to_keep += [states, states]
+    number_of_half_sweeps = len(states_to_keep)
+    for half_sweep, states in enumerate(states_to_keep):
+	if half_sweep % 2 == 0:
+	    # sweep to the left
+	    result.append((half_sweep, 'right',
+		           range(max_left_block_size, 0, -1), states))
+	else:
+	    # sweep to the right
+	    # if this is the last sweep, stop at the middle
+	    if half_sweep == number_of_half_sweeps - 1:
+		max_left_block_size = number_of_sites / 2 - 1
+	    result.append((half_sweep, 'left',
+		           range(1, max_left_block_size + 1), states))
+    return result
+
+def run_sweeps(system, number_of_states_kept, number_of_sweeps,
+	       number_of_states_infinite_algorithm=10, hooks=(),
+	       extrapolation_states=(), first_left_block_size=1):
+    """Runs the full DMRG algorithm on a system.
+
+    Parameters
+    ----------
+    system : a System.
+        The system, with its model and number of sites already set.
+    number_of_states_kept : an int.
+        The number of states kept at the end of the finite algorithm.
+    number_of_sweeps : an int.
+        The number of sweeps of the finite algorithm.
+    number_of_states_infinite_algorithm : an int.
+        The number of states kept in the infinite algorithm.
+    hooks : a list of functions.
+        Functions called as `hook(system, step)` after each step. If some
+	of them returns True, the sweeps stop after this step. If it
+	returns 'finish', the sweeps jump to the last sweep after this
+	half-sweep.
+    extrapolation_states : a list of ints.
+        The number of states kept in the sweeps added at the end for the
+	extrapolation, which should be decreasing and smaller than
+	`number_of_states_kept`.
+    first_left_block_size : an int.
+        The size of the left block in the first step of the infinite
+	algorithm. Use it when the system already has the blocks of the
+	previous steps, e.g. from a `block_library.BlockLibrary`.
+
+    Yields
+    ------
+    step : a Step.
+        The results of each DMRG step.
+    """
+    if number_of_states_kept < number_of_states_infinite_algorithm:
+	number_of_states_kept = number_of_states_infinite_algorithm
+    states_to_keep = calculate_states_to_keep(number_of_states_infinite_algorithm,
+		                              number_of_states_kept,
+		                              number_of_sweeps)
+    plan = plan_half_sweeps(system.number_of_sites, states_to_keep,
+	                    number_of_states_infinite_algorithm,
+			    extrapolation_states, first_left_block_size)
+    finish = False
+    index = 0
+    while index < len(plan):
+	half_sweep, growing_side, left_block_sizes, states = plan[index]
+	index += 1
+	for left_block_size in left_block_sizes:
+	    # models with terms depending on where the single sites are
+	    if hasattr(system.model, 'left_block_size'):
+		system.model.left_block_size = left_block_size
+	    start = time.time()
+	    with RecordTruncation() as truncation:
+		if half_sweep == -1:
+		    energy, entropy, truncation_error = (
+			system.infinite_dmrg_step(left_block_size, states) )
+		else:
+		    energy, entropy, truncation_error = (
+			system.finite_dmrg_step(growing_side, left_block_size,
+				                states) )
+	    # the ones from dmrg101 are NaN for zero or negative eigenvalues,
+	    # and lose the truncation errors below the rounding error of one
+	    if truncation.evals is not None:
+		entropy = calculate_entropy(truncation.truncated_evals)
+		truncation_error = calculate_truncation_error(
+		    truncation.evals, len(truncation.truncated_evals))
+	    step = Step(half_sweep, growing_side, left_block_size, states,
+		        energy, entropy, truncation_error,
+			left_block_size == left_block_sizes[-1],
+			time.time() - start, truncation.truncated_evals)
+	    stop = False
+	    for hook in hooks:
+		result = hook(system, step)
+		if result == 'finish':
+		    finish = True
+		elif result:
+		    stop = True
+	    yield step
+	    if stop:
+		return
+	if finish:
+	    index = _get_last_sweep_index(plan, index, len(states_to_keep))
+
+def _get_last_sweep_index(plan, index, number_of_half_sweeps):
+    """Returns where to continue the plan to do only the last sweep.
+
+    The last sweep must start at the same end of the chain as the next
+    half-sweep, so it is either the last two half-sweeps (starting with a
+    sweep to the left) or only the last one. The sweeps added for the
+    extrapolation are always done.
+    """
+    if index >= len(plan):
+	return index
+    # the infinite algorithm is the first in the plan
+    last_index = number_of_half_sweeps
+    if plan[index][0] % 2 == 0:
+	return max(index, last_index - 1)
+    return max(index, last_index)
+
+class ConvergenceCheck(object):
+    """Checks the convergence of the sweeps.
+
+    A hook for `run_sweeps`. At the end of each half-sweep of the finite
+    algorithm, compares the lowest energy in the half-sweep with the one
+    in the previous half-sweep, and checks the largest truncation error
+    in the half-sweep. When both are below the tolerances, the sweeps
+    jump to the last sweep (or stop, if `finish` is False.)
+
+    Parameters
+    ----------
+    energy_tolerance : a double.
+        The largest change in the energy per site between half-sweeps.
+    truncation_error_tolerance : a double, optional.
+        The largest truncation error. By default, it is not checked.
+    finish : a bool.
+        Whether to do the last sweep, keeping the final number of states,
+	after converging. If False, the sweeps stop right away.
+
+    Attributes
+    ----------
+    converged_at : an int, or None.
+        The half-sweep where the sweeps converged, None if they didn't.
+
+    Examples
+    --------
+    >>> from sweeps import ConvergenceCheck, Step
+    >>> check = ConvergenceCheck(1e-6)
+    >>> for half_sweep, energy in enumerate([-0.4, -0.43, -0.43]):
+    ...     step = Step(half_sweep, 'left', 1, 10, energy, 0., 0., True, 0.)
+    ...     print check(None, step)
+    False
+    False
+    finish
+    """
+    def __init__(self, energy_tolerance, truncation_error_tolerance=None,
+		 finish=True):
+        super(ConvergenceCheck, self).__init__()
+	self.energy_tolerance = energy_tolerance
+	self.truncation_error_tolerance = truncation_error_tolerance
+	self.finish = finish
+	self.converged_at = None
+	self.previous_energy = None
+	self.energy = None
+	self.truncation_error = 0.
+
+    def __call__(self, system, step):
+	if step.half_sweep < 0 or self.converged_at is not None:
+	    return False
+	if self.energy is None or step.energy < self.energy:
+	    self.energy = step.energy
+	self.truncation_error = max(self.truncation_error,
+		                    step.truncation_error)
+	if not step.is_last:
+	    return False
+	converged = (self.previous_energy is not None and
+		     abs(self.energy - self.previous_energy) <=
+		     self.energy_tolerance)
+	if self.truncation_error_tolerance is not None:
+	    converged &= (self.truncation_error <=
+		          self.truncation_error_tolerance)
+	self.previous_energy = self.energy
+	self.energy = None
+	self.truncation_error = 0.
+	if not converged:
+	    return False
+	self.converged_at = step.half_sweep
+	if self.finish:
+	    return 'finish'
+	return True
+
+def fit_linear_extrapolation(truncation_errors, energies):
+    """Fits the energies linearly with the truncation error.
+
+    Parameters
+    ----------
+    truncation_errors : a list of doubles.
+        The truncation errors.
+    energies : a list of doubles.
+        The energies.
+
+    Returns
+    -------
+    energy : a double.
+        The energy extrapolated to zero truncation error.
+    error : a double.
+        The standard error of `energy`, from the covariance of the fit, or
+	NaN if there are only two points.
+    slope : a double.
+        The slope of the fit.
+
+    Raises
+    ------
+    ValueError
+        if there are less than two points to fit.
+
+    Examples
+    --------
+    >>> from sweeps import fit_linear_extrapolation
+    >>> energy, error, slope = fit_linear_extrapolation([1e-5, 2e-5, 4e-5],
+    ...                                                 [-0.43, -0.42, -0.40])
+    >>> round(energy, 6), round(slope, 6)
+    (-0.44, 1000.0)
+    """
+    x = np.asarray(truncation_errors, dtype=float)
+    y = np.asarray(energies, dtype=float)
+    if len(x) < 2:
+	raise ValueError('You need at least two points to extrapolate.')
+    design_matrix = np.column_stack((np.ones_like(x), x))
+    coefficients, residuals, rank, singular_values = (
+	np.linalg.lstsq(design_matrix, y, rcond=-1) )
+    energy, slope = coefficients
+    if len(x) == 2:
+	return energy, np.nan, slope
+    variance = np.sum((y - np.dot(design_matrix, coefficients)) ** 2)
+    variance /= len(x) - 2
+    covariance = variance * np.linalg.inv(np.dot(design_matrix.T,
+	                                         design_matrix))
+    return energy, np.sqrt(covariance[0, 0]), slope
+
+class EnergyExtrapolation(object):
+    """Records the energy of the last sweeps to extrapolate it.
+
+    A hook for `run_sweeps`, used together with its
+    `extrapolation_states`. For the last sweep keeping the final number
+    of states, and for each of the sweeps added for the extrapolation,
+    records the number of states, the lowest energy, and the largest
+    truncation error in the sweep to the right (the sweep to the left
+    is where the blocks are truncated to the new number of states.)
+
+    Parameters
+    ----------
+    number_of_sweeps : an int.
+        The number of sweeps of the finite algorithm, not including the
+	sweeps for the extrapolation.
+
+    Attributes
+    ----------
+    records : a list of tuples.
+        (number_of_states, energy, truncation_error) for each sweep.
+    """
+    def __init__(self, number_of_sweeps):
+        super(EnergyExtrapolation, self).__init__()
+	self.first_half_sweep = 2 * number_of_sweeps - 1
+	self.records = []
+	self.energy = None
+	self.truncation_error = 0.
+
+    def __call__(self, system, step):
+	if step.half_sweep < self.first_half_sweep or step.half_sweep % 2 == 0:
+	    return False
+	if self.energy is None or step.energy < self.energy:
+	    self.energy = step.energy
+	self.truncation_error = max(self.truncation_error,
+		                    step.truncation_error)
+	if step.is_last:
+	    self.records.append((step.number_of_states, self.energy,
+		                 self.truncation_error))
+	    self.energy = None
+	    self.truncation_error = 0.
+	return False
+
+    def fit(self):
+        """Returns the energy extrapolated to zero truncation error.
+
+	Returns
+	-------
+	energy : a double.
+	    The extrapolated energy.
+	error : a double.
+	    The standard error of `energy`.
+	slope : a double.
+	    The slope of the energy with the truncation error.
+	"""
+	return fit_linear_extrapolation([record[2] for record in self.records],
+		                        [record[1] for record in self.records])
+
+def make_sweep_hooks(args, number_of_sweeps):
+    """Returns the hooks for the options of the sweeps of a script.
+
+    Parameters
+    ----------
+    args : a dict.
+        The command-line arguments from docopt, with the options in
+	`sweep_options`, and '--dir' for the output directory.
+    number_of_sweeps : an int.
+        The number of sweeps of the finite algorithm.
+
+    Returns
+    -------
+    result : a list.
+        The hooks for `run_sweeps`.
+
+    Examples
+    --------
+    >>> from sweeps import make_sweep_hooks
+    >>> hooks = make_sweep_hooks({'--energy-tolerance': '1e-6',
+    ...                           '--truncation-tolerance': None,
+    ...                           '--extrapolate': '40,30',
+    ...                           '--spectra': None}, 4)
+    >>> [hook.__class__.__name__ for hook in hooks]
+    ['ConvergenceCheck', 'EnergyExtrapolation']
+    """
+    result = []
+    if args['--energy-tolerance'] is not None:
+	truncation_error_tolerance = args['--truncation-tolerance']
+	if truncation_error_tolerance is not None:
+	    truncation_error_tolerance = float(truncation_error_tolerance)
+	result.append(ConvergenceCheck(float(args['--energy-tolerance']),
+		                       truncation_error_tolerance))
+    if args['--extrapolate'] is not None:
+	result.append(EnergyExtrapolation(number_of_sweeps))
+    if args['--spectra'] is not None:
+	result.append(LogSpectra(os.path.join(os.path.abspath(args['--dir']),
+		                              args['--spectra'])))
+    return result
+
+def get_extrapolation_states(args):
+    """Returns the number of states of the sweeps for the extrapolation.
+
+    Parameters
+    ----------
+    args : a dict.
+        The command-line arguments from docopt, with the options in
+	`sweep_options`.
+
+    Returns
+    -------
+    result : a list of ints.
+        The `extrapolation_states` for `run_sweeps`, empty if there is
+	no extrapolation.
+
+    Examples
+    --------
+    >>> from sweeps import get_extrapolation_states
+    >>> get_extrapolation_states({'--extrapolate': '40,30,20'})
+    [40, 30, 20]
+    """
+    if args['--extrapolate'] is None:
+	return []
+    return [int(x) for x in args['--extrapolate'].split(',')]
+
+def report_sweep_hooks(hooks):
+    """Prints what the hooks from `make_sweep_hooks` found.
+
+    The hooks writing files are closed.
+
+    Parameters
+    ----------
+    hooks : a list.
+        The hooks passed to `run_sweeps`. The ones not from
+	`make_sweep_hooks` are skipped.
+    """
+    for hook in hooks:
+	if (isinstance(hook, ConvergenceCheck) and
+		hook.converged_at is not None):
+	    print 'Converged at half-sweep %d' % hook.converged_at
+	if isinstance(hook, EnergyExtrapolation):
+	    for record in hook.records:
+		print 'm = %d: energy %s, truncation error %s' % record
+	    energy, error, slope = hook.fit()
+	    print 'Extrapolated energy: %s +/- %s' % (energy, error)
+	if isinstance(hook, LogSpectra):
+	    hook.close()
+	    print 'Spectra stored in ' + hook.filename
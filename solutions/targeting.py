@@ -0,0 +1,538 @@
+""" Sweeps keeping the states of several wavefunctions, not the ground state.
+
+The finite DMRG algorithm keeps at each step the states of the ground
+state of the superblock. To follow a state in time, or to calculate
+dynamical correlations, you need instead blocks that describe well a set
+of wavefunctions, the targets, e.g. the state at several times, or the
+ground state with an operator applied. `TargetedSweeps` does the
+half-sweeps of the finite algorithm on a `superblock.SuperblockSystem`,
+keeping the states of the reduced density matrix of all the targets,
+
+.. math::
+    \\rho=\\sum_{i}w_{i}\\mathrm{Tr}_{R}|\\psi_{i}\\rangle\\langle\\psi_{i}|
+
+with the number of states not fixed, but chosen so that the discarded
+weight is below a tolerance.
+
+The blocks and the truncation are the ones of the `System`: the reduced
+density matrix is built with `Wavefunction`, diagonalized and truncated
+with `dmrg101.core.reduced_DM`, and the blocks grow with the block
+Hamiltonian and the operators to update from the model, as in a DMRG
+step. The blocks are real, so a complex target enters the density matrix
+by its real and imaginary parts. This keeps the real part of its density
+matrix, which has the same discarded weight, for at most twice the
+number of states.
+
+Between steps, the wavefunctions are carried to the next configuration of
+the blocks with the truncation matrices that `SuperblockSystem` keeps in
+each block it grows (the wavefunction transformation of White), so they
+keep the states of all the sites that are not single.
+"""
+from dmrg101.core.reduced_DM import diagonalize, truncate
+from dmrg101.core.wavefunction import Wavefunction
+from batch_entropies import calculate_entropy
+import numpy as np
+
+def get_states_to_keep(evals, max_states, max_discarded_weight):
+    """Returns how many states to keep from a reduced density matrix.
+
+    Parameters
+    ----------
+    evals : a numpy array of ndim = 1.
+        The eigenvalues of the reduced density matrix, in any order.
+    max_states : an int.
+        The largest number of states you want to keep.
+    max_discarded_weight : a double.
+        The largest discarded weight, relative to the total weight.
+
+    Returns
+    -------
+    states : an int.
+        The number of states to keep, at least one.
+    discarded_weight : a double.
+        The weight of the states that are not kept.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from targeting import get_states_to_keep
+    >>> states, discarded_weight = get_states_to_keep(
+    ...     np.array([.09, .9, .01]), 10, .05)
+    >>> print states, '%.2f' % discarded_weight
+    2 0.01
+    """
+    weights = np.clip(np.sort(evals)[::-1], 0., None)
+    weights = weights / weights.sum()
+    # the weight left out if you keep 0, 1, 2, ... states
+    discarded = np.append(np.cumsum(weights[::-1])[::-1], 0.)
+    states = np.argmax(discarded <= max_discarded_weight)
+    states = min(max(states, 1), max_states, len(evals))
+    return states, discarded[states]
+
+def apply_to_parts(vector, dims, first, operator):
+    """Applies an operator to one or two neighbouring parts of a superblock.
+
+    Parameters
+    ----------
+    vector : a numpy array of ndim = 1.
+        The wavefunction, i.e. `Wavefunction.as_matrix` raveled.
+    dims : a tuple of ints.
+        The dimensions of the left block, left site, right site, and right
+	block.
+    first : an int.
+        The first part the operator acts on, from 0 for the left block to
+	3 for the right block.
+    operator : a numpy array of ndim = 2 or 4.
+        The operator on one part, or on two with the indices (new first,
+	new second, old first, old second), e.g. a gate of
+	`time_evolution`.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 1.
+        The operator times the wavefunction.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from targeting import apply_to_parts
+    >>> vector = np.arange(16.)
+    >>> flip = np.array([[0., 1.], [1., 0.]])
+    >>> apply_to_parts(vector, (2, 2, 2, 2), 1, flip)[:4]
+    array([4., 5., 6., 7.])
+    """
+    tensor = vector.reshape(dims)
+    number_of_parts = operator.ndim / 2
+    parts = range(first, first + number_of_parts)
+    result = np.tensordot(operator, tensor,
+			  axes=(range(number_of_parts, operator.ndim), parts))
+    # the parts the operator acts on come first in the result
+    others = [part for part in range(len(dims)) if part not in parts]
+    return result.transpose(np.argsort(parts + others)).reshape(vector.shape)
+
+def move_to_the_right(vector, dims, left_truncation, right_truncation):
+    """Carries a wavefunction to the next configuration to the right.
+
+    Parameters
+    ----------
+    vector : a numpy array of ndim = 1.
+        The wavefunction.
+    dims : a tuple of ints.
+        The dimensions of the left block, left site, right site, and right
+	block.
+    left_truncation : a numpy array of ndim = 2.
+        The truncation matrix of the new left block, i.e. the left block
+	and site.
+    right_truncation : a numpy array of ndim = 2.
+        The truncation matrix of the right block, which splits in a block
+	with one site less and the new right site.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 1.
+        The wavefunction with the single sites one site to the right.
+    """
+    left_block_dim, left_site_dim, right_site_dim, right_block_dim = dims
+    result = np.dot(left_truncation.T,
+		    vector.reshape(left_block_dim * left_site_dim, -1))
+    result = np.dot(result.reshape(-1, right_block_dim), right_truncation.T)
+    # the right block is now the smaller block times the site
+    new_states = result.shape[0] / right_site_dim
+    result = result.reshape(new_states, right_site_dim, -1, right_site_dim)
+    return result.transpose(0, 1, 3, 2).ravel()
+
+def move_to_the_left(vector, dims, left_truncation, right_truncation):
+    """Carries a wavefunction to the next configuration to the left.
+
+    Parameters
+    ----------
+    vector : a numpy array of ndim = 1.
+        The wavefunction.
+    dims : a tuple of ints.
+        The dimensions of the left block, left site, right site, and right
+	block.
+    left_truncation : a numpy array of ndim = 2.
+        The truncation matrix of the left block, which splits in a block
+	with one site less and the new left site.
+    right_truncation : a numpy array of ndim = 2.
+        The truncation matrix of the new right block, i.e. the right block
+	and site.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 1.
+        The wavefunction with the single sites one site to the left.
+    """
+    left_block_dim, left_site_dim, right_site_dim, right_block_dim = dims
+    result = vector.reshape(left_block_dim * left_site_dim, right_site_dim,
+			    right_block_dim)
+    # the truncation matrices have the block first
+    result = result.transpose(0, 2, 1).reshape(left_block_dim * left_site_dim,
+					       -1)
+    result = np.dot(result, right_truncation)
+    result = np.dot(left_truncation, result.reshape(left_block_dim, -1))
+    return result.ravel()
+
+class TargetedSweeps(object):
+    """Half-sweeps of the finite DMRG algorithm keeping a set of targets.
+
+    The configurations of the blocks are given by the size of the left
+    block, as in the finite algorithm, so the single sites are
+    `left_block_size` and `left_block_size + 1`. The wavefunctions are
+    vectors, i.e. `Wavefunction.as_matrix` raveled.
+
+    Parameters
+    ----------
+    system : a SuperblockSystem.
+        The system, with its model set, and the blocks of all the sizes
+	used in the sweeps in `old_left_blocks` and `old_right_blocks`,
+	e.g. after `run_sweeps`, or from `make_product_state`.
+    number_of_sites : an int.
+        The number of sites of the chain, at least four.
+    max_states : an int.
+        The largest number of states kept.
+    max_discarded_weight : a double.
+        The largest discarded weight in each truncation.
+    block_operators : a list of strings, optional.
+        Site operators whose product over the sites of a block is kept as
+	an operator of the block with the same name, e.g. the parity for
+	the Jordan-Wigner strings of fermionic operators.
+
+    Attributes
+    ----------
+    vectors : a dict.
+        The wavefunctions carried from one configuration to the next, by
+	name.
+    left_block_size : an int.
+        The size of the left block in the current configuration.
+    discarded_weight : a double.
+        The total discarded weight of the truncations so far.
+    max_states_kept : an int.
+        The largest number of states kept so far.
+    """
+    def __init__(self, system, number_of_sites, max_states,
+		 max_discarded_weight, block_operators=()):
+	if number_of_sites < 4:
+	    raise ValueError('You need at least four sites.')
+	self.system = system
+	self.number_of_sites = number_of_sites
+	self.max_states = max_states
+	self.max_discarded_weight = max_discarded_weight
+	self.block_operators = block_operators
+	self.vectors = {}
+	self.left_block_size = 1
+	self.discarded_weight = 0.
+	self.max_states_kept = 0
+
+    def set_blocks(self, left_block_size, growing_side):
+        """Sets the blocks of the system for a configuration."""
+	system = self.system
+	right_block_size = self.number_of_sites - left_block_size - 2
+	system.left_block = system.old_left_blocks[left_block_size - 1]
+	system.right_block = system.old_right_blocks[right_block_size - 1]
+	system.set_growing_side(growing_side)
+	# models with terms depending on where the single sites are
+	if hasattr(system.model, 'left_block_size'):
+	    system.model.left_block_size = left_block_size
+	self.left_block_size = left_block_size
+
+    def get_parts(self):
+        """Returns the left block, left site, right site and right block."""
+	system = self.system
+	return (system.left_block, system.left_site, system.right_site,
+		system.right_block)
+
+    def get_dims(self):
+        """Returns the dimensions of the parts of the superblock."""
+	return tuple(part.dim for part in self.get_parts())
+
+    def get_part(self, site):
+        """Returns the part of the superblock that is a site.
+
+	Parameters
+	----------
+	site : an int.
+	    The site of the chain.
+
+	Returns
+	-------
+	result : an int or None.
+	    The part, from 0 for the left block to 3 for the right block,
+	    or None if the site is in a block with more sites.
+        """
+	left_block_size = self.left_block_size
+	if site in (left_block_size, left_block_size + 1):
+	    return site - left_block_size + 1
+	if site == 0 and left_block_size == 1:
+	    return 0
+	if (site == self.number_of_sites - 1 and
+	    left_block_size == self.number_of_sites - 3):
+	    return 3
+	return None
+
+    def apply_site_operator(self, vector, site, operator, string=None):
+        """Applies the operator of a site to a wavefunction.
+
+	Parameters
+	----------
+	vector : a numpy array of ndim = 1.
+	    The wavefunction.
+	site : an int.
+	    The site, which must be a part of the superblock, see
+	    `get_part`.
+	operator : a string.
+	    The name of the operator of the site.
+	string : a string, optional.
+	    The name of the operator for the Jordan-Wigner string, applied
+	    to all the sites at the left of the site. It must be one of
+	    the `block_operators`.
+
+	Returns
+	-------
+	result : a numpy array of ndim = 1.
+	    The operator times the wavefunction.
+        """
+	parts = self.get_parts()
+	dims = self.get_dims()
+	part = self.get_part(site)
+	result = apply_to_parts(vector, dims, part,
+				parts[part].operators[operator])
+	if string is not None:
+	    for other in range(part):
+		result = apply_to_parts(result, dims, other,
+					parts[other].operators[string])
+	return result
+
+    def get_expectation_value(self, vector, site, operator):
+        """Returns the expectation value of the operator of a site."""
+	return (np.vdot(vector, self.apply_site_operator(vector, site,
+							 operator)).real /
+		np.vdot(vector, vector).real)
+
+    def get_hamiltonian(self):
+        """Returns the superblock Hamiltonian of the configuration.
+
+	Returns
+	-------
+	result : a function.
+	    Multiplies a real or complex wavefunction by the Hamiltonian.
+        """
+	hamiltonian = self.system.get_superblock_hamiltonian()
+	def matvec(vector):
+	    if np.iscomplexobj(vector):
+		return (hamiltonian.matvec(vector.real) +
+			1j * hamiltonian.matvec(vector.imag))
+	    return hamiltonian.matvec(vector)
+	return matvec
+
+    def get_energy(self, vector):
+        """Returns the energy of a wavefunction."""
+	return (np.vdot(vector, self.get_hamiltonian()(vector)).real /
+		np.vdot(vector, vector).real)
+
+    def get_entropy(self, vector):
+        """Returns the entanglement entropy between the left block and site,
+	and the right site and block."""
+	singular_values = np.linalg.svd(
+	    vector.reshape(self.system.get_left_dim(), -1), compute_uv=False)
+	weights = singular_values ** 2
+	return calculate_entropy(weights / weights.sum())
+
+    def grow_block(self, truncation_matrix):
+        """Grows the block of the growing side, with the block operators.
+
+	It is `System.grow_block_by_one_site`, but adds also the
+	`block_operators` to the operators to update.
+        """
+	system = self.system
+	system.set_block_hamiltonian()
+	system.set_operators_to_update()
+	for name in self.block_operators:
+	    system.add_to_operators_to_update(name, block_op=name,
+					      site_op=name)
+	system.update_all_operators(truncation_matrix)
+
+    def grow(self, targets):
+        """Grows the block of the growing side keeping the targets.
+
+	The `vectors` are carried to the next configuration, i.e. with the
+	single sites one site towards the shrinking side.
+
+	Parameters
+	----------
+	targets : a list of tuples.
+	    The targets, as (weight, vector). Each vector is normalized,
+	    so the weights are the weights of the targets in the reduced
+	    density matrix.
+        """
+	system = self.system
+	left_dim = system.get_left_dim()
+	right_dim = system.get_right_dim()
+	reduced_density_matrix = 0.
+	for weight, vector in targets:
+	    norm = np.vdot(vector, vector).real
+	    if norm == 0:
+		continue
+	    if np.iscomplexobj(vector):
+		parts = (vector.real, vector.imag)
+	    else:
+		parts = (vector,)
+	    for part in parts:
+		wavefunction = Wavefunction(left_dim, right_dim)
+		wavefunction.as_matrix[...] = part.reshape(left_dim,
+							   right_dim)
+		reduced_density_matrix = reduced_density_matrix + (
+		    weight / norm *
+		    wavefunction.build_reduced_density_matrix(
+			system.shrinking_side))
+	evals, evecs = diagonalize(reduced_density_matrix)
+	states, discarded_weight = get_states_to_keep(
+	    evals, self.max_states, self.max_discarded_weight)
+	truncated_evals, truncation_matrix = truncate(evals, evecs, states)
+	self.discarded_weight += discarded_weight
+	self.max_states_kept = max(self.max_states_kept, states)
+	dims = self.get_dims()
+	left_block_size = self.left_block_size
+	right_block_size = self.number_of_sites - left_block_size - 2
+	self.grow_block(truncation_matrix)
+	if system.growing_side == 'left':
+	    system.old_left_blocks[left_block_size] = system.left_block
+	    for name, vector in self.vectors.items():
+		self.vectors[name] = move_to_the_right(
+		    vector, dims, system.left_block.truncation_matrix,
+		    system.right_block.truncation_matrix)
+	else:
+	    system.old_right_blocks[right_block_size] = system.right_block
+	    for name, vector in self.vectors.items():
+		self.vectors[name] = move_to_the_left(
+		    vector, dims, system.left_block.truncation_matrix,
+		    system.right_block.truncation_matrix)
+
+    def sweep(self, growing_side, step):
+        """Does a half-sweep.
+
+	Parameters
+	----------
+	growing_side : a string.
+	    The side that grows, i.e. 'left' for a sweep to the right,
+	    from the left block of one site, and 'right' for a sweep back.
+	step : a function.
+	    Called as `step(last)` at each configuration, with its blocks
+	    set, and `last` True at the last one. It can measure and change
+	    the `vectors`, and returns the targets, as a list of (weight,
+	    vector). The last step doesn't grow a block, as the blocks are
+	    the same for the first step of the sweep back.
+        """
+	if growing_side == 'left':
+	    left_block_sizes = range(1, self.number_of_sites - 2)
+	else:
+	    left_block_sizes = range(self.number_of_sites - 3, 0, -1)
+	for left_block_size in left_block_sizes:
+	    self.set_blocks(left_block_size, growing_side)
+	    last = left_block_size == left_block_sizes[-1]
+	    targets = step(last)
+	    if not last:
+		self.grow(targets)
+
+    def find_ground_state(self, growing_side, name='ground_state'):
+        """Does a half-sweep keeping the ground state of each configuration.
+
+	Parameters
+	----------
+	growing_side : a string.
+	    The side that grows.
+	name : a string.
+	    The name of the ground state in `vectors`.
+
+	Returns
+	-------
+	result : a double.
+	    The energy of the ground state at the last configuration.
+        """
+	energies = []
+	def step(last):
+	    initial_wf = None
+	    if name in self.vectors:
+		initial_wf = Wavefunction(self.system.get_left_dim(),
+					  self.system.get_right_dim())
+		initial_wf.as_matrix[...] = self.vectors[name].reshape(
+		    initial_wf.as_matrix.shape)
+	    energy, ground_state_wf = self.system.calculate_ground_state(
+		initial_wf)
+	    energies.append(energy)
+	    self.vectors[name] = ground_state_wf.as_matrix.ravel()
+	    return [(1., self.vectors[name])]
+	self.sweep(growing_side, step)
+	return energies[-1]
+
+    def rebuild_blocks(self):
+        """Builds again the operators of all the blocks, with the same states.
+
+	Use it after changing the model of the system, e.g. for a quench,
+	or to add the `block_operators` to the blocks from `run_sweeps`.
+	The wavefunctions don't change, as the states of the blocks are the
+	same.
+        """
+	system = self.system
+	growing_side = system.growing_side
+	for size in range(1, self.number_of_sites - 3):
+	    system.left_block = system.old_left_blocks[size - 1]
+	    system.set_growing_side('left')
+	    self.grow_block(system.old_left_blocks[size].truncation_matrix)
+	    system.old_left_blocks[size] = system.left_block
+	    system.right_block = system.old_right_blocks[size - 1]
+	    system.set_growing_side('right')
+	    truncation_matrix = system.old_right_blocks[size].truncation_matrix
+	    states = truncation_matrix.shape[1]
+	    # back to the site times the block, see update_all_operators
+	    truncation_matrix = truncation_matrix.reshape(
+		-1, system.right_site.dim, states).transpose(1, 0, 2).reshape(
+		    -1, states)
+	    self.grow_block(truncation_matrix)
+	    system.old_right_blocks[size] = system.right_block
+	self.set_blocks(self.left_block_size, growing_side)
+
+    def make_product_state(self, local_states):
+        """Builds blocks with a single state, for a product state.
+
+	The blocks of the system are replaced by blocks with the state of
+	each site, and the system is set to the first configuration, with
+	the left block of one site, growing on the left.
+
+	Parameters
+	----------
+	local_states : a list of numpy arrays of ndim = 1.
+	    The state of each site.
+
+	Returns
+	-------
+	result : a numpy array of ndim = 1.
+	    The product state, as the wavefunction of the first
+	    configuration.
+        """
+	system = self.system
+	number_of_sites = self.number_of_sites
+	system.old_left_blocks = system.old_left_blocks[:1]
+	system.old_right_blocks = system.old_right_blocks[:1]
+	for size in range(1, number_of_sites - 3):
+	    if size == 1:
+		left_state = np.kron(local_states[0], local_states[1])
+		right_state = np.kron(local_states[-2], local_states[-1])
+	    else:
+		left_state = local_states[size]
+		right_state = local_states[-size - 1]
+	    system.left_block = system.old_left_blocks[-1]
+	    system.set_growing_side('left')
+	    self.grow_block(left_state.reshape(-1, 1))
+	    system.old_left_blocks.append(system.left_block)
+	    system.right_block = system.old_right_blocks[-1]
+	    system.set_growing_side('right')
+	    self.grow_block(right_state.reshape(-1, 1))
+	    system.old_right_blocks.append(system.right_block)
+	self.set_blocks(1, 'left')
+	if number_of_sites == 4:
+	    right_part = np.kron(local_states[2], local_states[3])
+	else:
+	    right_part = local_states[2]
+	return np.outer(np.kron(local_states[0], local_states[1]),
+			right_part).ravel()
@@ -8,7 +8,7 @@ i.e. first the infinite algorithm, and then doing sweeps for convergence
 with the finite algorithm.
 
 Usage:
-  tfim.py (-m=<states> -n=<sites> -s=<sweeps> -H=<field>) [--dir=DIR -o=FILE]
+  tfim.py (-m=<states> -n=<sites> -s=<sweeps> -H=<field>) [--dir=DIR -o=FILE --pbc --memory=<MB>] %(sweep_usage)s
   tfim.py -h | --help
 
 Options:
@@ -19,90 +19,78 @@ Options:
   -H <field>        Magnetic field in units of coupling between spins.
   -o --output=FILE  Ouput file [default: tfim.dat]
   --dir=DIR         Ouput directory [default: ./]
+  --pbc             Close the chain in a ring. The naive ring: the
+                    bond closing it joins the far ends of the blocks,
+                    which needs about the square of the states of an
+                    open chain for the same accuracy (see model_specs).
+%(sweep_options)s
+  --memory=<MB>                 Memory budget. Keeps the blocks on disk,
+                                and then fewer states, if needed to fit.
 
 """
-from dmrg101.core.calculate_states_to_keep import calculate_states_to_keep
 from dmrg101.core.sites import SpinOneHalfSite
-from dmrg101.core.system import System
-from dmrg101.utils.models.tfi_model import TranverseFieldIsingModel
+from distributed_matvec import make_communicator
 from docopt import docopt
+from memory_budget import fit_memory_budget
+from model_specs import make_tfim_model
+from result_files import ResultsWriter
+from superblock import SuperblockSystem
+from sweeps import (get_extrapolation_states, make_sweep_hooks,
+	            report_sweep_hooks, run_sweeps, sweep_options,
+		    sweep_usage)
 import os
 
+__doc__ = __doc__ % {'sweep_usage': sweep_usage,
+		     'sweep_options': sweep_options}
+
 def main(args):
     # 
     # create a system object with spin one-half sites and blocks, and set
     # its model to be the TFIM.
     #
     spin_one_half_site = SpinOneHalfSite()
-    system = System(spin_one_half_site)
-    system.model = TranverseFieldIsingModel()
+    communicator = make_communicator(int(args['--processes']))
+    system = SuperblockSystem(spin_one_half_site, communicator=communicator,
+			      shared=args['--shared'])
+    system.model = make_tfim_model()
     #
     # read command-line arguments and initialize some stuff
     #
-    number_of_sites = int(args['-n'])
+    system.number_of_sites = int(args['-n'])
     number_of_states_kept = int(args['-m'])
     number_of_sweeps = int(args['-s'])
-    system.model.H = float(args['-H'])
-    number_of_states_infinite_algorithm = 10
-    if number_of_states_kept < number_of_states_infinite_algorithm:
-	number_of_states_kept = number_of_states_infinite_algorithm
-    sizes = []
-    energies = []
-    entropies = []
-    truncation_errors = []
-    system.number_of_sites = number_of_sites
+    system.model.h = float(args['-H'])
+    system.model.periodic = args['--pbc']
+    hooks = make_sweep_hooks(args, number_of_sweeps)
+    extrapolation_states = get_extrapolation_states(args)
+    output_file = os.path.join(os.path.abspath(args['--dir']), args['--output'])
     #
-    # infinite DMRG algorithm
+    # fit the calculation in the memory budget, if any, keeping the blocks
+    # on disk or fewer states if needed
     #
-    max_left_block_size = number_of_sites - 3
-    for left_block_size in range(1, max_left_block_size+1):
-	energy, entropy, truncation_error = ( 
-	    system.infinite_dmrg_step(left_block_size, 
-		                      number_of_states_infinite_algorithm) )
-	current_size = left_block_size + 3
-	sizes.append(left_block_size)
-	energies.append(energy)
-	entropies.append(entropy)
-	truncation_errors.append(truncation_error)
+    memory_budget = None
+    if args['--memory'] is not None:
+	memory_budget = fit_memory_budget(float(args['--memory']), system,
+		                          spin_one_half_site, number_of_states_kept)
+	number_of_states_kept = memory_budget.number_of_states
+	extrapolation_states = memory_budget.fit_extrapolation_states(
+	    extrapolation_states, int(args['-m']))
+	hooks += memory_budget.hooks
     #
-    # finite DMRG algorithm
+    # do the infinite and finite DMRG algorithms, saving the results of
+    # each step as you go. The processes of the superblock Hamiltonian
+    # stop, and the shared files are removed, at the end.
     #
-    states_to_keep = calculate_states_to_keep(number_of_states_infinite_algorithm, 
-		                              number_of_states_kept,
-		                              number_of_sweeps)
-    half_sweep = 0
-    while half_sweep < len(states_to_keep):
-	# sweep to the left
-        for left_block_size in range(max_left_block_size, 0, -1):
-	    states = states_to_keep[half_sweep]
-            energy, entropy, truncation_error = ( 
-                system.finite_dmrg_step('right', left_block_size, states) )
-            sizes.append(left_block_size)
-            energies.append(energy)
-            entropies.append(entropy)
-            truncation_errors.append(truncation_error)
-	half_sweep += 1
-	# sweep to the right
-	# if this is the last sweep, stop at the middle
-	if half_sweep == 2 * number_of_sweeps - 1:
-	    max_left_block_size = number_of_sites / 2 - 1
-        for left_block_size in range(1, max_left_block_size + 1):
-            energy, entropy, truncation_error = ( 
-                system.finite_dmrg_step('left', left_block_size, states) )
-            sizes.append(left_block_size)
-            energies.append(energy)
-            entropies.append(entropy)
-            truncation_errors.append(truncation_error)
-	half_sweep += 1
-    # 
-    # save results
-    #
-    output_file = os.path.join(os.path.abspath(args['--dir']), args['--output'])
-    f = open(output_file, 'w')
-    zipped = zip (sizes, energies, entropies, truncation_errors)
-    f.write('\n'.join('%s %s %s %s' % x for x in zipped))
-    f.close()
+    with system, ResultsWriter(output_file) as results:
+	for step in run_sweeps(system, number_of_states_kept,
+		               number_of_sweeps, hooks=hooks,
+			       extrapolation_states=extrapolation_states):
+	    results.write(step)
     print 'Results stored in ' + output_file
+    report_sweep_hooks(hooks)
+    if memory_budget is not None:
+	memory_budget.close()
+	print memory_budget.report()
 
 if __name__ == '__main__':
     args = docopt(__doc__, version = 0.1)
@@ -0,0 +1,480 @@
+#!/usr/bin/env python
+""" Real-time evolution with the time-dependent DMRG.
+
+Evolves a state in time with the adaptive time-dependent DMRG, on the
+same `System` as the ground state, i.e. a `superblock.SuperblockSystem`
+with the blocks, block operators and truncation of dmrg101. The sweeps
+are the ones of the finite DMRG algorithm, but the blocks keep the states
+of the evolving state instead of those of the ground state (see
+`targeting`), and the number of states is not fixed, but chosen so that
+the discarded weight is below a tolerance, so the calculation only gets
+expensive when the evolution builds up entanglement.
+
+By default the evolution uses a Trotter decomposition of the evolution
+operator in gates acting on pairs of neighbouring sites, built from the
+same model specs you use for the ground state, for models with on-site
+and nearest neighbour terms. Each gate is applied to the wavefunction of
+the superblock when its two sites are the single sites, so each time
+step is a sweep to the right and a sweep back to the left, each with half
+the time step, which is a second order Trotter decomposition.
+
+With `--krylov` the evolution uses instead the time-step targeting: at
+each step of a half-sweep the wavefunction is evolved with the Lanczos
+algorithm and the superblock Hamiltonian, and the blocks keep the states
+of the wavefunction at several times in the time step. This has no
+Trotter error, and works with any model the DMRG works with. Each time
+step is a sweep to the right and back.
+
+For small chains, you can use instead `--exact`, which evolves the whole
+wavefunction with the Lanczos algorithm, using the Hamiltonian from
+`exact_diagonalization`. This has no Trotter or truncation error, so it is
+a check for the time-dependent DMRG.
+
+Two quenches are implemented:
+
+- heisenberg : starts with a domain wall, with the spins in the left half
+  up and in the right half down, and evolves with the AF Heisenberg model.
+  Writes :math:`\langle S^{z}_{i}\rangle`.
+- tfim : starts with the ground state of the TFIM with field `H0`,
+  calculated with the finite DMRG algorithm (by default infinite, i.e. all
+  the spins along -x), and evolves with the field `H`. Writes
+  :math:`\langle S^{x}_{i}\rangle`.
+
+Each row of the output has the time, the total discarded weight, the
+largest number of states kept, the entanglement entropy at the middle of
+the chain, the energy, and the expectation value for each site.
+
+Usage:
+  time_evolution.py (-n=<sites> -t=<time>) [--model=<model> -H=<field> --H0=<field> --dt=<dt> -m=<states> -w=<weight> --sweeps=<sweeps> --krylov --exact --dir=DIR -o=FILE]
+  time_evolution.py -h | --help
+
+Options:
+  -h --help         Shows this screen.
+  -n <sites>        Number of sites of the chain.
+  -t <time>         Total time of the evolution.
+  --model=<model>   Model: heisenberg or tfim [default: heisenberg]
+  -H <field>        Transverse field after the quench [default: 1]
+  --H0=<field>      Transverse field before the quench.
+  --dt=<dt>         Time step [default: 0.05]
+  -m <states>       Largest number of states kept [default: 200]
+  -w <weight>       Largest discarded weight in each truncation
+                    [default: 1e-10]
+  --sweeps=<sweeps> Number of sweeps for the ground state before the
+                    quench [default: 4]
+  --krylov          Use the time-step targeting instead of the gates.
+  --exact           Use the exact Hamiltonian and the Lanczos algorithm.
+  -o --output=FILE  Ouput file [default: time_evolution.dat]
+  --dir=DIR         Ouput directory [default: ./]
+
+"""
+from dmrg101.core.sites import SpinOneHalfSite
+from docopt import docopt
+from exact_diagonalization import ExactDiagonalization
+from model_specs import make_heisenberg_model, make_tfim_model
+from scipy.linalg import expm
+from superblock import SuperblockSystem
+from sweeps import run_sweeps
+from targeting import TargetedSweeps, apply_to_parts
+import numpy as np
+import os
+
+def get_bond_hamiltonians(model, site_operators, number_of_sites):
+    """Returns the Hamiltonian of a model as a sum of terms on bonds.
+
+    The on-site terms are split evenly between the two bonds of the site,
+    but for the sites at the ends of the chain.
+
+    Parameters
+    ----------
+    model : a ModelFromSpec.
+        The model.
+    site_operators : a dict.
+        The operators of the site.
+    number_of_sites : an int.
+        The number of sites of the chain.
+
+    Returns
+    -------
+    result : a list of numpy arrays of ndim = 2.
+        For each bond, the Hamiltonian acting on its two sites.
+
+    Raises
+    ------
+    ValueError
+        if the model is periodic, or some term is not on-site or between
+	nearest neighbours, or has a pattern.
+    """
+    if model.periodic:
+	raise ValueError('Time evolution is only for open boundary '
+		         'conditions.')
+    identity = site_operators['id']
+    number_of_bonds = number_of_sites - 1
+    result = [0. for bond in range(number_of_bonds)]
+    for term in model.terms:
+	coupling = model.get_coupling(term.coupling)
+	if coupling == 0:
+	    continue
+	if term.pattern is not None or term.get_range() > 1:
+	    raise ValueError('Time evolution only supports uniform on-site '
+		             'and nearest neighbour terms.')
+	if len(term.operators) == 2:
+	    left, right = term.operators
+	    bond_term = coupling * np.kron(site_operators[left],
+		                           site_operators[right])
+	    for bond in range(number_of_bonds):
+		result[bond] = result[bond] + bond_term
+	    continue
+	operator = coupling * site_operators[term.operators[0]]
+	for bond in range(number_of_bonds):
+	    left_weight = 1. if bond == 0 else .5
+	    right_weight = 1. if bond == number_of_bonds - 1 else .5
+	    result[bond] = (result[bond] +
+		            left_weight * np.kron(operator, identity) +
+		            right_weight * np.kron(identity, operator))
+    return result
+
+def make_gates(bond_hamiltonians, time_step, imaginary=False):
+    """Returns the evolution operators for each bond.
+
+    Parameters
+    ----------
+    bond_hamiltonians : a list of numpy arrays of ndim = 2.
+        The Hamiltonian on each bond, as returned by
+	`get_bond_hamiltonians`.
+    time_step : a double.
+        The time step.
+    imaginary : a bool.
+        Whether to evolve in imaginary time, i.e. to use
+	:math:`e^{-H\\tau}` instead of :math:`e^{-iHt}`.
+
+    Returns
+    -------
+    result : a list of numpy arrays of ndim = 4.
+        For each bond, the gate with indices (new left, new right, old
+	left, old right.)
+    """
+    factor = -time_step if imaginary else -1j * time_step
+    result = []
+    for hamiltonian in bond_hamiltonians:
+	dim = int(round(np.sqrt(hamiltonian.shape[0])))
+	result.append(expm(factor * hamiltonian).reshape(dim, dim, dim, dim))
+    return result
+
+def get_gates_at(sweeps, gates, growing_side):
+    """Returns the gates applied at the configuration of the sweeps.
+
+    The gate of each bond is applied when its two sites are the single
+    sites, and the bonds at the ends of the chain with the block of one
+    site, in order from the left in a sweep to the right, and from the
+    right in a sweep back.
+
+    Parameters
+    ----------
+    sweeps : a TargetedSweeps.
+        The sweeps, at some configuration.
+    gates : a list of numpy arrays of ndim = 4.
+        The gate of each bond.
+    growing_side : a string.
+        The side that grows in the sweep.
+
+    Returns
+    -------
+    result : a list of tuples.
+        The gates to apply, in order, as (first part, gate), see
+	`targeting.apply_to_parts`.
+    """
+    left_block_size = sweeps.left_block_size
+    result = [(1, gates[left_block_size])]
+    if left_block_size == 1:
+	result.insert(0, (0, gates[0]))
+    if left_block_size == sweeps.number_of_sites - 3:
+	result.append((2, gates[-1]))
+    if growing_side == 'right':
+	result.reverse()
+    return result
+
+def do_trotter_step(sweeps, gates, measure=None, name='state'):
+    """Evolves a state by one time step with the gates of the bonds.
+
+    The step is a sweep to the right and a sweep back, applying the gates
+    as their sites become single, and keeping the states of the evolved
+    state. So the state must be at the first configuration, with the left
+    block of one site, and it is there again at the end.
+
+    Parameters
+    ----------
+    sweeps : a TargetedSweeps.
+        The sweeps, with the state in `vectors`.
+    gates : a list of numpy arrays of ndim = 4.
+        The gate of each bond for half the time step.
+    measure : a function, optional.
+        Called with the state at each configuration of the sweep to the
+	right, before applying the gates. The gates applied so far don't
+	act on the sites that become single, so it can measure them as
+	they were at the beginning of the step.
+    name : a string, optional.
+        The name of the state in `vectors`.
+    """
+    def make_step(growing_side):
+	def step(last):
+	    state = sweeps.vectors[name]
+	    if measure is not None and growing_side == 'left':
+		measure(state)
+	    dims = sweeps.get_dims()
+	    for first, gate in get_gates_at(sweeps, gates, growing_side):
+		state = apply_to_parts(state, dims, first, gate)
+	    sweeps.vectors[name] = state
+	    return [(1., state)]
+	return step
+    sweeps.sweep('left', make_step('left'))
+    sweeps.sweep('right', make_step('right'))
+
+def do_krylov_step(sweeps, time_step, measure=None, name='state',
+		   number_of_half_sweeps=2):
+    """Evolves a state by one time step, targeting the intermediate times.
+
+    At each configuration of a half-sweep, the state is evolved in the
+    superblock with the Lanczos algorithm to a third, two thirds and the
+    whole time step, and the blocks keep the states of all of them (the
+    time-step targeting of Feiguin and White). The blocks of the side
+    that doesn't grow come from the previous half-sweep, so the state is
+    moved to the end of the time step only after a few half-sweeps, at
+    the last configuration. The first half-sweep grows the left side, so
+    the state must be at the first configuration, and it is there again
+    at the end if the number of half-sweeps is even.
+
+    Parameters
+    ----------
+    sweeps : a TargetedSweeps.
+        The sweeps, with the state in `vectors`.
+    time_step : a double.
+        The time step.
+    measure : a function, optional.
+        Called with the state at each configuration of the first
+	half-sweep, before the evolution.
+    name : a string, optional.
+        The name of the state in `vectors`.
+    number_of_half_sweeps : an int, optional.
+        The number of half-sweeps in the time step.
+    """
+    def make_step(half_sweep):
+	def step(last):
+	    state = sweeps.vectors[name]
+	    if measure is not None and half_sweep == 0:
+		measure(state)
+	    matvec = sweeps.get_hamiltonian()
+	    states = [state]
+	    for i in range(3):
+		states.append(krylov_time_step(matvec, states[-1],
+					       time_step / 3.))
+	    if last and half_sweep == number_of_half_sweeps - 1:
+		sweeps.vectors[name] = states[-1]
+	    return zip((1 / 3., 1 / 6., 1 / 6., 1 / 3.), states)
+	return step
+    for half_sweep in range(number_of_half_sweeps):
+	growing_side = ('left', 'right')[half_sweep % 2]
+	sweeps.sweep(growing_side, make_step(half_sweep))
+
+def measure_in_sweep(sweeps, growing_side, measure, name='state'):
+    """Does a half-sweep to measure a state, without changing it."""
+    def step(last):
+	measure(sweeps.vectors[name])
+	return [(1., sweeps.vectors[name])]
+    sweeps.sweep(growing_side, step)
+
+class Measurement(object):
+    """Measures a state as its sites become single in a half-sweep.
+
+    Parameters
+    ----------
+    sweeps : a TargetedSweeps.
+        The sweeps.
+    operator : a string.
+        The name of the site operator measured at each site.
+
+    Attributes
+    ----------
+    energy : a double.
+        The energy, measured at the first configuration.
+    entropy : a double.
+        The entanglement entropy between the two halves of the chain.
+    values : a dict.
+        The expectation value of the operator at each site measured.
+    """
+    def __init__(self, sweeps, operator):
+	self.sweeps = sweeps
+	self.operator = operator
+	self.energy = None
+	self.entropy = np.nan
+	self.values = {}
+
+    def __call__(self, state):
+	sweeps = self.sweeps
+	number_of_sites = sweeps.number_of_sites
+	if self.energy is None:
+	    self.energy = sweeps.get_energy(state)
+	if sweeps.left_block_size == number_of_sites / 2 - 1:
+	    self.entropy = sweeps.get_entropy(state)
+	for site in range(number_of_sites):
+	    if site not in self.values and sweeps.get_part(site) is not None:
+		self.values[site] = sweeps.get_expectation_value(
+		    state, site, self.operator)
+
+    def get_values(self):
+        """Returns the values at each site, from the left."""
+	return [self.values[site] for site in
+		range(self.sweeps.number_of_sites)]
+
+def krylov_time_step(matvec, vector, time_step,
+	             number_of_lanczos_vectors=20):
+    """Evolves a vector with the Lanczos algorithm.
+
+    Approximates :math:`e^{-iHt}|\\psi\\rangle` in the Krylov space of
+    :math:`H` and :math:`|\\psi\\rangle`.
+
+    Parameters
+    ----------
+    matvec : a function.
+        Multiplies a vector by the Hamiltonian, e.g. the one from
+	`TargetedSweeps.get_hamiltonian`.
+    vector : a numpy array of ndim = 1.
+        The wavefunction.
+    time_step : a double.
+        The time step.
+    number_of_lanczos_vectors : an int.
+        The dimension of the Krylov space.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 1.
+        The evolved wavefunction.
+    """
+    norm = np.linalg.norm(vector)
+    basis = [vector / norm]
+    alphas = []
+    betas = []
+    for i in range(number_of_lanczos_vectors):
+	w = matvec(basis[-1])
+	alphas.append(np.vdot(basis[-1], w).real)
+	w = w - alphas[-1] * basis[-1]
+	if i > 0:
+	    w = w - betas[-1] * basis[-2]
+	beta = np.linalg.norm(w)
+	if beta < 1e-12 or i == number_of_lanczos_vectors - 1:
+	    break
+	betas.append(beta)
+	basis.append(w / beta)
+    tridiagonal = (np.diag(alphas) + np.diag(betas[:len(alphas) - 1], 1) +
+		   np.diag(betas[:len(alphas) - 1], -1))
+    coefficients = expm(-1j * time_step * tridiagonal)[:, 0]
+    return norm * np.dot(coefficients, basis[:len(alphas)])
+
+def main(args):
+    #
+    # read command-line arguments and set the model and initial state
+    #
+    site = SpinOneHalfSite()
+    operators = site.operators
+    number_of_sites = int(args['-n'])
+    time_step = float(args['--dt'])
+    number_of_steps = int(round(float(args['-t']) / time_step))
+    max_states = int(args['-m'])
+    max_discarded_weight = float(args['-w'])
+    initial_model = None
+    if args['--model'] == 'heisenberg':
+	model = make_heisenberg_model()
+	measured = 's_z'
+	up, down = np.eye(2)[np.argsort(np.diag(operators['s_z']))[::-1]]
+	half = number_of_sites / 2
+	local_states = [up] * half + [down] * (number_of_sites - half)
+	conserved = ('s_z',)
+    elif args['--model'] == 'tfim':
+	model = make_tfim_model(float(args['-H']))
+	measured = 's_x'
+	local_states = [np.linalg.eigh(operators['s_x'])[1][:, 0]] * number_of_sites
+	conserved = ()
+	if args['--H0'] is not None:
+	    initial_model = make_tfim_model(float(args['--H0']))
+    else:
+	raise ValueError('Model must be heisenberg or tfim.')
+    rows = []
+    #
+    # evolve with the Lanczos algorithm and the full Hamiltonian
+    #
+    if args['--exact']:
+	if conserved:
+	    sector = (sum(np.dot(state, np.dot(operators[conserved[0]], state))
+			  for state in local_states),)
+	else:
+	    sector = None
+	exact_diagonalization = ExactDiagonalization(model, operators,
+						     number_of_sites,
+						     conserved, sector)
+	hamiltonian = exact_diagonalization.build_hamiltonian()
+	if initial_model is None:
+	    vector = exact_diagonalization.get_product_state(local_states)
+	else:
+	    initial = ExactDiagonalization(initial_model, operators,
+					   number_of_sites)
+	    vector = initial.calculate_ground_state()[1][:, 0]
+	vector = vector.astype(complex)
+	observables = [exact_diagonalization.build_operator([(1., [(i, measured)])])
+		       for i in range(number_of_sites)]
+	for step in range(number_of_steps + 1):
+	    if step > 0:
+		vector = krylov_time_step(hamiltonian.dot, vector, time_step)
+	    energy = np.vdot(vector, hamiltonian.dot(vector)).real
+	    values = [np.vdot(vector, observable.dot(vector)).real for
+		      observable in observables]
+	    rows.append([step * time_step, 0., len(vector), np.nan, energy] +
+			values)
+    #
+    # evolve with the time-dependent DMRG
+    #
+    else:
+	system = SuperblockSystem(site)
+	system.number_of_sites = number_of_sites
+	sweeps = TargetedSweeps(system, number_of_sites, max_states,
+				max_discarded_weight)
+	if initial_model is None:
+	    system.model = model
+	    sweeps.vectors['state'] = sweeps.make_product_state(local_states)
+	else:
+	    # the ground state before the quench, ending at the first
+	    # configuration, and the same blocks with the operators of the
+	    # model after the quench
+	    system.model = initial_model
+	    for step in run_sweeps(system, max_states, int(args['--sweeps'])):
+		pass
+	    sweeps.find_ground_state('right', 'state')
+	    system.model = model
+	    sweeps.rebuild_blocks()
+	    sweeps.discarded_weight = 0.
+	sweeps.vectors['state'] = sweeps.vectors['state'].astype(complex)
+	gates = make_gates(get_bond_hamiltonians(model, operators,
+						 number_of_sites),
+			   time_step / 2)
+	for step in range(number_of_steps + 1):
+	    measurement = Measurement(sweeps, measured)
+	    discarded_weight = sweeps.discarded_weight
+	    if step == number_of_steps:
+		measure_in_sweep(sweeps, 'left', measurement)
+	    elif args['--krylov']:
+		do_krylov_step(sweeps, time_step, measurement)
+	    else:
+		do_trotter_step(sweeps, gates, measurement)
+	    rows.append([step * time_step, discarded_weight,
+			 sweeps.max_states_kept, measurement.entropy,
+			 measurement.energy] + measurement.get_values())
+    #
+    # save results
+    #
+    output_file = os.path.join(os.path.abspath(args['--dir']), args['--output'])
+    f = open(output_file, 'w')
+    f.write('\n'.join(' '.join('%s' % x for x in row) for row in rows))
+    f.close()
+    print 'Results stored in ' + output_file
+
+if __name__ == '__main__':
+    args = docopt(__doc__, version = 0.1)
+    main(args)
@@ -17,9 +17,9 @@ Options:
 """
 from docopt import docopt
 import os
+import numpy as np
 from math import cos, sin, pi
-from dmrg101.core.entropies import calculate_entropy
-from dmrg101.core.reduced_DM import diagonalize
+from batch_entropies import calculate_entropies, calculate_spectra
 from dmrg101.core.wavefunction import Wavefunction
 
 def create_two_qbit_system_in_singlet(psi):
@@ -47,27 +47,32 @@ def create_two_qbit_system_in_singlet(psi):
     result.as_matrix[1, 1] = 0.
     return result
 
-def trace_out_left_qbit_and_calculate_entropy(wf):
-    """Calculates the entropy after tracing out the left qbit.
+def create_two_qbit_systems_in_singlet(psi_values):
+    """ Returns the wfs of the system for many values of `psi` at once.
 
-    To calculate the entanglement entropy you need to first build the
-    reduced density matrix tracing out the degrees of freedom of one of
-    the two qbits (it does not matter which, we pick up left here.)
+    Same as `create_two_qbit_system_in_singlet`, but builds the matrices
+    of all the wavefunctions in a single numpy array. A Wavefunction holds
+    only one matrix, and `batch_entropies` works on a stack of them, so
+    the array stands in for a list of Wavefunctions without building
+    each one.
 
     Parameters
     ----------
-    wf : a Wavefunction
-        The wavefunction you build up the reduced density matrix with.
-
+    psi_values : a list of doubles
+        The values of `psi` parametrizing the wavefunctions.
+    
     Returns
     -------
-    result : a double
-        The value of the von Neumann entanglement entropy after tracing
-	out the left qbit.
+    result : a numpy array of ndim = 3
+        The wavefunctions written as matrices, `result[i]` is the same as
+	`create_two_qbit_system_in_singlet(psi_values[i]).as_matrix`.
     """
-    reduced_DM_for_right_qbit = wf.build_reduced_density_matrix('left')
-    evals, evecs = diagonalize(reduced_DM_for_right_qbit)
-    result = calculate_entropy(evals)
+    psi_values = np.asarray(psi_values)
+    result = np.zeros((len(psi_values), 2, 2))
+
+    # set the different components.
+    result[:, 0, 1] = np.cos(psi_values)
+    result[:, 1, 0] = np.sin(psi_values)
     return result
 
 def main(args):
@@ -81,10 +86,13 @@ def main(args):
     step = 2*pi/number_of_psi
     psi_values = [x*step for x in range(number_of_psi)] 
     #
-    # python function map applies a function to a sequence
+    # build all the wavefunctions at once, and calculate the entropies
+    # for all of them in one go. This is the same as tracing out the left
+    # qbit of each wavefunction and calculating the entropy of the
+    # reduced density matrix, but much faster.
     #
-    wfs = map(create_two_qbit_system_in_singlet, psi_values)
-    entropies = map(trace_out_left_qbit_and_calculate_entropy, wfs)
+    wfs = create_two_qbit_systems_in_singlet(psi_values)
+    entropies = calculate_entropies(calculate_spectra(wfs))[:, 0]
     # 
     # find to which value of psi corresponds the max entropy
     #